@@ -0,0 +1,185 @@
+"""
+Read-only JSON API.
+
+Each app describes its models as Resources in its api.py and routes them
+to ResourceView in its api_urls.py. Responses are built from values()
+rows, never from model instances:
+
+    GET /api/owners/?fields=last_name,city&include=pets.visits&fields[pets]=name
+
+fields= selects the fields of the listed resource and fields[<include>]=
+those of an included one. Only their columns are queried, plus the
+primary key and the sort keys. include= follows relations, dotted for
+nested ones. Like prefetch_related, every level is a single query filtered
+by the ids of the level above. Lists are paginated by cursor with
+KeysetPaginator (?cursor=, ?page_size=) and answer
+{"results": [...], "next": <cursor>, "previous": <cursor>}.
+"""
+import re
+
+from django.core.exceptions import ValidationError
+from django.db.models import F
+from django.http import JsonResponse
+from django.views import View
+
+from .pagination import InvalidCursor, KeysetPaginator, get_ordering
+
+SPARSE_FIELDS = re.compile(r'^fields\[([\w.]+)\]$')
+
+
+class ApiError(Exception):
+    """Raised for a request the API cannot answer, with the HTTP status to answer it with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class Relation:
+    """
+    A relation to many objects of another resource. field is the lookup
+    on the related model that leads back to the primary key of this one.
+    """
+
+    def __init__(self, resource, field):
+        self.resource = resource
+        self.field = field
+
+    def load(self, ids, includes, sparse, path):
+        """Return the serialized related objects of the given ids, grouped by id"""
+        if not ids:
+            return {}
+        resource = self.resource
+        names = resource.field_names(sparse.get(path))
+        rows = list(
+            resource.get_queryset()
+            .filter(**{f'{self.field}__in': ids})
+            .values(*resource.columns(names), api_parent=F(self.field))
+        )
+        grouped = {}
+        for row, obj in zip(rows, resource.serialize(rows, names, includes, sparse, path)):
+            grouped.setdefault(row['api_parent'], []).append(obj)
+        return grouped
+
+
+class Resource:
+    """
+    The JSON representation of a model.
+
+    fields maps the names of the representation to values() lookups, e.g.
+    {'owner': 'owner_id', 'type': 'type__name'}. default_fields are sent
+    when the request names none, all of them if None. relations maps
+    include names to Relations and filters maps query parameters to
+    lookups for exact matches. Lists follow the ordering of get_queryset(),
+    which must suit keyset pagination.
+    """
+    model = None
+    fields = {}
+    default_fields = None
+    relations = {}
+    filters = {}
+    page_size = 50
+    max_page_size = 200
+
+    def get_queryset(self):
+        return self.model._default_manager.all()
+
+    def field_names(self, requested=None):
+        """Return the field names selected by a fields= value, or the default ones"""
+        if not requested:
+            return list(self.default_fields or self.fields)
+        names = [name for name in requested.split(',') if name]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ApiError(f"Unknown fields of {self.model._meta.model_name}: {', '.join(unknown)}.")
+        return names
+
+    def columns(self, names, extra=()):
+        """Return the values() lookups needed for the given fields"""
+        columns = ['pk']
+        for lookup in [*(self.fields[name] for name in names), *extra]:
+            if lookup not in columns:
+                columns.append(lookup)
+        return columns
+
+    def serialize(self, rows, names, includes, sparse, path=''):
+        """Return the representations of values() rows, with their includes"""
+        lookups = [(name, self.fields[name]) for name in names]
+        objects = [{name: row[lookup] for name, lookup in lookups} for row in rows]
+        for name, nested in includes.items():
+            include = f'{path}.{name}' if path else name
+            children = self.relations[name].load([row['pk'] for row in rows], nested, sparse, include)
+            for obj, row in zip(objects, rows):
+                obj[name] = children.get(row['pk'], [])
+        return objects
+
+    def parse(self, params):
+        """Return the fields, includes and sparse fieldsets requested by a query string"""
+        sparse = {}
+        for key in params:
+            match = SPARSE_FIELDS.match(key)
+            if match:
+                sparse[match.group(1)] = params[key]
+        includes = {}
+        for path in filter(None, params.get('include', '').split(',')):
+            resource, level = self, includes
+            for name in path.split('.'):
+                if name not in resource.relations:
+                    raise ApiError(f'Unknown include of {resource.model._meta.model_name}: {name}.')
+                resource, level = resource.relations[name].resource, level.setdefault(name, {})
+        return self.field_names(params.get('fields')), includes, sparse
+
+    def filter(self, queryset, params):
+        """Apply the filters given in the query string"""
+        keys = [key for key in self.filters if key in params]
+        try:
+            return queryset.filter(**{self.filters[key]: params[key] for key in keys})
+        except (ValueError, ValidationError):
+            raise ApiError(f"Invalid value for {', '.join(keys)}.")
+
+    def page_size_of(self, params):
+        try:
+            page_size = int(params.get('page_size', self.page_size))
+        except ValueError:
+            raise ApiError('page_size must be a number.')
+        return max(1, min(page_size, self.max_page_size))
+
+    def list(self, params):
+        """Return a page of the resource as a JSON serializable dict"""
+        names, includes, sparse = self.parse(params)
+        queryset = self.filter(self.get_queryset(), params)
+        sort_keys = [name for name, _ in get_ordering(queryset)]
+        rows = queryset.values(*self.columns(names, sort_keys))
+        try:
+            page = KeysetPaginator(rows, self.page_size_of(params)).page(params.get('cursor'))
+        except InvalidCursor:
+            raise ApiError('Invalid cursor.')
+        return {
+            'results': self.serialize(page.object_list, names, includes, sparse),
+            'next': page.next_cursor,
+            'previous': page.previous_cursor,
+        }
+
+    def detail(self, params, pk):
+        """Return one object of the resource as a JSON serializable dict"""
+        names, includes, sparse = self.parse(params)
+        rows = list(self.get_queryset().filter(pk=pk).values(*self.columns(names)))
+        if not rows:
+            raise ApiError(f'No {self.model._meta.verbose_name} with id {pk}.', status=404)
+        return self.serialize(rows, names, includes, sparse)[0]
+
+
+class ResourceView(View):
+    """Serve the list of a resource, or one of its objects when the URL has a pk"""
+    resource = None
+    http_method_names = ['get', 'head', 'options']
+
+    def get(self, request, pk=None):
+        try:
+            if pk is None:
+                data = self.resource.list(request.GET)
+            else:
+                data = self.resource.detail(request.GET, pk)
+        except ApiError as error:
+            return JsonResponse({'error': str(error)}, status=error.status)
+        return JsonResponse(data)
@@ -0,0 +1,20 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+class DjangoProjectConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'DjangoProject'
+    verbose_name = 'Django Petclinic'
+
+    def ready(self):
+        from . import checks  # noqa: F401
+        from .sqlite import apply_pragmas
+        connection_created.connect(apply_pragmas, dispatch_uid='DjangoProject.sqlite.apply_pragmas')
+        from .metrics import record_queries_of
+        connection_created.connect(record_queries_of, dispatch_uid='DjangoProject.metrics.record_queries_of')
+
+        from django.conf import settings
+        from .templating import install_profiling
+        if settings.TEMPLATE_PROFILING:
+            install_profiling()
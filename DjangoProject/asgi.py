@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'DjangoProject.settings')
 
 application = get_asgi_application()
+
+# Here rather than in AppConfig.ready(), which every management command runs
+from django.conf import settings  # noqa: E402
+from DjangoProject.templating import prewarm  # noqa: E402
+
+if settings.TEMPLATE_PREWARM:
+    prewarm()
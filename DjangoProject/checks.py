@@ -0,0 +1,60 @@
+"""
+System checks of the cache settings.
+
+The in-process caches are invalidated through numbers kept in a cache
+every worker reads. Kept in process memory instead, an edit would only
+invalidate the copies of the worker that made it, and the others would
+serve stale data. With DEBUG on, runserver is a single process and
+process memory is allowed.
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+LOCMEM_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+def is_process_local(alias):
+    """Return whether the cache alias keeps its entries in process memory"""
+    return settings.CACHES.get(alias, {}).get('BACKEND') == LOCMEM_BACKEND
+
+
+@register(Tags.caches)
+def check_reference_cache(app_configs, **kwargs):
+    """Refuse a reference data generation kept in process memory"""
+    alias = getattr(settings, 'REFERENCE_CACHE_ALIAS', 'default')
+    if settings.DEBUG or not is_process_local(alias):
+        return []
+    return [Error(
+        f"REFERENCE_CACHE_ALIAS points at the process-local cache '{alias}'.",
+        hint='Point it at a file or Redis cache shared by every worker, such as '
+             "'versions' with VERSION_CACHE=file or redis.",
+        id='petclinic.E001',
+    )]
+
+
+@register(Tags.caches)
+def check_fragment_versions(app_configs, **kwargs):
+    """Refuse fragment versions kept in process memory"""
+    alias = getattr(settings, 'FRAGMENT_VERSION_ALIAS', 'default')
+    if settings.DEBUG or not is_process_local(alias):
+        return []
+    return [Error(
+        f"FRAGMENT_VERSION_ALIAS points at the process-local cache '{alias}'.",
+        hint='Point it at a file or Redis cache shared by every worker, such as '
+             "'versions' with VERSION_CACHE=file or redis.",
+        id='petclinic.E002',
+    )]
+
+
+@register(Tags.caches)
+def check_page_cache(app_configs, **kwargs):
+    """Refuse an enabled page cache kept in process memory"""
+    alias = getattr(settings, 'PAGE_CACHE_ALIAS', 'default')
+    if (settings.DEBUG or not getattr(settings, 'PAGE_CACHE_ENABLED', False)
+            or not is_process_local(alias)):
+        return []
+    return [Error(
+        f"PAGE_CACHE_ENABLED is set but PAGE_CACHE_ALIAS points at the process-local cache '{alias}'.",
+        hint="Set FRAGMENT_CACHE to file or redis, or turn the page cache off.",
+        id='petclinic.E003',
+    )]
@@ -0,0 +1,123 @@
+"""
+Conditional GET for detail pages.
+
+Models carry an updated_at timestamp that the signal receivers of each
+app roll up from children to parents: saving a visit touches its pet and
+the pet's owner. A detail page is therefore unchanged as long as the
+newest timestamp among the rows it displays is. ConditionalDetailMixin
+turns that timestamp into Last-Modified and ETag headers and answers
+If-None-Match and If-Modified-Since with 304 Not Modified before the
+template is rendered or any other query runs. aconditional_detail() does
+the same for the async detail views.
+"""
+import datetime
+import hashlib
+
+from django.http import Http404
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+
+def touch(queryset):
+    """Mark the rows of queryset as modified now, without sending signals"""
+    return queryset.update(updated_at=timezone.now())
+
+
+def start_of_today():
+    """Return midnight of the current day as an aware datetime"""
+    return timezone.make_aware(datetime.datetime.combine(timezone.localdate(), datetime.time.min))
+
+
+def dated_queryset(queryset, last_modified_fields):
+    """Return queryset with the relations of the timestamps of last_modified_fields selected"""
+    related = {name.rsplit('__', 1)[0] for name in last_modified_fields if '__' in name}
+    return queryset.select_related(*related)
+
+
+def last_modified_of(obj, last_modified_fields, changes_daily=False):
+    """Return the newest of the timestamps of obj named by last_modified_fields, or None"""
+    timestamps = []
+    for name in last_modified_fields:
+        value = obj
+        for attr in name.split('__'):
+            value = getattr(value, attr, None)
+        if value is not None:
+            timestamps.append(value)
+    if changes_daily:
+        timestamps.append(start_of_today())
+    return max(timestamps) if timestamps else None
+
+
+def etag_of(model, pk, last_modified):
+    """Return the ETag of the page of an object last modified at last_modified"""
+    # Last-Modified only has second precision, the ETag keeps microseconds
+    tag = f'{model._meta.label_lower}:{pk}:{last_modified.isoformat()}'
+    return hashlib.md5(tag.encode(), usedforsecurity=False).hexdigest()
+
+
+async def aconditional_detail(request, view_class, queryset, pk, render):
+    """
+    Async counterpart of a DetailView using ConditionalDetailMixin, dated
+    by the last_modified_fields and changes_daily of view_class. Load the
+    object of queryset with primary key pk, answer 304 if the client has
+    it already, else return the response of await render(obj).
+    """
+    obj = await dated_queryset(queryset, view_class.last_modified_fields).filter(pk=pk).afirst()
+    if obj is None:
+        raise Http404(f'No {queryset.model._meta.verbose_name} found matching the query')
+    last_modified = last_modified_of(obj, view_class.last_modified_fields, view_class.changes_daily)
+    etag = etag_of(queryset.model, pk, last_modified) if last_modified else None
+
+    async def page(request):
+        return await render(obj)
+
+    view = condition(etag_func=lambda request: etag, last_modified_func=lambda request: last_modified)
+    return await view(page)(request)
+
+
+class ConditionalDetailMixin:
+    """
+    Mixin for DetailView answering conditional GET requests.
+
+    last_modified_fields lists the timestamps that together date the page,
+    e.g. ['updated_at', 'owner__updated_at'] for a pet page showing its
+    owner's name. The object is loaded once, with the relations of those
+    fields selected, both to date the page and to render it. Pages showing
+    values computed from the current date, such as ages, set
+    changes_daily so they are never older than today.
+    """
+    last_modified_fields = ['updated_at']
+    changes_daily = False
+
+    def dispatch(self, request, *args, **kwargs):
+        view = condition(etag_func=self.etag, last_modified_func=self.last_modified)
+        return view(super().dispatch)(request, *args, **kwargs)
+
+    def get_conditional_object(self):
+        """Return the object of the page with the related rows it is dated by, or None"""
+        if not hasattr(self, '_conditional_object'):
+            queryset = dated_queryset(self.get_queryset(), self.last_modified_fields)
+            pk = self.kwargs.get(self.pk_url_kwarg)
+            self._conditional_object = queryset.filter(pk=pk).first()
+        return self._conditional_object
+
+    def get_object(self, queryset=None):
+        if queryset is None and self.get_conditional_object() is not None:
+            return self.get_conditional_object()
+        return super().get_object(queryset)
+
+    def get_last_modified(self):
+        """Return the newest timestamp shown by the page, or None if there is no object"""
+        obj = self.get_conditional_object()
+        if obj is None:
+            return None
+        return last_modified_of(obj, self.last_modified_fields, self.changes_daily)
+
+    def last_modified(self, request, *args, **kwargs):
+        return self.get_last_modified()
+
+    def etag(self, request, *args, **kwargs):
+        last_modified = self.get_last_modified()
+        if last_modified is None:
+            return None
+        return etag_of(self.model, kwargs.get(self.pk_url_kwarg), last_modified)
@@ -0,0 +1,9 @@
+from django.core.handlers.asgi import ASGIRequest
+
+
+def events(request):
+    """
+    Tell templates whether the event streams are served: only an ASGI
+    server streams them, under WSGI live.js would only get 501 responses.
+    """
+    return {'events_enabled': isinstance(request, ASGIRequest)}
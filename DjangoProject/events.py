@@ -0,0 +1,203 @@
+"""
+Publish/subscribe of change events, streamed to browsers as Server-Sent
+Events by visits.views.visit_events.
+
+Signal receivers call publish_on_commit() with the topics an event
+belongs to, e.g. ['clinic', 'owner:7', 'pet:12']. Once the transaction
+commits, the broker hands the event to every subscription listening to
+one of its topics.
+
+The broker is the class named by settings.EVENTS_BROKER. LocalBroker fans
+events out within one process, which is enough for a single ASGI worker.
+With several workers, a broker with the same publish(), subscribe() and
+unsubscribe() methods relaying events through a shared channel (Redis
+pub/sub, PostgreSQL LISTEN/NOTIFY) takes its place.
+
+Every event gets an increasing id and the last EVENTS_HISTORY events are
+kept, so a client reconnecting with the Last-Event-ID header receives the
+events it missed. When they are no longer all kept, it receives a reset
+event instead, telling it to reload.
+
+Each subscription queues at most EVENTS_QUEUE_SIZE events. A client that
+does not read them fast enough is disconnected rather than buffered
+without bound, and resumes from its Last-Event-ID when it reconnects.
+"""
+import asyncio
+import functools
+import json
+import threading
+from collections import deque
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils.module_loading import import_string
+
+
+class TooManySubscribers(Exception):
+    """Raised by subscribe() when EVENTS_MAX_SUBSCRIBERS are already connected"""
+
+
+class Event(NamedTuple):
+    id: int
+    topics: frozenset
+    message: str
+
+
+def encode(event_id, name, data):
+    """Return an event in the text/event-stream format"""
+    return f'id: {event_id}\nevent: {name}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'
+
+
+class Subscription:
+    """The queue of events of one client, read in the event loop it subscribed from"""
+
+    def __init__(self, topics, queue_size):
+        self.topics = frozenset(topics)
+        self.queue_size = queue_size
+        self.loop = asyncio.get_running_loop()
+        self.queue = deque()
+        self.ready = asyncio.Event()
+        self.overflowed = False
+        # Id of the last event published before it started
+        self.start_id = None
+
+    def put(self, message):
+        """Queue a message; must run in the event loop of the subscription"""
+        if self.overflowed:
+            return
+        if len(self.queue) >= self.queue_size:
+            self.overflowed = True
+            self.queue.clear()
+        else:
+            self.queue.append(message)
+        self.ready.set()
+
+    async def get(self, timeout):
+        """Return the queued messages, waiting up to timeout seconds; [] if none came"""
+        if not self.queue and not self.overflowed:
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except TimeoutError:
+                return []
+        self.ready.clear()
+        messages = list(self.queue)
+        self.queue.clear()
+        return messages
+
+
+class LocalBroker:
+    """Fan events out to the subscriptions of this process"""
+
+    def __init__(self, history=None):
+        if history is None:
+            history = getattr(settings, 'EVENTS_HISTORY', 1000)
+        self.lock = threading.Lock()
+        self.last_id = 0
+        self.history = deque(maxlen=history)
+        self.subscriptions = set()
+
+    def publish(self, topics, name, data):
+        """Send an event to the subscriptions of any of its topics; callable from any thread"""
+        with self.lock:
+            self.last_id += 1
+            event = Event(self.last_id, frozenset(topics), encode(self.last_id, name, data))
+            self.history.append(event)
+            subscriptions = [
+                subscription for subscription in self.subscriptions
+                if not subscription.topics.isdisjoint(event.topics)
+            ]
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event.message)
+            except RuntimeError:
+                # Its event loop is closed
+                self.unsubscribe(subscription)
+
+    def subscribe(self, topics, last_id=None):
+        """
+        Return a Subscription to topics, holding the events published after
+        last_id if it is given. Must be called from an event loop.
+        """
+        subscription = Subscription(topics, getattr(settings, 'EVENTS_QUEUE_SIZE', 100))
+        with self.lock:
+            if len(self.subscriptions) >= getattr(settings, 'EVENTS_MAX_SUBSCRIBERS', 1000):
+                raise TooManySubscribers
+            self.subscriptions.add(subscription)
+            subscription.start_id = self.last_id
+            if last_id is not None:
+                subscription.queue.extend(self.missed(subscription.topics, last_id))
+                if subscription.queue:
+                    subscription.ready.set()
+        return subscription
+
+    def missed(self, topics, last_id):
+        """Return the messages of topics published after last_id, or a reset if they are not all kept"""
+        oldest = self.history[0].id if self.history else self.last_id + 1
+        if last_id > self.last_id or oldest > last_id + 1:
+            # Missed events are gone, or the ids come from before a restart
+            return [encode(self.last_id, 'reset', {})]
+        # Not bounded by the queue size, the history is
+        return [
+            event.message for event in self.history
+            if event.id > last_id and not topics.isdisjoint(event.topics)
+        ]
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+
+@functools.cache
+def get_broker():
+    """Return the broker of this process, an instance of settings.EVENTS_BROKER"""
+    return import_string(getattr(settings, 'EVENTS_BROKER', 'DjangoProject.events.LocalBroker'))()
+
+
+class EventStreamResponse(StreamingHttpResponse):
+    """
+    A text/event-stream of the events of a subscription, with a heartbeat
+    comment every EVENTS_HEARTBEAT_SECONDS. It ends after
+    EVENTS_IDLE_SECONDS without events or when the subscription overflows,
+    and unsubscribes when it ends or is closed unread.
+    """
+
+    def __init__(self, broker, subscription, resuming=False):
+        self.broker = broker
+        self.subscription = subscription
+        super().__init__(self.stream(resuming), content_type='text/event-stream')
+        self['Cache-Control'] = 'no-cache'
+        # Stop nginx from buffering the stream
+        self['X-Accel-Buffering'] = 'no'
+
+    async def stream(self, resuming):
+        heartbeat = getattr(settings, 'EVENTS_HEARTBEAT_SECONDS', 15)
+        idle_limit = getattr(settings, 'EVENTS_IDLE_SECONDS', 300)
+        idle = 0
+        try:
+            if resuming:
+                yield ': connected\n\n'
+            else:
+                # The browser reconnects from this id even if no event comes first
+                yield f'id: {self.subscription.start_id}\n\n'
+            while idle < idle_limit and not self.subscription.overflowed:
+                messages = await self.subscription.get(heartbeat)
+                if messages:
+                    idle = 0
+                    yield ''.join(messages)
+                else:
+                    idle += heartbeat
+                    yield ': heartbeat\n\n'
+        finally:
+            self.broker.unsubscribe(self.subscription)
+
+    def close(self):
+        self.broker.unsubscribe(self.subscription)
+        super().close()
+
+
+def publish_on_commit(topics, name, data, using=None):
+    """Publish an event once the current transaction commits, right away outside of one"""
+    transaction.on_commit(lambda: get_broker().publish(topics, name, data), using=using)
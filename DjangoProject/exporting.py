@@ -0,0 +1,138 @@
+"""
+Streamed export of the whole clinic dataset: owners, their pets and the
+pets' visits. Used by the export_petclinic command and the export view.
+
+Owners are read with QuerySet.iterator(), which fetches them from the
+database cursor in chunks. For each chunk, the pets, the visits and the
+archived visits of its owners are read with one query each, joined on
+the owner ids of the chunk, and attached to their owners in memory. An
+export therefore costs four queries per chunk whatever the number of
+pets and visits, and holds no more than one chunk in memory however
+large the tables are.
+
+Every format is a generator of text pieces:
+
+- csv: one row per visit, with the columns of its pet and owner. Pets
+  without visits and owners without pets get a row with empty columns.
+- jsonl: one owner per line, with their pets and the pets' visits nested.
+- columnar: each chunk as three lines, one per table, holding a list of
+  values per column, e.g. {"table": "pets", "columns": {"id": [...], ...}}.
+"""
+import csv
+import itertools
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from owners.models import Owner
+from pets.models import Pet, pet_types
+from visits.models import Visit, VisitArchive
+
+CHUNK_SIZE = 500
+
+OWNER_FIELDS = ['id', 'first_name', 'last_name', 'address', 'city', 'telephone']
+PET_FIELDS = ['id', 'name', 'birth_date', 'type', 'owner']
+VISIT_FIELDS = ['id', 'date', 'description', 'pet']
+
+
+def iter_chunks(chunk_size=CHUNK_SIZE, using=None):
+    """Yield the owners, pets and visits of each chunk of owners as lists of values() rows"""
+    owners = Owner.objects.using(using).order_by('pk').values(*OWNER_FIELDS).iterator(chunk_size=chunk_size)
+    while chunk := list(itertools.islice(owners, chunk_size)):
+        ids = [owner['id'] for owner in chunk]
+        pets = list(
+            Pet.objects.using(using).filter(owner__in=ids).order_by('owner', 'pk')
+            .values('id', 'name', 'birth_date', 'type_id', 'owner_id')
+        )
+        for pet in pets:
+            pet['type'] = pet_types.get(pet.pop('type_id')).name
+            pet['owner'] = pet.pop('owner_id')
+        visits = [
+            visit
+            for model in (Visit, VisitArchive)
+            for visit in model.objects.using(using).filter(pet__owner__in=ids).order_by()
+            .values('id', 'date', 'description', 'pet_id')
+        ]
+        # Sorted here, across both tables
+        visits.sort(key=lambda visit: (visit['pet_id'], -visit['date'].toordinal(), visit['id']))
+        for visit in visits:
+            visit['pet'] = visit.pop('pet_id')
+        yield chunk, pets, visits
+        # Let the chunk go before reading the next one
+        del chunk, pets, visits
+
+
+def iter_owners(chunk_size=CHUNK_SIZE, using=None):
+    """Yield every owner as a dict with their pets, each with their visits"""
+    for owners, pets, visits in iter_chunks(chunk_size, using):
+        visits_of = {}
+        for visit in visits:
+            visits_of.setdefault(visit['pet'], []).append(visit)
+        pets_of = {}
+        for pet in pets:
+            pet['visits'] = visits_of.get(pet['id'], [])
+            pets_of.setdefault(pet['owner'], []).append(pet)
+        for owner in owners:
+            owner['pets'] = pets_of.get(owner['id'], [])
+            yield owner
+        del owners, pets, visits, visits_of, pets_of, owner
+
+
+def stream_jsonl(chunk_size=CHUNK_SIZE, using=None):
+    """Yield one JSON line per owner"""
+    for owner in iter_owners(chunk_size, using):
+        yield json.dumps(owner, cls=DjangoJSONEncoder) + '\n'
+
+
+class Echo:
+    """A file-like object returning what is written to it, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(chunk_size=CHUNK_SIZE, using=None):
+    """Yield a header and one CSV row per visit, with its pet and owner"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(
+        [f'owner_{field}' for field in OWNER_FIELDS]
+        + [f'pet_{field}' for field in PET_FIELDS if field != 'owner']
+        + [f'visit_{field}' for field in VISIT_FIELDS if field != 'pet']
+    )
+    no_pet = [''] * (len(PET_FIELDS) - 1)
+    no_visit = [''] * (len(VISIT_FIELDS) - 1)
+    for owner in iter_owners(chunk_size, using):
+        owner_columns = [owner[field] for field in OWNER_FIELDS]
+        if not owner['pets']:
+            yield writer.writerow(owner_columns + no_pet + no_visit)
+        for pet in owner['pets']:
+            pet_columns = [pet[field] for field in PET_FIELDS if field != 'owner']
+            if not pet['visits']:
+                yield writer.writerow(owner_columns + pet_columns + no_visit)
+            for visit in pet['visits']:
+                yield writer.writerow(
+                    owner_columns + pet_columns + [visit[field] for field in VISIT_FIELDS if field != 'pet']
+                )
+
+
+def stream_columnar(chunk_size=CHUNK_SIZE, using=None):
+    """Yield each chunk as one JSON line of columns per table"""
+    tables = [('owners', OWNER_FIELDS), ('pets', PET_FIELDS), ('visits', VISIT_FIELDS)]
+    for chunk in iter_chunks(chunk_size, using):
+        for (table, fields), rows in zip(tables, chunk):
+            columns = {field: [row[field] for row in rows] for field in fields}
+            yield json.dumps({'table': table, 'columns': columns}, cls=DjangoJSONEncoder) + '\n'
+        del chunk, rows, columns
+
+
+# Generator, content type and file extension of each format
+FORMATS = {
+    'csv': (stream_csv, 'text/csv', 'csv'),
+    'jsonl': (stream_jsonl, 'application/x-ndjson', 'jsonl'),
+    'columnar': (stream_columnar, 'application/x-ndjson', 'columnar.jsonl'),
+}
+
+
+def stream(file_format, chunk_size=CHUNK_SIZE, using=None):
+    """Return a generator of the export in the given format"""
+    return FORMATS[file_format][0](chunk_size, using)
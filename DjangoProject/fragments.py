@@ -0,0 +1,163 @@
+"""
+Versioned template fragment cache.
+
+A fragment is cached under a key built from its name and the versions of
+the objects it depends on. Every object has a version number stored in
+the cache; saving or deleting it (or something displayed with it) bumps
+that number, so the next render builds a new key and the stale fragment
+is simply never read again and expires on its own. Nothing has to know
+which fragments exist in order to invalidate them.
+
+Dependencies are model instances, versioned per object, or model labels
+such as 'pets.PetType', versioned for the whole model. The receivers in
+each app's signals.py decide what a change bumps: a new visit bumps its
+pet and the pet's owner, so only their fragments are rebuilt.
+
+Fragments live in the cache named by settings.FRAGMENT_CACHE_ALIAS, which
+the settings point at locmem, file or Redis storage per environment.
+Hits and misses are counted per fragment name in the same cache. The
+versions live in the cache named by settings.FRAGMENT_VERSION_ALIAS,
+which every worker must share so that a bump reaches all of them, even
+when each keeps its fragments in its own memory.
+
+The queries of a fragment render go to the primary database, so that a
+replica lagging behind a bump is not cached under the new version. The
+objects the view loaded before the fragment still come from a replica:
+a fragment built from them right after a change may hold their state of
+up to the replica lag earlier (one sync_replicas interval locally) until
+they change again. Views whose fragments must not lag pin themselves
+with routers.pin_to_primary().
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Model
+
+from .routers import pin_to_primary
+
+VERSION_PREFIX = 'fragment-version'
+FRAGMENT_PREFIX = 'fragment'
+STATS_PREFIX = 'fragment-stats'
+
+
+def fragment_cache():
+    """Return the cache holding fragments and their counters"""
+    return caches[getattr(settings, 'FRAGMENT_CACHE_ALIAS', 'default')]
+
+
+def version_cache():
+    """Return the cache holding the versions of the dependencies"""
+    return caches[getattr(settings, 'FRAGMENT_VERSION_ALIAS', 'default')]
+
+
+def _version_key(label, pk=None):
+    if pk is None:
+        return f'{VERSION_PREFIX}:{label.lower()}'
+    return f'{VERSION_PREFIX}:{label.lower()}:{pk}'
+
+
+def version_key(dependency):
+    """Return the cache key of the version of a model instance or label"""
+    if isinstance(dependency, Model):
+        return _version_key(dependency._meta.label, dependency.pk)
+    return _version_key(dependency)
+
+
+def new_version():
+    """
+    Return a version number for a dependency without one. It is based on
+    the clock, so that fragments built before the version was evicted
+    cannot match it
+    """
+    return time.time_ns() // 1000
+
+
+def get_versions(dependencies):
+    """Return the current version of each dependency, in order"""
+    cache = version_cache()
+    keys = [version_key(dependency) for dependency in dependencies]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = new_version()
+            if not cache.add(key, version, timeout=None):
+                version = cache.get(key, version)
+            versions[key] = version
+    return [versions[key] for key in keys]
+
+
+async def aget_versions(dependencies):
+    """Return the current version of each dependency, in order, through the async cache API"""
+    cache = version_cache()
+    keys = [version_key(dependency) for dependency in dependencies]
+    versions = await cache.aget_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = new_version()
+            if not await cache.aadd(key, version, timeout=None):
+                version = await cache.aget(key, version)
+            versions[key] = version
+    return [versions[key] for key in keys]
+
+
+def bump(model, pk=None):
+    """
+    Invalidate the fragments depending on one object of model, or on the
+    whole model when pk is None. model may also be a plain label.
+    """
+    label = model if isinstance(model, str) else model._meta.label
+    key = _version_key(label, pk)
+    cache = version_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, new_version(), timeout=None)
+
+
+def fragment_key(name, dependencies, vary_on=()):
+    """Return the cache key of a fragment for the current dependency versions"""
+    versions = get_versions(dependencies)
+    parts = [version_key(dependency) + f'={version}'
+             for dependency, version in zip(dependencies, versions)]
+    parts.extend(str(value) for value in vary_on)
+    digest = hashlib.md5('|'.join(parts).encode(), usedforsecurity=False).hexdigest()
+    return f'{FRAGMENT_PREFIX}:{name}:{digest}'
+
+
+def count(name, outcome):
+    """Increment the hit or miss counter of a fragment"""
+    cache = fragment_cache()
+    key = f'{STATS_PREFIX}:{outcome}:{name}'
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def get_or_render(name, dependencies, render, vary_on=()):
+    """Return the cached fragment, calling render() to build it on a miss"""
+    cache = fragment_cache()
+    key = fragment_key(name, dependencies, vary_on)
+    content = cache.get(key)
+    if content is not None:
+        count(name, 'hits')
+        return content
+    count(name, 'misses')
+    with pin_to_primary():
+        content = render()
+    cache.set(key, content, getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 86400))
+    return content
+
+
+def stats(names):
+    """Return {name: {'hits': n, 'misses': n}} for the given fragment names"""
+    keys = [f'{STATS_PREFIX}:{outcome}:{name}' for name in names for outcome in ('hits', 'misses')]
+    values = fragment_cache().get_many(keys)
+    return {
+        name: {outcome: values.get(f'{STATS_PREFIX}:{outcome}:{name}', 0)
+               for outcome in ('hits', 'misses')}
+        for name in names
+    }
@@ -0,0 +1,210 @@
+"""
+Bulk import of owners, pets and visits, used by the import_petclinic command.
+
+Each kind of record is read from its own CSV or JSONL file, one record
+per row or line. Rows are validated like the forms validate them and
+written with bulk_create, one transaction per batch, without a query per
+row: pets and visits refer to the owners and pets of the import by the
+id column of their file, which is resolved through in-memory maps of
+those ids to the primary keys they got.
+
+The maps and the position reached in every file are kept in an
+append-only checkpoint log. Each batch appends a line with the keys it
+created before its transaction commits, so after a crash the import
+resumes after the last committed batch. Only the last line of the log can
+belong to a batch that did not commit, which Checkpoint checks by
+looking up its keys. The log starts with the path, size and modification
+time of every file, and is refused if a file changed since: positions in
+an edited file no longer point at the same rows. It is deleted once the
+import completes.
+
+Each batch also logs the owners of the pets or the pets of the visits it
+created, so the counters bulk_create leaves stale are rebuilt for those
+rows only.
+"""
+import csv
+import json
+import os
+
+from django.core.exceptions import ValidationError
+
+from owners.models import Owner
+from owners.validators import validate_telephone
+from pets.models import Pet, pet_types
+from pets.validators import validate_birth_date
+from visits.models import Visit
+from visits.validators import validate_visit_date
+
+# Files are imported in this order, so that references point backwards
+KINDS = ['owners', 'pets', 'visits']
+
+
+class RowError(Exception):
+    """Raised for a row that cannot be imported"""
+
+
+def read_rows(path, file_format=None):
+    """Yield the records of a CSV or JSONL file as dicts"""
+    file_format = file_format or ('csv' if path.endswith('.csv') else 'jsonl')
+    with open(path, newline='', encoding='utf-8') as file:
+        if file_format == 'csv':
+            yield from csv.DictReader(file)
+        else:
+            for number, line in enumerate(file, 1):
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError as error:
+                        # Keep the position, the row is reported as invalid
+                        yield {'__error__': f'line {number} is not valid JSON: {error}'}
+
+
+def build(model, row, fields, validators=None):
+    """Return an unsaved instance of model from the given fields of a row, validated like its form"""
+    if '__error__' in row:
+        raise RowError(row['__error__'])
+    obj = model(**{field: row.get(field) or '' for field in fields})
+    errors = {}
+    try:
+        obj.clean_fields(exclude=[field.name for field in model._meta.fields if field.name not in fields])
+    except ValidationError as error:
+        errors = error.message_dict
+    for field, validate in (validators or {}).items():
+        if field not in errors:
+            try:
+                validate(getattr(obj, field))
+            except ValidationError as error:
+                errors[field] = error.messages
+    if errors:
+        raise RowError('; '.join(f"{field}: {' '.join(messages)}" for field, messages in errors.items()))
+    return obj
+
+
+def resolve(keys, row, column, kind):
+    """Return the primary key the value of a column of row is mapped to"""
+    key = str(row.get(column) or '')
+    if key not in keys:
+        raise RowError(f'{column}: unknown {kind} {key!r}')
+    return keys[key]
+
+
+def build_owner(row, maps):
+    owner = build(Owner, row, ['first_name', 'last_name', 'address', 'city', 'telephone'],
+                  validators={'telephone': validate_telephone})
+    owner.update_search_keys()
+    return owner
+
+
+def build_pet(row, maps):
+    pet = build(Pet, row, ['name', 'birth_date'], validators={'birth_date': validate_birth_date})
+    pet.update_search_keys()
+    pet.type_id = resolve(maps['types'], row, 'type', 'pet type')
+    pet.owner_id = resolve(maps['owners'], row, 'owner', 'owner id')
+    return pet
+
+
+def build_visit(row, maps):
+    visit = build(Visit, row, ['date', 'description'], validators={'date': validate_visit_date})
+    visit.pet_id = resolve(maps['pets'], row, 'pet', 'pet id')
+    return visit
+
+
+def type_map():
+    """Return the primary keys of the pet types by name"""
+    return {pet_type.name: pet_type.pk for pet_type in pet_types.all()}
+
+
+BUILDERS = {'owners': (Owner, build_owner), 'pets': (Pet, build_pet), 'visits': (Visit, build_visit)}
+
+# The field of the rows of a kind holding the parent whose counters they change
+PARENTS = {'pets': 'owner_id', 'visits': 'pet_id'}
+
+
+def fingerprint(path):
+    """Return the path, size and modification time of a file, which change when it is edited"""
+    stat = os.stat(path)
+    return {'path': path, 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+
+class Checkpoint:
+    """
+    The append-only log of the batches imported so far. The first line
+    holds the fingerprints of the files, each next one the kind, the number
+    of rows of its file read so far, the primary keys given to the ids of
+    the batch and the primary keys of the parents of its rows.
+    """
+
+    def __init__(self, path, files):
+        self.path = path
+        self.files = {kind: fingerprint(file) for kind, file in files.items()}
+        self.position = dict.fromkeys(KINDS, 0)
+        self.ids = {kind: {} for kind in KINDS}
+        # Primary keys of the owners of the imported pets and the pets of the imported visits
+        self.parents = {kind: set() for kind in KINDS}
+        self.file = None
+
+    def load(self, using):
+        """Replay the log, dropping its last batch if that never committed"""
+        if not os.path.exists(self.path):
+            return
+        lines = []
+        with open(self.path, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    lines.append(json.loads(line))
+                except ValueError:
+                    # A line cut short by the crash, its batch never committed
+                    break
+        if not lines:
+            return
+        header, batches = lines[0], lines[1:]
+        if header.get('files') != self.files:
+            raise ValueError(
+                f'The checkpoint {self.path} belongs to an import of other files or the files changed '
+                f'since: {header.get("files")}.'
+            )
+        if batches and not self.committed(batches[-1], using):
+            batches.pop()
+        self.rewrite([header, *batches])
+        for batch in batches:
+            self.position[batch['kind']] = batch['position']
+            self.ids[batch['kind']].update(batch['ids'])
+            self.parents[batch['kind']].update(batch.get('parents', []))
+
+    def committed(self, batch, using):
+        """Return whether the rows created by a batch are in the database"""
+        model = BUILDERS[batch['kind']][0]
+        pks = batch['pks']
+        return model._default_manager.using(using).filter(pk__in=pks).count() == len(pks)
+
+    def rewrite(self, lines):
+        with open(self.path, 'w', encoding='utf-8') as file:
+            for line in lines:
+                file.write(json.dumps(line) + '\n')
+
+    def record(self, kind, position, ids, pks, parents):
+        """Durably append a batch to the log"""
+        if self.file is None:
+            is_new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            self.file = open(self.path, 'a', encoding='utf-8')
+            if is_new:
+                self.file.write(json.dumps({'files': self.files}) + '\n')
+        self.file.write(json.dumps(
+            {'kind': kind, 'position': position, 'ids': ids, 'pks': pks, 'parents': parents}
+        ) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.position[kind] = position
+        self.ids[kind].update(ids)
+        self.parents[kind].update(parents)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def delete(self):
+        """Remove the log of a completed import"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,102 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from DjangoProject.conditional import touch
+from DjangoProject.fragments import bump
+from owners.models import Owner
+from pets.models import Pet
+from visits.models import Visit, VisitArchive
+from visits.signals import signals_suppressed
+
+FIELDS = ['id', 'date', 'description', 'pet_id', 'updated_at']
+
+
+class Command(BaseCommand):
+    help = (
+        'Move the visits older than VISIT_ARCHIVE_DAYS to the archive table, '
+        'in short transactions so that the visits table stays writable.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.VISIT_ARCHIVE_DAYS,
+            help=f'Archive the visits older than this many days (default: {settings.VISIT_ARCHIVE_DAYS}).',
+        )
+        parser.add_argument(
+            '--before', type=datetime.date.fromisoformat,
+            help='Archive the visits before this date, as YYYY-MM-DD, instead of --days.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of visits moved per transaction (default: 500).',
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0.05,
+            help='Seconds to wait between batches, letting other writers in (default: 0.05).',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report how many visits would be archived.',
+        )
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to archive the visits of (default: "default").',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        if options['days'] < 0:
+            raise CommandError('--days cannot be negative.')
+        db = options['database']
+        cutoff = options['before'] or datetime.date.today() - datetime.timedelta(days=options['days'])
+        # Oldest first, read backwards along visit_date_idx without sorting
+        old = Visit.objects.using(db).filter(date__lt=cutoff).order_by('date', '-pk')
+        if options['dry_run']:
+            self.stdout.write(f'{old.count()} visits before {cutoff} would be archived')
+            return
+
+        start = time.perf_counter()
+        moved = 0
+        while True:
+            pet_ids, owner_ids = self.move_batch(old, options['batch_size'], db)
+            if not pet_ids:
+                break
+            moved += len(pet_ids)
+            for pet_id in set(pet_ids):
+                bump(Pet, pet_id)
+            for owner_id in owner_ids:
+                bump(Owner, owner_id)
+            if options['verbosity'] >= 2:
+                self.stdout.write(f'{moved} visits archived')
+            time.sleep(options['pause'])
+
+        if options['verbosity'] >= 1:
+            self.stdout.write(
+                f'{moved} visits before {cutoff} archived in {time.perf_counter() - start:.1f} s'
+            )
+
+    def move_batch(self, old, batch_size, db):
+        """
+        Move one batch of old visits to the archive and return the pet id
+        of each visit moved and the ids of their owners
+        """
+        with transaction.atomic(using=db):
+            rows = list(old.values(*FIELDS)[:batch_size])
+            if not rows:
+                return [], set()
+            VisitArchive.objects.using(db).bulk_create([VisitArchive(**row) for row in rows])
+            # The pets keep counting their archived visits: no counter changes
+            with signals_suppressed():
+                Visit.objects.using(db).filter(pk__in=[row['id'] for row in rows]).delete()
+            pet_ids = [row['pet_id'] for row in rows]
+            owner_ids = set(
+                Pet.objects.using(db).filter(pk__in=set(pet_ids)).values_list('owner_id', flat=True)
+            )
+            touch(Pet.objects.using(db).filter(pk__in=set(pet_ids)))
+            touch(Owner.objects.using(db).filter(pk__in=owner_ids))
+        return pet_ids, owner_ids
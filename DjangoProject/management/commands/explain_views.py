@@ -0,0 +1,165 @@
+import re
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+# Extra query strings that exercise the filters of some views
+SAMPLE_QUERIES = {
+    'owners:owner-list': ['q=smi'],
+    'owners:owner-search': ['q=smi'],
+    'owners:owner-lookup': ['q=smi'],
+    'pets:pet-lookup': ['q=f'],
+    'vets:vet-list': ['specialty=1'],
+}
+
+SKIP_NAMESPACES = {'admin'}
+SKIP_NAMES = {'trigger-error'}
+
+# Plan lines that reveal a full table scan or a sort, per database vendor
+PLAN_PROBLEMS = {
+    'sqlite': [
+        (re.compile(r'^SCAN (?!CONSTANT ROW)(\S+)(?!.*USING)'), 'full scan'),
+        (re.compile(r'USE TEMP B-TREE'), 'temp b-tree sort'),
+    ],
+    'postgresql': [
+        (re.compile(r'Seq Scan on (\S+)'), 'full scan'),
+        (re.compile(r'^\s*(?:->\s*)?(?:Incremental )?Sort\b'), 'sort'),
+    ],
+}
+
+
+def explain(connection, sql):
+    """Return the query plan of sql as a list of rows, one per plan node"""
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql)
+        rows = cursor.fetchall()
+    return [row[-1] for row in rows]
+
+
+def plan_problems(vendor, plan, ignored_tables=()):
+    """Return descriptions of the problems found in the rows of a query plan"""
+    found = []
+    for row in plan:
+        for pattern, problem in PLAN_PROBLEMS[vendor]:
+            match = pattern.search(row)
+            if not match:
+                continue
+            table = match.group(1) if match.groups() else None
+            if table and table.strip('"') in ignored_tables:
+                continue
+            found.append(f'{problem} of {table}' if table else problem)
+    return found
+
+
+class Command(BaseCommand):
+    help = (
+        'Request every GET view, run EXPLAIN on each SELECT it issues and flag '
+        'full table scans and temporary B-tree sorts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database whose query plans are explained (default: "default").',
+        )
+        parser.add_argument(
+            '--ignore-table', action='append', default=[], metavar='TABLE',
+            help='Do not flag full scans of this table (can be repeated).',
+        )
+        parser.add_argument(
+            '--strict', action='store_true',
+            help='Exit with an error if any query is flagged.',
+        )
+
+    # Cached pages would hide the queries of their views
+    @override_settings(ALLOWED_HOSTS=['localhost'], PAGE_CACHE_ENABLED=False)
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor not in PLAN_PROBLEMS:
+            raise CommandError(f'EXPLAIN is not supported for {connection.vendor}.')
+        self.connection = connection
+        self.ignored_tables = set(options['ignore_table'])
+
+        client = Client(HTTP_HOST='localhost', raise_request_exception=False)
+        explained = flagged = 0
+        for name, url in self.urls():
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            self.stdout.write(f'{name} {url} ({response.status_code}, {len(queries)} queries)')
+            for query in queries:
+                sql = query['sql']
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                explained += 1
+                plan = explain(connection, sql)
+                problems = plan_problems(connection.vendor, plan, self.ignored_tables)
+                if problems:
+                    flagged += 1
+                    self.stdout.write(self.style.WARNING(f"  {', '.join(problems)}: {sql}"))
+                if problems or options['verbosity'] >= 2:
+                    for line in plan:
+                        self.stdout.write(f'      {line}')
+
+        summary = f'{explained} queries explained, {flagged} flagged.'
+        if flagged and options['strict']:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary) if not flagged else summary)
+
+    def urls(self):
+        """Yield (name, url) for every GET view that can be reversed"""
+        for name, pattern in self.patterns(get_resolver()):
+            kwargs = self.sample_kwargs(pattern)
+            if kwargs is None:
+                continue
+            url = reverse(name, kwargs=kwargs)
+            yield name, url
+            for query_string in SAMPLE_QUERIES.get(name, []):
+                yield name, f'{url}?{query_string}'
+
+    def patterns(self, resolver, namespace=None):
+        """Yield (qualified name, pattern) for every named URL pattern"""
+        for entry in resolver.url_patterns:
+            if isinstance(entry, URLResolver):
+                if entry.namespace in SKIP_NAMESPACES:
+                    continue
+                child = entry.namespace or namespace
+                if namespace and entry.namespace:
+                    child = f'{namespace}:{entry.namespace}'
+                yield from self.patterns(entry, child)
+            elif isinstance(entry, URLPattern) and entry.name and entry.name not in SKIP_NAMES:
+                yield (f'{namespace}:{entry.name}' if namespace else entry.name), entry
+
+    def sample_kwargs(self, pattern):
+        """
+        Return URL kwargs pointing at existing rows: pk refers to the view's
+        model and <model>_id to the model of that name. Return None when a
+        kwarg cannot be filled.
+        """
+        kwargs = {}
+        for kwarg in getattr(pattern.pattern, 'converters', {}):
+            if kwarg == 'pk':
+                model = getattr(getattr(pattern.callback, 'view_class', None), 'model', None)
+            elif kwarg.endswith('_id'):
+                model = self.model_named(kwarg[:-3])
+            else:
+                model = None
+            if model is None:
+                return None
+            pk = model._default_manager.using(self.connection.alias).order_by('pk').values_list(
+                'pk', flat=True).first()
+            kwargs[kwarg] = pk if pk is not None else 1
+        return kwargs
+
+    def model_named(self, model_name):
+        """Return the installed model called model_name, if any"""
+        for model in apps.get_models():
+            if model._meta.model_name == model_name:
+                return model
+        return None
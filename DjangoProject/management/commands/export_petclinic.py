@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from DjangoProject.exporting import CHUNK_SIZE, FORMATS, stream
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream every owner with their pets and visits to a file, as CSV, '
+        'JSON lines or columnar JSON lines, in constant memory.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format', choices=list(FORMATS), default='jsonl',
+            help='Output format (default: jsonl).',
+        )
+        parser.add_argument(
+            '--output', default='-',
+            help='File to write the export to (default: standard output).',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=CHUNK_SIZE,
+            help=f'Number of owners read per chunk (default: {CHUNK_SIZE}).',
+        )
+        parser.add_argument(
+            '--database',
+            help='Database to read from (default: chosen by the database routers).',
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive.')
+        pieces = stream(options['format'], options['chunk_size'], options['database'])
+        start = time.perf_counter()
+        if options['output'] == '-':
+            size = self.write(pieces, lambda piece: self.stdout.write(piece, ending=''))
+        else:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as file:
+                size = self.write(pieces, file.write)
+        if options['verbosity'] >= 1:
+            # On stderr, so that the export can be written to stdout
+            self.stderr.write(f'Exported {size} characters in {time.perf_counter() - start:.1f} s')
+
+    def write(self, pieces, write):
+        """Write every piece and return the number of characters written"""
+        size = 0
+        for piece in pieces:
+            write(piece)
+            size += len(piece)
+        return size
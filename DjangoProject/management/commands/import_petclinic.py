@@ -0,0 +1,116 @@
+import itertools
+import os
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from DjangoProject.importing import BUILDERS, KINDS, PARENTS, Checkpoint, RowError, read_rows, type_map
+from DjangoProject.pagecache import purge
+from owners.models import Owner, OwnerNameWord
+
+
+class Command(BaseCommand):
+    help = (
+        'Import owners, pets and visits from CSV or JSONL files in batches, '
+        'validated like the forms. Pets refer to owners and visits to pets by '
+        'the id column of their file, pet types by name. Rerun the same command '
+        'to resume an interrupted import.'
+    )
+
+    def add_arguments(self, parser):
+        for kind in KINDS:
+            parser.add_argument(f'--{kind}', metavar='PATH', help=f'File of {kind} to import.')
+        parser.add_argument(
+            '--format', choices=['csv', 'jsonl'],
+            help='Format of the files (default: csv for .csv files, jsonl otherwise).',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rows written per transaction (default: 1000).',
+        )
+        parser.add_argument(
+            '--checkpoint', default='import_petclinic.checkpoint',
+            help='Log of the imported batches to resume from (default: import_petclinic.checkpoint).',
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Discard the checkpoint and import the files from the start.',
+        )
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to import into (default: "default").',
+        )
+
+    def handle(self, *args, **options):
+        files = {kind: os.path.abspath(options[kind]) for kind in KINDS if options[kind]}
+        if not files:
+            raise CommandError('Nothing to import, give --owners, --pets or --visits.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        if options['restart'] and os.path.exists(options['checkpoint']):
+            os.remove(options['checkpoint'])
+
+        checkpoint = Checkpoint(options['checkpoint'], files)
+        try:
+            checkpoint.load(options['database'])
+        except ValueError as error:
+            raise CommandError(f'{error} Use --restart to discard it.')
+        maps = {'types': type_map(), **checkpoint.ids}
+        try:
+            for kind, path in files.items():
+                self.import_file(kind, path, checkpoint, maps, options)
+        finally:
+            checkpoint.close()
+
+        # bulk_create sends no signals: fix the counters of the parents of
+        # the rows imported, by this run or the interrupted ones, and purge the lists
+        for counters, kind in (('owners', 'pets'), ('pets', 'visits')):
+            if checkpoint.parents[kind]:
+                call_command('rebuild_counters', counters, pks=sorted(checkpoint.parents[kind]),
+                             database=options['database'], verbosity=0)
+        if any(checkpoint.position.values()):
+            purge('owners')
+        checkpoint.delete()
+
+    def import_file(self, kind, path, checkpoint, maps, options):
+        """Import the rows of a file after the checkpoint and return how many were imported"""
+        model, builder = BUILDERS[kind]
+        resumed = checkpoint.position[kind]
+        rows = itertools.islice(enumerate(read_rows(path, options['format']), 1), resumed, None)
+        imported = skipped = 0
+        start = time.perf_counter()
+        while batch := list(itertools.islice(rows, options['batch_size'])):
+            objects, source_ids = [], []
+            for number, row in batch:
+                try:
+                    objects.append(builder(row, maps))
+                except RowError as error:
+                    skipped += 1
+                    self.stderr.write(f'{kind} row {number}: {error}')
+                    continue
+                source_ids.append(row.get('id'))
+            with transaction.atomic(using=options['database']):
+                model._default_manager.using(options['database']).bulk_create(objects)
+                if model is Owner:
+                    # Owner.save() is skipped, index the later words of the names here
+                    OwnerNameWord.objects.using(options['database']).bulk_create(
+                        OwnerNameWord.for_owners(objects))
+                pks = [obj.pk for obj in objects]
+                ids = {str(source): pk for source, pk in zip(source_ids, pks) if source not in (None, '')}
+                parents = sorted({getattr(obj, PARENTS[kind]) for obj in objects}) if kind in PARENTS else []
+                checkpoint.record(kind, batch[-1][0], ids, pks, parents)
+            imported += len(objects)
+            if options['verbosity'] >= 2:
+                self.stdout.write(f'{kind}: {batch[-1][0]} rows read')
+
+        elapsed = time.perf_counter() - start
+        if options['verbosity'] >= 1:
+            rate = (imported + skipped) / elapsed if elapsed else 0
+            self.stdout.write(
+                f'{kind}: {imported} imported, {skipped} skipped'
+                + (f', resumed after row {resumed}' if resumed else '')
+                + f' in {elapsed:.1f} s ({rate:.0f} rows/s)'
+            )
+        return imported
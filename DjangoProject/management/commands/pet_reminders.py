@@ -0,0 +1,86 @@
+import csv
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from DjangoProject.exporting import Echo
+from pets.models import Pet
+from pets.reminders import MAX_BIRTHDAY_DAYS, CheckupsDue, UpcomingBirthdays
+
+# Header and row of the CSV of each list
+COLUMNS = {
+    'birthdays': (['birthday', 'turning'], lambda pet: [pet.birth_date.strftime('%m-%d'), pet.turning]),
+    'checkups': (['last_visit_date'], lambda pet: [pet.last_visit_date or '']),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Write the due-list of upcoming pet birthdays or of checkups as CSV, '
+        'one row per pet with its owner\'s contact, read with index range scans.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(COLUMNS), help='List to write.')
+        parser.add_argument(
+            '--days', type=int, default=30,
+            help='Birthdays within this many days of the date (default: 30).',
+        )
+        parser.add_argument(
+            '--interval', type=int, default=settings.CHECKUP_INTERVAL_DAYS,
+            help=f'Checkups are due this many days after the last visit '
+                 f'(default: {settings.CHECKUP_INTERVAL_DAYS}).',
+        )
+        parser.add_argument(
+            '--date', type=datetime.date.fromisoformat, default=None,
+            help='Date to compute the list on, as YYYY-MM-DD (default: today).',
+        )
+        parser.add_argument(
+            '--output', default='-',
+            help='File to write the list to (default: standard output).',
+        )
+        parser.add_argument(
+            '--database',
+            help='Database to read from (default: chosen by the database routers).',
+        )
+
+    def handle(self, *args, **options):
+        if not 0 <= options['days'] <= MAX_BIRTHDAY_DAYS:
+            raise CommandError(f'--days must be between 0 and {MAX_BIRTHDAY_DAYS}.')
+        if options['interval'] < 0:
+            raise CommandError('--interval cannot be negative.')
+        today = options['date'] or timezone.localdate()
+        pets = Pet.objects.using(options['database']).select_related('owner')
+        if options['kind'] == 'birthdays':
+            pets = UpcomingBirthdays(pets, today, options['days'])
+        else:
+            pets = CheckupsDue(pets, today, options['interval'])
+
+        pieces = self.rows(pets, *COLUMNS[options['kind']])
+        if options['output'] == '-':
+            count = self.write(pieces, lambda piece: self.stdout.write(piece, ending=''))
+        else:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as file:
+                count = self.write(pieces, file.write)
+        if options['verbosity'] >= 1:
+            # On stderr, so that the list can be written to stdout
+            self.stderr.write(f'{count} pets')
+
+    def rows(self, pets, header, columns):
+        """Yield the CSV header, then a row per pet"""
+        writer = csv.writer(Echo())
+        yield writer.writerow(['pet_id', 'pet_name', 'owner_name', 'owner_telephone', *header])
+        for pet in pets:
+            yield writer.writerow(
+                [pet.pk, pet.name, pet.owner.get_full_name(), pet.owner.telephone, *columns(pet)]
+            )
+
+    def write(self, pieces, write):
+        """Write every piece and return the number of pets written"""
+        count = -1
+        for piece in pieces:
+            write(piece)
+            count += 1
+        return count
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from DjangoProject.pagecache import purge
+
+
+class Command(BaseCommand):
+    help = (
+        'Make every cached page of the given groups stale, e.g. the static '
+        "'home' group after a deploy changed its template."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('groups', nargs='+', help='Page cache groups to purge.')
+
+    def handle(self, *args, **options):
+        purge(*options['groups'])
+        if options['verbosity'] >= 1:
+            self.stdout.write(f'Purged {", ".join(options["groups"])}.')
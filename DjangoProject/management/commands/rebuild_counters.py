@@ -0,0 +1,143 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from DjangoProject.conditional import touch
+from DjangoProject.fragments import bump
+from owners.models import Owner
+from pets.models import Pet
+from visits.models import Visit, VisitArchive
+
+
+def count_of(queryset, field):
+    """Return a subquery counting the rows of queryset whose field is the outer pk"""
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field)
+    counts = counts.annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def latest_of(queryset, field, value):
+    """Return a subquery of the greatest value of the rows of queryset whose field is the outer pk"""
+    return Subquery(queryset.filter(**{field: OuterRef('pk')}).order_by(f'-{value}').values(value)[:1])
+
+
+# The denormalized counters and how to compute them from scratch
+COUNTERS = {
+    'owners': (Owner, lambda db: {
+        'pet_count': count_of(Pet.objects.using(db), 'owner'),
+    }),
+    'pets': (Pet, lambda db: {
+        # Archived visits still count
+        'visit_count': count_of(Visit.objects.using(db), 'pet') + count_of(VisitArchive.objects.using(db), 'pet'),
+        'last_visit_date': Greatest(
+            Coalesce(latest_of(Visit.objects.using(db), 'pet', 'date'),
+                     latest_of(VisitArchive.objects.using(db), 'pet', 'date')),
+            Coalesce(latest_of(VisitArchive.objects.using(db), 'pet', 'date'),
+                     latest_of(Visit.objects.using(db), 'pet', 'date')),
+        ),
+    }),
+}
+
+
+# The parent whose pages show the counters of a model, touched and bumped with them
+PARENTS = {Pet: (Owner, 'owner_id')}
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the denormalized counters (Owner.pet_count, Pet.visit_count, '
+        'Pet.last_visit_date) in batches and fix the rows where they drifted.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'counters', nargs='*',
+            help=f'Counters to rebuild: {", ".join(COUNTERS)} (default: all).',
+        )
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Only report the rows whose counters are wrong, and fail if there are any.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rows checked per query (default: 1000).',
+        )
+        parser.add_argument(
+            '--pk', type=int, action='append', dest='pks', metavar='PK',
+            help='Only check the row with this primary key (can be repeated, default: every row).',
+        )
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to rebuild the counters of (default: "default").',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        for name in options['counters']:
+            if name not in COUNTERS:
+                raise CommandError(f'Unknown counters {name!r}, choose from {", ".join(COUNTERS)}.')
+        wrong = 0
+        for name in options['counters'] or COUNTERS:
+            model, expressions = COUNTERS[name]
+            stale = self.rebuild(model, expressions(options['database']), options)
+            wrong += stale
+            if options['verbosity'] >= 1:
+                action = 'wrong' if options['verify'] else 'fixed'
+                self.stdout.write(f'{name}: {stale} {action}')
+        if options['verify'] and wrong:
+            raise CommandError(f'{wrong} rows have wrong counters, run rebuild_counters to fix them.')
+
+    def rebuild(self, model, expressions, options):
+        """Check the rows of model in pk batches, fix the wrong ones and return how many there were"""
+        db = options['database']
+        size = options['batch_size']
+        fields = list(expressions)
+        annotations = {f'actual_{field}': expression for field, expression in expressions.items()}
+        parent, parent_field = PARENTS.get(model, (None, None))
+        loaded = ['pk', *fields, *filter(None, [parent_field])]
+        queryset = model._default_manager.using(db).order_by('pk').only(*loaded)
+        queryset = queryset.annotate(**annotations)
+        # With --pk, the given rows in chunks of the batch size, else every row
+        pks = sorted(set(options['pks'])) if options.get('pks') else None
+        chunks = [pks[start:start + size] for start in range(0, len(pks), size)] if pks else None
+        last_pk = None
+        wrong = 0
+        while chunks is None or chunks:
+            if chunks is not None:
+                batch = queryset.filter(pk__in=chunks.pop(0))
+            else:
+                batch = (queryset if last_pk is None else queryset.filter(pk__gt=last_pk))[:size]
+            with transaction.atomic(using=db):
+                rows = list(batch)
+                if not rows:
+                    if chunks is None:
+                        break
+                    continue
+                stale = []
+                for row in rows:
+                    if any(getattr(row, field) != getattr(row, f'actual_{field}') for field in fields):
+                        for field in fields:
+                            setattr(row, field, getattr(row, f'actual_{field}'))
+                        stale.append(row)
+                if stale and not options['verify']:
+                    now = timezone.now()
+                    for row in stale:
+                        row.updated_at = now
+                    model._default_manager.using(db).bulk_update(stale, [*fields, 'updated_at'])
+                    for row in stale:
+                        bump(model, row.pk)
+                    if parent is not None:
+                        parent_ids = {getattr(row, parent_field) for row in stale}
+                        touch(parent._default_manager.using(db).filter(pk__in=parent_ids))
+                        for pk in parent_ids:
+                            bump(parent, pk)
+                wrong += len(stale)
+                if options['verbosity'] >= 2:
+                    for row in stale:
+                        self.stdout.write(f'  {model._meta.label} {row.pk} should have '
+                                          + ', '.join(f'{field}={getattr(row, field)}' for field in fields))
+            last_pk = rows[-1].pk
+        return wrong
@@ -0,0 +1,148 @@
+import datetime
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from DjangoProject.pagecache import purge
+from owners.models import Owner, OwnerNameWord
+from pets.models import Pet, PetType
+from vets.models import Specialty, Vet
+from visits.models import Visit
+
+FIRST_NAMES = ['George', 'Betty', 'Eduardo', 'Harold', 'Peter', 'Jean', 'Jeff', 'Maria',
+               'David', 'Carlos', 'Helen', 'Linda', 'Rafael', 'Henry', 'Sharon', 'James']
+LAST_NAMES = ['Franklin', 'Davis', 'Rodriquez', 'McTavish', 'Coleman', 'Black', 'Escobito',
+              'Schroeder', 'Estaban', 'Leary', 'Douglas', 'Ortega', 'Stevens', 'Carter']
+STREETS = ['W. Liberty St.', 'Cardinal Ave.', 'Commerce St.', 'Lake St.', 'Washington St.',
+           'Mendota Ave.', 'Monroe Ave.', 'Spring St.']
+CITIES = ['Madison', 'Sun Prairie', 'McFarland', 'Windsor', 'Monona', 'Waunakee']
+PET_NAMES = ['Leo', 'Basil', 'Rosy', 'Jewel', 'Iggy', 'George', 'Samantha', 'Max', 'Lucky',
+             'Mulligan', 'Freddy', 'Sly', 'Bella', 'Milo', 'Nala', 'Oscar']
+PET_TYPES = ['cat', 'dog', 'lizard', 'snake', 'bird', 'hamster']
+SPECIALTIES = ['radiology', 'surgery', 'dentistry']
+VISIT_DESCRIPTIONS = ['rabies shot', 'neutered', 'spayed', 'checkup', 'vaccination',
+                      'dental cleaning', 'x-ray', 'follow-up']
+
+# Fixed dates keep the data identical from one day to the next
+BIRTH_DATES = (datetime.date(2010, 1, 1), datetime.date(2022, 12, 31))
+VISIT_DATES = (datetime.date(2023, 1, 1), datetime.date(2024, 12, 31))
+
+
+def random_date(rng, dates):
+    start, end = dates
+    return start + datetime.timedelta(days=rng.randint(0, (end - start).days))
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the database with generated owners, pets, visits and vets for '
+        'development and benchmarks. The same --seed always generates the same data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--owners', type=int, default=1000, help='Number of owners (default: 1000).')
+        parser.add_argument('--pets-per-owner', type=int, default=2, help='Pets of each owner (default: 2).')
+        parser.add_argument('--visits-per-pet', type=int, default=3, help='Visits of each pet (default: 3).')
+        parser.add_argument('--vets', type=int, default=10, help='Number of vets (default: 10).')
+        parser.add_argument('--seed', type=int, default=42, help='Seed of the generator (default: 42).')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of owners written per transaction, with their pets and visits (default: 1000).',
+        )
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database to fill (default: "default").',
+        )
+
+    def handle(self, *args, **options):
+        for option in ('owners', 'pets_per_owner', 'visits_per_pet', 'vets'):
+            if options[option] < 0:
+                raise CommandError(f"--{option.replace('_', '-')} cannot be negative.")
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        self.using = options['database']
+        rng = random.Random(options['seed'])
+        start = time.perf_counter()
+
+        pet_types = [
+            PetType.objects.using(self.using).get_or_create(name=name)[0].pk for name in PET_TYPES
+        ]
+        self.seed_vets(rng, options['vets'])
+        created = {'owners': 0, 'pets': 0, 'visits': 0}
+        for offset in range(0, options['owners'], options['batch_size']):
+            count = min(options['batch_size'], options['owners'] - offset)
+            with transaction.atomic(using=self.using):
+                counts = self.seed_batch(rng, count, pet_types, options['pets_per_owner'],
+                                         options['visits_per_pet'])
+            for kind, number in counts.items():
+                created[kind] += number
+            if options['verbosity'] >= 2:
+                self.stdout.write(f"{created['owners']} owners created")
+        # bulk_create sends no signals: purge the cached lists
+        purge('owners', 'vets')
+
+        if options['verbosity'] >= 1:
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"{created['owners']} owners, {created['pets']} pets, {created['visits']} visits "
+                f"and {options['vets']} vets created in {elapsed:.1f} s"
+            )
+
+    def seed_vets(self, rng, count):
+        specialties = [
+            Specialty.objects.using(self.using).get_or_create(name=name)[0] for name in SPECIALTIES
+        ]
+        vets = Vet.objects.using(self.using).bulk_create([
+            Vet(first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES))
+            for _ in range(count)
+        ])
+        Vet.specialties.through.objects.using(self.using).bulk_create([
+            Vet.specialties.through(vet_id=vet.pk, specialty_id=specialty.pk)
+            for vet in vets
+            for specialty in rng.sample(specialties, rng.randint(0, len(specialties)))
+        ])
+
+    def seed_batch(self, rng, count, pet_types, pets_per_owner, visits_per_pet):
+        """Create count owners with their pets and visits, and return how many of each"""
+        owners = []
+        for _ in range(count):
+            owner = Owner(
+                first_name=rng.choice(FIRST_NAMES),
+                last_name=rng.choice(LAST_NAMES),
+                address=f'{rng.randint(1, 9999)} {rng.choice(STREETS)}',
+                city=rng.choice(CITIES),
+                telephone=f'608555{rng.randint(0, 9999):04d}',
+                pet_count=pets_per_owner,
+            )
+            owner.update_search_keys()
+            owners.append(owner)
+        Owner.objects.using(self.using).bulk_create(owners)
+        OwnerNameWord.objects.using(self.using).bulk_create(OwnerNameWord.for_owners(owners))
+
+        pets, dates = [], []
+        for owner in owners:
+            for _ in range(pets_per_owner):
+                # The counters are known up front, no need to rebuild them
+                visit_dates = sorted(random_date(rng, VISIT_DATES) for _ in range(visits_per_pet))
+                pet = Pet(
+                    name=rng.choice(PET_NAMES),
+                    birth_date=random_date(rng, BIRTH_DATES),
+                    type_id=rng.choice(pet_types),
+                    owner_id=owner.pk,
+                    visit_count=visits_per_pet,
+                    last_visit_date=visit_dates[-1] if visit_dates else None,
+                )
+                pet.update_search_keys()
+                pets.append(pet)
+                dates.append(visit_dates)
+        Pet.objects.using(self.using).bulk_create(pets)
+
+        visits = [
+            Visit(pet_id=pet.pk, date=date, description=rng.choice(VISIT_DESCRIPTIONS))
+            for pet, visit_dates in zip(pets, dates)
+            for date in visit_dates
+        ]
+        Visit.objects.using(self.using).bulk_create(visits)
+        return {'owners': len(owners), 'pets': len(pets), 'visits': len(visits)}
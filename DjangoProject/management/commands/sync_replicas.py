@@ -0,0 +1,55 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the primary SQLite database into each replica with the SQLite '
+        'backup API. A local stand-in for real replication.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', action='append', dest='replicas', metavar='ALIAS',
+            help='Replica to sync (can be repeated, default: all of DATABASE_REPLICAS).',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Keep syncing every INTERVAL seconds instead of syncing once.',
+        )
+
+    def handle(self, *args, **options):
+        aliases = options['replicas'] or settings.DATABASE_REPLICAS
+        if not aliases:
+            raise CommandError('No replicas configured, set SQLITE_REPLICAS.')
+        for alias in [DEFAULT_DB_ALIAS, *aliases]:
+            if alias not in connections.settings:
+                raise CommandError(f'Unknown database {alias!r}.')
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f'Database {alias!r} is not a SQLite database.')
+
+        while True:
+            for alias in aliases:
+                start = time.perf_counter()
+                self.sync(alias)
+                elapsed = (time.perf_counter() - start) * 1000
+                if options['verbosity'] >= 1:
+                    self.stdout.write(f'Synced {alias} in {elapsed:.1f} ms')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def sync(self, alias):
+        """Overwrite the replica with a consistent snapshot of the primary"""
+        # Names are URIs for Django's SQLite backend, e.g. the shared in-memory test database
+        source = sqlite3.connect(connections[DEFAULT_DB_ALIAS].settings_dict['NAME'], uri=True)
+        target = sqlite3.connect(connections[alias].settings_dict['NAME'], uri=True)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
@@ -0,0 +1,221 @@
+"""
+Per-view request metrics, served in the Prometheus text format at /metrics.
+
+MetricsMiddleware records, for every request and under the name of the
+URL pattern it resolved to (e.g. owners:owner-detail):
+
+- the wall time of the request
+- the number of SQL queries and the time spent in them, measured by
+  an execute wrapper that record_queries_of() installs on every
+  database connection when it opens. It hands each query to the
+  QueryRecorder of the request in a context variable, which follows the
+  request into the thread where its async ORM queries run
+- the time spent rendering templates, see templating.collect()
+- the size of the response body (not measured for streamed responses)
+
+Each goes into a histogram of the in-process registry, so every worker
+keeps its own and the scraper sums them. A query whose SQL runs
+METRICS_DUPLICATE_QUERIES times or more in one request, whatever its
+parameters, is logged as a suspected N+1 and counted in
+django_request_duplicate_queries_total.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .templating import collect
+
+logger = logging.getLogger(__name__)
+
+_recorder = ContextVar('query_recorder', default=None)
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (1000, 10000, 100000, 1000000, 10000000)
+
+# Name, help and buckets of the histograms
+HISTOGRAMS = {
+    'django_request_duration_seconds': ('Wall time of the requests.', TIME_BUCKETS),
+    'django_request_queries': ('SQL queries run per request.', COUNT_BUCKETS),
+    'django_request_query_duration_seconds': ('Time spent in SQL queries per request.', TIME_BUCKETS),
+    'django_request_template_duration_seconds': ('Time spent rendering templates per request.', TIME_BUCKETS),
+    'django_response_size_bytes': ('Size of the response bodies, streamed ones excepted.', SIZE_BUCKETS),
+}
+COUNTERS = {
+    'django_request_duplicate_queries_total': 'Queries repeated within a request, suspected N+1s.',
+}
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observed values"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """The histograms and counters of this process, by metric and view"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.histograms = {}
+        self.counters = {}
+
+    def observe(self, metric, view, value):
+        with self.lock:
+            if (metric, view) not in self.histograms:
+                self.histograms[metric, view] = Histogram(HISTOGRAMS[metric][1])
+            self.histograms[metric, view].observe(value)
+
+    def increment(self, metric, view, amount=1):
+        with self.lock:
+            self.counters[metric, view] = self.counters.get((metric, view), 0) + amount
+
+    def render(self):
+        """Return the metrics in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            for metric, (help_text, _) in HISTOGRAMS.items():
+                lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} histogram']
+                for (name, view), histogram in sorted(self.histograms.items()):
+                    if name != metric:
+                        continue
+                    label = f'view="{escape(view)}"'
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{metric}_bucket{{{label},le="{bound}"}} {count}')
+                    lines.append(f'{metric}_bucket{{{label},le="+Inf"}} {histogram.count}')
+                    lines.append(f'{metric}_sum{{{label}}} {histogram.sum:.6g}')
+                    lines.append(f'{metric}_count{{{label}}} {histogram.count}')
+            for metric, help_text in COUNTERS.items():
+                lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+                for (name, view), value in sorted(self.counters.items()):
+                    if name == metric:
+                        lines.append(f'{metric}{{view="{escape(view)}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value):
+    """Escape a label value of the text format"""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
+
+
+class QueryRecorder:
+    """An execute_wrapper counting the queries of a request, their time and how often each SQL ran"""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+    def duplicates(self, threshold):
+        """Return the (sql, times) of the statements run at least threshold times"""
+        return [(sql, times) for sql, times in self.statements.most_common() if times >= threshold]
+
+
+def record_queries(execute, sql, params, many, context):
+    """Execute wrapper passing the query to the QueryRecorder of the current request, if any"""
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def record_queries_of(sender, connection, **kwargs):
+    """connection_created receiver installing record_queries on the new connection"""
+    if record_queries not in connection.execute_wrappers:
+        # First, as connection.execute_wrapper() pops the last wrapper on exit
+        connection.execute_wrappers.insert(0, record_queries)
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match and match.view_name else '<unresolved>'
+
+
+class MetricsMiddleware:
+    """
+    Record the wall time, SQL queries, template time and response size of
+    every request when METRICS_ENABLED is on. Place it first so the wall
+    time covers the other middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            return self.get_response(request)
+        recorder = QueryRecorder()
+        token = _recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            with collect() as timings:
+                response = self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        self.record(request, response, time.perf_counter() - start, recorder, timings)
+        return response
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            return await self.get_response(request)
+        recorder = QueryRecorder()
+        token = _recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            with collect() as timings:
+                response = await self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        self.record(request, response, time.perf_counter() - start, recorder, timings)
+        return response
+
+    def record(self, request, response, elapsed, recorder, timings):
+        view = view_name(request)
+        registry.observe('django_request_duration_seconds', view, elapsed)
+        registry.observe('django_request_queries', view, recorder.count)
+        registry.observe('django_request_query_duration_seconds', view, recorder.time)
+        registry.observe('django_request_template_duration_seconds', view, timings.render_time)
+        if not response.streaming:
+            registry.observe('django_response_size_bytes', view, len(response.content))
+        for sql, times in recorder.duplicates(getattr(settings, 'METRICS_DUPLICATE_QUERIES', 3)):
+            registry.increment('django_request_duplicate_queries_total', view, times - 1)
+            logger.warning('Suspected N+1 in %s (%s %s): %d times %s',
+                           view, request.method, request.path, times, sql)
@@ -0,0 +1,234 @@
+"""
+Full-page cache for anonymous GET requests.
+
+Views opt in with the page_cache decorator, naming the groups their
+pages belong to:
+
+    @page_cache('vets', query_params=['specialty', 'cursor'])
+    class VetListView(...):
+
+PageCacheMiddleware then stores their responses under the path and query
+string, for anonymous users only. Model signal receivers call
+purge('vets') when a vet changes, which bumps the version of the group:
+only the pages of that group go stale, nothing else is evicted.
+
+Stale pages are kept for PAGE_CACHE_STALE_SECONDS after they stop being
+fresh. With PAGE_CACHE_STALE_WHILE_REVALIDATE on, the first request for a
+stale page takes a short lock and renders it again, while concurrent
+requests keep getting the stale copy. A purge therefore costs one render
+per page instead of one render per waiting request.
+
+A page rendered to be stored reads from the primary database: a replica
+lagging behind the change that purged it would otherwise be cached under
+the new version until the next purge.
+
+The cache is off unless PAGE_CACHE_ENABLED is set. The pages then need a
+cache shared by every worker: the lock only holds back the requests of
+workers reading the same cache, so a system check refuses process memory
+outside of DEBUG.
+"""
+import hashlib
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+
+from .fragments import aget_versions, bump, get_versions
+from .routers import pin_to_primary
+
+HEADER = 'X-Page-Cache'
+
+
+def page_cache(*groups, query_params=None):
+    """
+    Mark a view function or class as cacheable by PageCacheMiddleware.
+
+    groups are the purge groups of its pages. If query_params is given,
+    requests with any other query parameter are not cached, e.g. ()
+    caches only the bare URL.
+    """
+    def decorator(view):
+        view.page_cache_groups = tuple(groups)
+        view.page_cache_query_params = None if query_params is None else frozenset(query_params)
+        return view
+    return decorator
+
+
+def page_cache_settings():
+    """Return the cache, fresh seconds, stale seconds and lock seconds of the page cache"""
+    return (
+        caches[getattr(settings, 'PAGE_CACHE_ALIAS', 'default')],
+        getattr(settings, 'PAGE_CACHE_SECONDS', 300),
+        getattr(settings, 'PAGE_CACHE_STALE_SECONDS', 3600),
+        getattr(settings, 'PAGE_CACHE_LOCK_SECONDS', 30),
+    )
+
+
+def group_label(group):
+    return f'page:{group}'
+
+
+def purge(*groups):
+    """Make every cached page of the given groups stale"""
+    for group in groups:
+        bump(group_label(group))
+
+
+class PageCacheMiddleware:
+    """
+    Serve and store the pages of views marked with page_cache. Place it
+    after AuthenticationMiddleware so it can tell anonymous users apart.
+    Under ASGI the cache is read and written through the async cache API,
+    so that a slow cache does not block the event loop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # Else the handler would run process_view in a thread
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.store(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return await self.astore(request, await self.get_response(request))
+
+    def store(self, request, response):
+        """Cache the response of a request that process_view marked as pending"""
+        pending = getattr(request, '_page_cache', None)
+        if pending is not None:
+            key, version, lock_key, pin = pending
+            pin.close()
+            cache, fresh, stale, _ = page_cache_settings()
+            try:
+                if self.cacheable_response(request, response):
+                    cache.set(key, self.entry(version, response), fresh + stale)
+                    if not response.has_header(HEADER):
+                        response[HEADER] = 'miss'
+            finally:
+                if lock_key:
+                    cache.delete(lock_key)
+        return response
+
+    async def astore(self, request, response):
+        """Like store(), through the async cache API"""
+        pending = getattr(request, '_page_cache', None)
+        if pending is not None:
+            key, version, lock_key, pin = pending
+            pin.close()
+            cache, fresh, stale, _ = page_cache_settings()
+            try:
+                if self.cacheable_response(request, response):
+                    await cache.aset(key, self.entry(version, response), fresh + stale)
+                    if not response.has_header(HEADER):
+                        response[HEADER] = 'miss'
+            finally:
+                if lock_key:
+                    await cache.adelete(lock_key)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        return self.lookup(request, view_func)
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'view_class', view_func)
+        if getattr(view, 'page_cache_groups', None) is not None:
+            # cacheable_request() reads request.user, load it without blocking
+            request.user = await request.auser()
+        return await self.alookup(request, view_func)
+
+    def target(self, request, view_func):
+        """Return the cache key and version labels of the page of a request, or None if it is not cached"""
+        view = getattr(view_func, 'view_class', view_func)
+        groups = getattr(view, 'page_cache_groups', None)
+        if groups is None or not self.cacheable_request(request, view.page_cache_query_params):
+            return None
+        url = request.get_full_path()
+        key = f'page:{hashlib.md5(url.encode(), usedforsecurity=False).hexdigest()}'
+        return key, [group_label(group) for group in groups]
+
+    def lookup(self, request, view_func):
+        """Return the cached page for the request, or mark the request to store its response"""
+        target = self.target(request, view_func)
+        if target is None:
+            return None
+        key, labels = target
+        cache, fresh, _, lock_seconds = page_cache_settings()
+        version = get_versions(labels)
+        entry = cache.get(key)
+        if entry is not None:
+            if self.is_fresh(entry, version, fresh):
+                return self.cached(entry['response'], 'hit')
+            if getattr(settings, 'PAGE_CACHE_STALE_WHILE_REVALIDATE', True):
+                lock_key = f'{key}:lock'
+                if not cache.add(lock_key, 1, lock_seconds):
+                    # Someone else is already rendering a fresh copy
+                    return self.cached(entry['response'], 'stale')
+                return self.pending(request, key, version, lock_key)
+        return self.pending(request, key, version, None)
+
+    async def alookup(self, request, view_func):
+        """Like lookup(), through the async cache API"""
+        target = self.target(request, view_func)
+        if target is None:
+            return None
+        key, labels = target
+        cache, fresh, _, lock_seconds = page_cache_settings()
+        version = await aget_versions(labels)
+        entry = await cache.aget(key)
+        if entry is not None:
+            if self.is_fresh(entry, version, fresh):
+                return self.cached(entry['response'], 'hit')
+            if getattr(settings, 'PAGE_CACHE_STALE_WHILE_REVALIDATE', True):
+                lock_key = f'{key}:lock'
+                if not await cache.aadd(lock_key, 1, lock_seconds):
+                    # Someone else is already rendering a fresh copy
+                    return self.cached(entry['response'], 'stale')
+                return self.pending(request, key, version, lock_key)
+        return self.pending(request, key, version, None)
+
+    def pending(self, request, key, version, lock_key):
+        """Mark the request to store its response, and pin its reads to the primary"""
+        pin = ExitStack()
+        pin.enter_context(pin_to_primary())
+        request._page_cache = (key, version, lock_key, pin)
+        return None
+
+    def cacheable_request(self, request, query_params):
+        if not getattr(settings, 'PAGE_CACHE_ENABLED', False):
+            return False
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        if query_params is not None and not set(request.GET) <= query_params:
+            return False
+        return not request.user.is_authenticated
+
+    def cacheable_response(self, request, response):
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+            and 'private' not in response.get('Cache-Control', '')
+            and 'no-store' not in response.get('Cache-Control', '')
+        )
+
+    def entry(self, version, response):
+        return {'version': version, 'time': time.time(), 'response': response}
+
+    def is_fresh(self, entry, version, fresh):
+        return entry['version'] == version and time.time() - entry['time'] < fresh
+
+    def cached(self, response, state):
+        # Every cache get unpickles a new response, so it can be modified
+        response[HEADER] = state
+        return response
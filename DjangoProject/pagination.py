@@ -0,0 +1,357 @@
+"""
+Keyset (seek) pagination.
+
+Instead of OFFSET, a page is located by the sort key of the row just
+before it: with an ordering of (last_name, first_name, pk), the page
+after an owner (Doe, John, 42) is fetched with
+
+    WHERE last_name > 'Doe'
+       OR (last_name = 'Doe' AND first_name > 'John')
+       OR (last_name = 'Doe' AND first_name = 'John' AND id > 42)
+
+which an index on the ordering answers by seeking straight to the row,
+so deep pages cost the same as the first one. Cursors are opaque,
+URL-safe strings that carry the sort key of a page boundary.
+"""
+import base64
+import binascii
+import hashlib
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Max, Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor cannot be decoded"""
+
+
+def encode_cursor(data):
+    """Return an opaque URL-safe cursor for a JSON serializable value"""
+    raw = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the value encoded in a cursor or raise InvalidCursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        return json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as error:
+        raise InvalidCursor(f'Invalid cursor: {cursor!r}') from error
+
+
+def get_ordering(queryset):
+    """
+    Return the ordering of a queryset as a list of (field, descending)
+    pairs, falling back to Meta.ordering and always ending with the
+    primary key so that every row has a unique sort key
+    """
+    ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+    fields = []
+    for name in ordering:
+        if not isinstance(name, str) or '__' in name or name.lstrip('-') == '?':
+            raise ValueError(
+                f'Keyset pagination needs plain field names to order by, got {name!r}.'
+            )
+        descending = name.startswith('-')
+        name = name.lstrip('-')
+        if name == queryset.model._meta.pk.name:
+            name = 'pk'
+        fields.append((name, descending))
+    if 'pk' not in (name for name, _ in fields):
+        fields.append(('pk', False))
+    return fields
+
+
+def keyset_q(ordering, values, reverse=False):
+    """
+    Return a Q object matching the rows after values in the given ordering.
+
+    The condition is nested as (a > x OR (a = x AND (b > y OR ...))) and
+    prefixed with a >= x, which lets the database seek into an index on
+    the ordering instead of scanning it from the start.
+    """
+    condition = None
+    for (name, descending), value in reversed(list(zip(ordering, values))):
+        after = Q(**{f"{name}__{'lt' if descending != reverse else 'gt'}": value})
+        condition = after if condition is None else after | (Q(**{name: value}) & condition)
+    (name, descending), value = ordering[0], values[0]
+    return Q(**{f"{name}__{'lte' if descending != reverse else 'gte'}": value}) & condition
+
+
+def order_by(queryset, ordering, reverse=False):
+    """Return the queryset explicitly ordered by ordering, possibly reversed"""
+    return queryset.order_by(*[
+        f"{'-' if descending != reverse else ''}{name}" for name, descending in ordering
+    ])
+
+
+def sort_key(obj, ordering):
+    """Return the values of the ordering fields for obj, a model instance or a values() row"""
+    if isinstance(obj, dict):
+        return [obj[name] for name, _ in ordering]
+    return [obj.pk if name == 'pk' else obj.serializable_value(name) for name, _ in ordering]
+
+
+def estimate_count(queryset):
+    """
+    Return a cheap estimate of the number of rows in an unfiltered
+    queryset, or None if the backend has no cheap way to estimate it.
+
+    PostgreSQL keeps a row estimate in its catalog. Elsewhere the largest
+    primary key is read from the primary key index, which is exact until
+    rows get deleted and an upper bound afterwards.
+    """
+    if queryset.query.where:
+        return None
+    model = queryset.model
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return row[0]
+        return None
+    if model._meta.pk.get_internal_type() in ('AutoField', 'BigAutoField', 'SmallAutoField'):
+        return queryset.order_by().aggregate(largest=Max('pk'))['largest'] or 0
+    return None
+
+
+class KeysetPage:
+    """A page of results located by cursor rather than by number"""
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<KeysetPage of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginate an ordered queryset by cursor.
+
+    object_list is a queryset, possibly of values() rows that include
+    the ordering fields, or an object such as OwnerSearch whose tiers()
+    method returns a list of querysets that are read one after the
+    other. Each queryset is paginated on its own ordering (or its
+    model's Meta.ordering), which must consist of plain field names.
+
+    Pages never need the total number of rows. If one is wanted for
+    display, count_mode selects how the count property provides it:
+    None skips it, 'cached' caches the exact count for count_timeout
+    seconds and 'estimated' uses estimate_count(), falling back to the
+    cached count when there is no estimate.
+    """
+
+    COUNT_MODES = (None, 'cached', 'estimated')
+
+    def __init__(self, object_list, per_page, count_mode=None, count_timeout=300):
+        if count_mode not in self.COUNT_MODES:
+            raise ValueError(f'count_mode must be one of {self.COUNT_MODES}, got {count_mode!r}.')
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.count_mode = count_mode
+        self.count_timeout = count_timeout
+        if hasattr(object_list, 'tiers'):
+            self.segments = object_list.tiers()
+        else:
+            self.segments = [object_list]
+        self.orderings = [get_ordering(segment) for segment in self.segments]
+
+    @cached_property
+    def count(self):
+        """Return the total number of rows as selected by count_mode, or None"""
+        if self.count_mode is None:
+            return None
+        if self.count_mode == 'estimated' and len(self.segments) == 1:
+            estimate = estimate_count(self.segments[0])
+            if estimate is not None:
+                return estimate
+        return cache.get_or_set(self.count_cache_key(), self.exact_count, self.count_timeout)
+
+    def exact_count(self):
+        """Return the exact total number of rows"""
+        return sum(segment.count() for segment in self.segments)
+
+    def count_cache_key(self):
+        """Return a cache key identifying the SQL of the paginated rows"""
+        digest = hashlib.md5(usedforsecurity=False)
+        for segment in self.segments:
+            digest.update(segment.db.encode())
+            digest.update(str(segment.query).encode())
+        return f'keyset-count:{digest.hexdigest()}'
+
+    async def acount(self):
+        """Compute count in a thread, so that templates rendered by async views can read it"""
+        if 'count' not in self.__dict__:
+            # The estimate runs raw SQL, which has no async API
+            await sync_to_async(lambda: self.count)()
+        return self.count
+
+    def page(self, cursor=None):
+        """Return the KeysetPage starting at cursor, or the first page"""
+        if not cursor:
+            return self._forward(0, None, has_previous=False)
+        segment, values, direction = self._locate(cursor)
+        if direction == 'next':
+            return self._forward(segment, values, has_previous=True)
+        return self._backward(segment, values)
+
+    async def apage(self, cursor=None):
+        """Async counterpart of page(), reading the rows with the async ORM"""
+        if not cursor:
+            return await self._aforward(0, None, has_previous=False)
+        segment, values, direction = self._locate(cursor)
+        if direction == 'next':
+            return await self._aforward(segment, values, has_previous=True)
+        return await self._abackward(segment, values)
+
+    def _locate(self, cursor):
+        """Return the segment, sort key and direction encoded in a cursor"""
+        data = decode_cursor(cursor)
+        try:
+            segment, values, direction = data['s'], data['k'], data['d']
+            if not 0 <= segment < len(self.segments) or direction not in ('next', 'prev'):
+                raise ValueError
+            if len(values) != len(self.orderings[segment]):
+                raise ValueError
+        except (KeyError, TypeError, ValueError) as error:
+            raise InvalidCursor(f'Invalid cursor: {cursor!r}') from error
+        return segment, values, direction
+
+    def _cursor(self, segment, obj, direction):
+        return encode_cursor({
+            's': segment,
+            'k': sort_key(obj, self.orderings[segment]),
+            'd': direction,
+        })
+
+    def _rows(self, segment, values, limit, reverse=False):
+        """Return the queryset of up to limit rows of a segment after values"""
+        ordering = self.orderings[segment]
+        queryset = self.segments[segment]
+        if values is not None:
+            queryset = queryset.filter(keyset_q(ordering, values, reverse))
+        return order_by(queryset, ordering, reverse)[:limit]
+
+    def _fetch(self, segment, values, limit, reverse=False):
+        """Return up to limit rows of a segment after values, tagged with the segment"""
+        return [(segment, obj) for obj in self._rows(segment, values, limit, reverse)]
+
+    async def _afetch(self, segment, values, limit, reverse=False):
+        return [(segment, obj) async for obj in self._rows(segment, values, limit, reverse)]
+
+    def _forward(self, segment, values, has_previous):
+        rows = []
+        wanted = self.per_page + 1
+        while segment < len(self.segments) and len(rows) < wanted:
+            rows.extend(self._fetch(segment, values, wanted - len(rows)))
+            segment, values = segment + 1, None
+        return self._make_page(rows, has_next=len(rows) > self.per_page,
+                               has_previous=has_previous)
+
+    async def _aforward(self, segment, values, has_previous):
+        rows = []
+        wanted = self.per_page + 1
+        while segment < len(self.segments) and len(rows) < wanted:
+            rows.extend(await self._afetch(segment, values, wanted - len(rows)))
+            segment, values = segment + 1, None
+        return self._make_page(rows, has_next=len(rows) > self.per_page,
+                               has_previous=has_previous)
+
+    def _backward(self, segment, values):
+        rows = []
+        wanted = self.per_page + 1
+        while segment >= 0 and len(rows) < wanted:
+            rows.extend(self._fetch(segment, values, wanted - len(rows), reverse=True))
+            segment, values = segment - 1, None
+        return self._make_backward_page(rows)
+
+    async def _abackward(self, segment, values):
+        rows = []
+        wanted = self.per_page + 1
+        while segment >= 0 and len(rows) < wanted:
+            rows.extend(await self._afetch(segment, values, wanted - len(rows), reverse=True))
+            segment, values = segment - 1, None
+        return self._make_backward_page(rows)
+
+    def _make_backward_page(self, rows):
+        has_previous = len(rows) > self.per_page
+        rows.reverse()
+        if has_previous:
+            rows = rows[1:]
+        return self._make_page(rows, has_next=True, has_previous=has_previous, extra=False)
+
+    def _make_page(self, rows, has_next, has_previous, extra=True):
+        if extra:
+            rows = rows[:self.per_page]
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self._cursor(*rows[-1], 'next')
+        if rows and has_previous:
+            previous_cursor = self._cursor(*rows[0], 'prev')
+        return KeysetPage([obj for _, obj in rows], self, next_cursor, previous_cursor)
+
+
+class KeysetPaginationMixin:
+    """
+    Mixin for ListView that paginates by cursor instead of page number,
+    avoiding both the COUNT(*) and the OFFSET scan of Django's Paginator.
+
+    The page is selected with ?cursor= and the template receives the
+    KeysetPage as page_obj, with next_cursor and previous_cursor for the
+    navigation links. Set count_mode to 'cached' or 'estimated' to also
+    provide paginator.count.
+    """
+    paginator_class = KeysetPaginator
+    cursor_kwarg = 'cursor'
+    count_mode = None
+    count_timeout = 300
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        """Return a KeysetPaginator; orphans are meaningless without page numbers"""
+        return self.paginator_class(
+            queryset, per_page, count_mode=self.count_mode,
+            count_timeout=self.count_timeout, **kwargs
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        """Return the page located by the cursor in the query string"""
+        paginator = self.get_paginator(queryset, page_size)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor:
+            raise Http404('Invalid cursor')
+        return (paginator, page, page.object_list, page.has_other_pages())
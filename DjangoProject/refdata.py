@@ -0,0 +1,184 @@
+"""
+In-process cache of small reference tables.
+
+Tables such as PetType and Specialty hold a handful of rows that are
+read on every form render and nearly never written. A ReferenceCache
+keeps all rows of such a model in process memory and reloads them only
+when their generation changes.
+
+The generation is a counter stored in the cache named by
+settings.REFERENCE_CACHE_ALIAS, which must be shared by every worker:
+the 'versions' cache, kept in files or Redis. A system check refuses
+process memory outside of DEBUG. Saving or deleting a row bumps it, and
+bumps it again when the transaction commits, so every worker notices the
+change and reloads the table with a single query. A worker reads the
+generation at most once every REFERENCE_CACHE_CHECK_SECONDS rather than
+on every read: a list rendering a pet type per row would otherwise read
+the shared cache once per row. The worker that made a change sees it
+right away, the others within that delay.
+
+ReferenceChoiceField and ReferenceMultipleChoiceField are drop-in form
+fields for foreign keys and many-to-many relations to cached models:
+they render and validate their choices from the cache without queries.
+"""
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django import forms
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+
+class ReferenceCache:
+    """Read-through cache of every row of a small model"""
+
+    registry = {}
+
+    def __init__(self, model):
+        self.model = model
+        self.generation_key = f'refdata-generation:{model._meta.label_lower}'
+        self._lock = threading.Lock()
+        self._generation = None
+        # time.monotonic() until which the copy is used without reading the generation
+        self._checked_until = 0
+        self._objects = {}
+        self.registry[model] = self
+        label = model._meta.label_lower
+        post_save.connect(self._changed, sender=model, weak=False,
+                          dispatch_uid=f'refdata:{label}:post_save')
+        post_delete.connect(self._changed, sender=model, weak=False,
+                            dispatch_uid=f'refdata:{label}:post_delete')
+
+    @classmethod
+    def for_model(cls, model):
+        """Return the cache registered for model"""
+        return cls.registry[model]
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'REFERENCE_CACHE_ALIAS', 'default')]
+
+    def generation(self):
+        """Return the shared generation of the table, creating it if needed"""
+        generation = self.cache.get(self.generation_key)
+        if generation is None:
+            # Clock based, so that a lost counter never matches an old copy
+            generation = time.time_ns() // 1000
+            if not self.cache.add(self.generation_key, generation, timeout=None):
+                generation = self.cache.get(self.generation_key, generation)
+        return generation
+
+    def is_checked(self):
+        """Return whether the copy was checked against the generation recently enough to be used as is"""
+        return self._generation is not None and time.monotonic() < self._checked_until
+
+    def objects(self):
+        """Return {pk: instance} for every row, reloading if the table changed"""
+        if self.is_checked():
+            return self._objects
+        generation = self.generation()
+        if generation != self._generation:
+            with self._lock:
+                if generation != self._generation:
+                    queryset = self.model._default_manager.all()
+                    self._objects = {obj.pk: obj for obj in queryset}
+                    self._generation = generation
+        self._checked_until = time.monotonic() + getattr(settings, 'REFERENCE_CACHE_CHECK_SECONDS', 1)
+        return self._objects
+
+    def all(self):
+        """Return every row, in the model's default ordering"""
+        return list(self.objects().values())
+
+    async def aall(self):
+        """Async counterpart of all(), leaving the event loop only to check the generation"""
+        if not self.is_checked():
+            await sync_to_async(self.objects)()
+        return list(self._objects.values())
+
+    def get(self, pk):
+        """Return the row with primary key pk, or None"""
+        try:
+            pk = self.model._meta.pk.to_python(pk)
+        except ValidationError:
+            return None
+        return self.objects().get(pk)
+
+    def invalidate(self):
+        """Make every process reload the table on its next read"""
+        self._generation = None
+        try:
+            self.cache.incr(self.generation_key)
+        except ValueError:
+            self.cache.delete(self.generation_key)
+
+    def _changed(self, sender, using, **kwargs):
+        # Once now, so that this transaction reads its own change, and once
+        # on commit, for the workers that reloaded before it became visible
+        self.invalidate()
+        transaction.on_commit(self.invalidate, using=using)
+
+
+class ReferenceChoiceIterator(forms.models.ModelChoiceIterator):
+    """Choices of a model choice field read from its ReferenceCache"""
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        for obj in self.field.reference.all():
+            yield self.choice(obj)
+
+    def __len__(self):
+        return len(self.field.reference.objects()) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.field.reference.objects())
+
+
+class ReferenceFieldMixin:
+    iterator = ReferenceChoiceIterator
+
+    @property
+    def reference(self):
+        return ReferenceCache.for_model(self.queryset.model)
+
+    def lookup(self, value):
+        """Return the cached instance for a submitted value or raise ValidationError"""
+        if isinstance(value, self.queryset.model):
+            value = value.pk
+        obj = self.reference.get(value)
+        if obj is None:
+            raise ValidationError(
+                self.error_messages['invalid_choice'], code='invalid_choice',
+                params={'value': value},
+            )
+        return obj
+
+
+class ReferenceChoiceField(ReferenceFieldMixin, forms.ModelChoiceField):
+    """ModelChoiceField whose choices and validation come from a ReferenceCache"""
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        return self.lookup(value)
+
+
+class ReferenceMultipleChoiceField(ReferenceFieldMixin, forms.ModelMultipleChoiceField):
+    """ModelMultipleChoiceField whose choices and validation come from a ReferenceCache"""
+
+    def clean(self, value):
+        value = self.prepare_value(value)
+        if self.required and not value:
+            raise ValidationError(self.error_messages['required'], code='required')
+        if not value:
+            return []
+        if not isinstance(value, (list, tuple)):
+            raise ValidationError(self.error_messages['invalid_list'], code='invalid_list')
+        objects = [self.lookup(item) for item in dict.fromkeys(value)]
+        self.run_validators(value)
+        return objects
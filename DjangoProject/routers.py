@@ -0,0 +1,122 @@
+"""
+Primary/replica database routing.
+
+Writes always go to the default (primary) database. Reads go to one of
+the aliases in settings.DATABASE_REPLICAS, picked at random, unless the
+current request is pinned to the primary:
+
+- requests with an unsafe method (POST, PUT, ...) are pinned for their
+  whole duration, so form validation reads what the write will see
+- responses to those requests set a short-lived cookie that pins the
+  following requests too, so the redirect after a save reads its own
+  write while the replicas catch up
+- reads inside a transaction on the primary stay on the primary
+- pages and fragments rendered to be cached read from the primary, see
+  pagecache.py and fragments.py
+
+With no replicas configured every query goes to the default database.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'db_pin'
+
+_pinned = ContextVar('db_pinned', default=False)
+
+
+def replicas():
+    """Return the aliases of the read replicas"""
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def is_pinned():
+    """Return True if reads of the current context must use the primary"""
+    return _pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block
+
+
+@contextmanager
+def pin_to_primary():
+    """Send all reads inside the block to the primary"""
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """Send writes to the primary and reads to a replica when not pinned"""
+
+    def db_for_read(self, model, **hints):
+        aliases = replicas()
+        if not aliases or is_pinned():
+            return DEFAULT_DB_ALIAS
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive their schema from the primary
+        return db not in replicas()
+
+
+class ReplicaPinningMiddleware:
+    """
+    Pin unsafe requests, and the requests that follow them within
+    settings.REPLICA_PIN_SECONDS, to the primary database.
+    """
+
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not replicas():
+            return self.get_response(request)
+        token = _pinned.set(self.pinned(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _pinned.reset(token)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        if not replicas():
+            return await self.get_response(request)
+        token = _pinned.set(self.pinned(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _pinned.reset(token)
+        return self.process_response(request, response)
+
+    def pinned(self, request):
+        return request.method not in self.SAFE_METHODS or PIN_COOKIE in request.COOKIES
+
+    def process_response(self, request, response):
+        if request.method not in self.SAFE_METHODS:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 10),
+                httponly=True, samesite='Lax',
+            )
+        return response
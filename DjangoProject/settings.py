@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -39,6 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
 
     # Petclinic apps
+    'DjangoProject',
     'owners',
     'pets',
     'vets',
@@ -46,13 +49,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'DjangoProject.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'DjangoProject.routers.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'DjangoProject.templating.TemplateTimingMiddleware',
+    'DjangoProject.pagecache.PageCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'DjangoProject.urls'
@@ -60,32 +67,198 @@ ROOT_URLCONF = 'DjangoProject.urls'
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [BASE_DIR / 'templates']
-        ,
-        'APP_DIRS': True,
+        'DIRS': [BASE_DIR / 'templates'],
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'DjangoProject.context_processors.events',
+            ],
+            # Compile each template once per process. The runserver
+            # autoreloader still clears the cache when a template changes.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
             ],
         },
     },
 ]
 
+# Compile every template of DIRS when a server starts, see DjangoProject/templating.py
+TEMPLATE_PREWARM = os.environ.get('TEMPLATE_PREWARM', '0' if DEBUG else '1') == '1'
+# Report template and block render times in a Server-Timing header
+TEMPLATE_PROFILING = os.environ.get('TEMPLATE_PROFILING', '0') == '1'
+
 WSGI_APPLICATION = 'DjangoProject.wsgi.application'
 
+# Route the read views (home, owner list, search and detail, pet detail,
+# vet list) to their async counterparts, for serving with an ASGI server.
+# Read when the URLconfs are imported.
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', '0') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite is tuned per connection by DjangoProject.sqlite from the PRAGMAS
+# of each database. Every value can be overridden per environment.
+SQLITE_PRAGMAS = {
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),  # ms
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),  # bytes
+    'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64000)),  # negative: KiB
+    'temp_store': os.environ.get('SQLITE_TEMP_STORE', 'MEMORY'),
+    'foreign_keys': 'ON',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        'OPTIONS': {
+            # Take the write lock when a transaction starts, so concurrent
+            # writers wait on busy_timeout instead of failing to upgrade
+            'transaction_mode': os.environ.get('SQLITE_TRANSACTION_MODE', 'IMMEDIATE') or None,
+            'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000,
+        },
+        'PRAGMAS': SQLITE_PRAGMAS,
     }
 }
 
+# Read replicas, as a comma separated list of SQLite files. Locally they
+# are kept in sync with `python manage.py sync_replicas --interval 1`.
+DATABASE_REPLICAS = []
+for index, path in enumerate(filter(None, os.environ.get('SQLITE_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{index}'] = {
+        **DATABASES['default'],
+        'NAME': path.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{index}')
+
+DATABASE_ROUTERS = ['DjangoProject.routers.PrimaryReplicaRouter']
+
+# How long reads stay on the primary after a write, in seconds
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 10))
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# Storage for the fragment cache, selected with FRAGMENT_CACHE. Locally a
+# redis-server (or any server speaking its protocol) stands in for Redis.
+FRAGMENT_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragments',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get(
+            'FRAGMENT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'petclinic-fragments')
+        ),
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/1'),
+    },
+}
+
+# Storage for the version numbers and generations that invalidate the
+# in-process caches, selected with VERSION_CACHE. Every worker must read
+# the same one, so it defaults to files rather than process memory.
+VERSION_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'versions',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get(
+            'VERSION_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'petclinic-versions')
+        ),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/1'),
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'fragments': {
+        **FRAGMENT_CACHE_BACKENDS[os.environ.get('FRAGMENT_CACHE', 'locmem')],
+        'KEY_PREFIX': 'petclinic',
+    },
+    'versions': {
+        **VERSION_CACHE_BACKENDS[os.environ.get('VERSION_CACHE', 'file')],
+        'KEY_PREFIX': 'petclinic',
+        # Versions are never expired, a lost one is replaced by a newer one
+        'TIMEOUT': None,
+    },
+}
+
+# Fragments are invalidated by version, so they only expire to free space
+FRAGMENT_CACHE_ALIAS = 'fragments'
+# Holds the versions, shared by every worker like REFERENCE_CACHE_ALIAS
+FRAGMENT_VERSION_ALIAS = 'versions'
+FRAGMENT_CACHE_TIMEOUT = int(os.environ.get('FRAGMENT_CACHE_TIMEOUT', 24 * 60 * 60))
+
+# Holds the generations of the in-process reference data caches. It must
+# be shared by every worker for edits to reach all of them, which the
+# system checks of DjangoProject/checks.py enforce outside of DEBUG.
+REFERENCE_CACHE_ALIAS = 'versions'
+# Seconds a worker uses its copy of a reference table before reading the
+# generation again: changes made by other workers show up within this delay
+REFERENCE_CACHE_CHECK_SECONDS = float(os.environ.get('REFERENCE_CACHE_CHECK_SECONDS', 1))
+
+# Full-page cache of the views marked with DjangoProject.pagecache.page_cache,
+# off unless enabled. Outside of DEBUG it needs FRAGMENT_CACHE=file or redis.
+PAGE_CACHE_ENABLED = os.environ.get('PAGE_CACHE_ENABLED', '0') == '1'
+PAGE_CACHE_ALIAS = 'fragments'
+PAGE_CACHE_SECONDS = int(os.environ.get('PAGE_CACHE_SECONDS', 300))
+# Stale pages are kept this long to be served while one request refreshes them
+PAGE_CACHE_STALE_SECONDS = int(os.environ.get('PAGE_CACHE_STALE_SECONDS', 3600))
+PAGE_CACHE_STALE_WHILE_REVALIDATE = os.environ.get('PAGE_CACHE_STALE_WHILE_REVALIDATE', '1') == '1'
+PAGE_CACHE_LOCK_SECONDS = 30
+
+# Pets without a visit for this many days are due for their checkup, see pets/reminders.py
+CHECKUP_INTERVAL_DAYS = 365
+
+# Visits older than this many days are moved to VisitArchive by the
+# archive_visits command; the detail pages load them on demand
+VISIT_ARCHIVE_DAYS = int(os.environ.get('VISIT_ARCHIVE_DAYS', 2 * 365))
+
+# Per-view request metrics served at /metrics, see DjangoProject/metrics.py.
+# Off unless enabled.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0') == '1'
+# A query run this many times in one request is logged as a suspected N+1
+METRICS_DUPLICATE_QUERIES = int(os.environ.get('METRICS_DUPLICATE_QUERIES', 3))
+# Addresses allowed to scrape /metrics without logging in as staff, none by
+# default: behind a reverse proxy every request comes from its address
+METRICS_ALLOWED_IPS = list(filter(None, os.environ.get('METRICS_ALLOWED_IPS', '').split(',')))
+
+# Server-Sent Events of saved visits at /visits/events/, see DjangoProject/events.py.
+# LocalBroker serves one worker; several need a broker sharing a channel.
+EVENTS_BROKER = os.environ.get('EVENTS_BROKER', 'DjangoProject.events.LocalBroker')
+# Events kept for clients reconnecting with Last-Event-ID
+EVENTS_HISTORY = 1000
+# Events queued for a client before it is disconnected as too slow
+EVENTS_QUEUE_SIZE = 100
+# Open streams per worker, more are answered with 503
+EVENTS_MAX_SUBSCRIBERS = int(os.environ.get('EVENTS_MAX_SUBSCRIBERS', 1000))
+EVENTS_HEARTBEAT_SECONDS = 15
+# Streams are closed after this long without events; browsers reconnect
+EVENTS_IDLE_SECONDS = int(os.environ.get('EVENTS_IDLE_SECONDS', 300))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -0,0 +1,65 @@
+"""
+Per-connection SQLite tuning.
+
+SQLite keeps most of its tuning in PRAGMAs that only last for the
+connection that set them, so they are applied whenever Django opens a
+connection. Each database lists its PRAGMAs in DATABASES[alias]['PRAGMAS']:
+
+    'PRAGMAS': {
+        'busy_timeout': 5000,
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+    }
+
+busy_timeout is applied first, so that the statements after it already
+wait for locks instead of failing with "database is locked".
+"""
+import re
+
+from django.core.exceptions import ImproperlyConfigured
+
+# PRAGMA names and values are interpolated into SQL, so only identifiers
+# and (signed) integers are accepted
+NAME_RE = re.compile(r'^[a-z_]+$')
+VALUE_RE = re.compile(r'^(-?\d+|[A-Za-z_]+)$')
+
+# Applied before the others, in this order
+FIRST = ('busy_timeout',)
+
+
+def pragma_statements(pragmas):
+    """Return the PRAGMA statements that apply a mapping of PRAGMAs"""
+    names = [name for name in FIRST if name in pragmas]
+    names += [name for name in pragmas if name not in FIRST]
+    statements = []
+    for name in names:
+        value = str(pragmas[name])
+        if not NAME_RE.match(name) or not VALUE_RE.match(value):
+            raise ImproperlyConfigured(f'Invalid SQLite PRAGMA {name}={value!r}.')
+        statements.append(f'PRAGMA {name} = {value}')
+    return statements
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """connection_created receiver applying the PRAGMAS of a SQLite database"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = connection.settings_dict.get('PRAGMAS')
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for statement in pragma_statements(pragmas):
+            cursor.execute(statement)
+
+
+def current_pragmas(connection, names):
+    """Return the current value of each named PRAGMA on a connection"""
+    values = {}
+    with connection.cursor() as cursor:
+        for name in names:
+            if not NAME_RE.match(name):
+                raise ValueError(f'Invalid SQLite PRAGMA {name!r}.')
+            cursor.execute(f'PRAGMA {name}')
+            row = cursor.fetchone()
+            values[name] = row[0] if row else None
+    return values
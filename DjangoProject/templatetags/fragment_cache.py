@@ -0,0 +1,64 @@
+from django import template
+from django.template.base import token_kwargs
+
+from DjangoProject.fragments import get_or_render
+
+register = template.Library()
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, name, dependencies, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.dependencies = dependencies
+        self.vary_on = vary_on
+
+    def render(self, context):
+        dependencies = [dependency.resolve(context) for dependency in self.dependencies]
+        vary_on = [value.resolve(context) for value in self.vary_on]
+        return get_or_render(
+            self.name, dependencies, lambda: self.nodelist.render(context), vary_on
+        )
+
+
+@register.tag('cachefragment')
+def do_cachefragment(parser, token):
+    """
+    Cache the enclosed template fragment until one of its dependencies
+    changes.
+
+    Usage::
+
+        {% load fragment_cache %}
+        {% cachefragment "pet-visits" pet %}
+            ... visits of the pet ...
+        {% endcachefragment %}
+
+    The first argument names the fragment. The others are its
+    dependencies: model instances, or model labels such as "pets.PetType"
+    for fragments that depend on every row of a model. A value given as
+    vary=... is added to the cache key without being versioned, e.g. the
+    current date for fragments showing ages.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' tag requires a fragment name and at least one dependency."
+        )
+    name = bits[1]
+    if name[0] not in '"\'' or name[-1] != name[0]:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag's fragment name must be quoted.")
+    remaining = bits[2:]
+    vary_on = []
+    if '=' in remaining[-1]:
+        kwargs = token_kwargs(remaining[-1:], parser)
+        if set(kwargs) != {'vary'}:
+            raise template.TemplateSyntaxError(f"'{bits[0]}' tag only accepts vary=.")
+        vary_on.append(kwargs['vary'])
+        remaining = remaining[:-1]
+    if not remaining:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires at least one dependency.")
+    dependencies = [parser.compile_filter(bit) for bit in remaining]
+    nodelist = parser.parse(('endcachefragment',))
+    parser.delete_first_token()
+    return FragmentCacheNode(nodelist, name[1:-1], dependencies, vary_on)
@@ -0,0 +1,163 @@
+"""
+Template compilation at startup and render profiling.
+
+The template engine uses the cached loader, so every template is read
+and compiled once per process, {% extends %} parents included. prewarm()
+compiles every template under the template directories up front, called
+from the WSGI and ASGI entry points when TEMPLATE_PREWARM is on, so
+management commands skip it: the first requests of a new worker then
+find them compiled, and a broken template fails the deploy instead of a
+request.
+
+With TEMPLATE_PROFILING on, the render of every template and every
+{% block %} is timed and TemplateTimingMiddleware reports the times of
+each response in a Server-Timing header, which the network panel of the
+browser displays. Times are inclusive: a block contains the blocks it
+renders. Templates reached through {% extends %} render inside the
+blocks of their child and are not timed on their own. The metrics
+middleware collects the same timings to record the render time of each
+view, whether or not TEMPLATE_PROFILING is on.
+"""
+import contextlib
+import contextvars
+import functools
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+from django.template.base import Template
+from django.template.loader_tags import BlockNode
+
+_timings = contextvars.ContextVar('template_timings', default=None)
+_depth = contextvars.ContextVar('template_depth', default=0)
+
+
+class Timings(list):
+    """
+    The (kind, name, seconds) renders timed during a request. render_time
+    sums the outermost template renders only, so nested renders are not
+    counted twice.
+    """
+    render_time = 0.0
+
+
+def template_names(directory):
+    """Return the names of the templates found under directory"""
+    names = []
+    for root, _, files in os.walk(directory):
+        for file in files:
+            if file.endswith(('.html', '.txt', '.xml')):
+                names.append(os.path.relpath(os.path.join(root, file), directory).replace(os.sep, '/'))
+    return sorted(names)
+
+
+def prewarm():
+    """Compile every template of the template directories into the cached loaders, return how many"""
+    count = 0
+    for engine in engines.all():
+        if not isinstance(engine, DjangoTemplates):
+            continue
+        for directory in engine.engine.dirs:
+            for name in template_names(directory):
+                engine.get_template(name)
+                count += 1
+    return count
+
+
+def timed(kind, name_of, render):
+    """Wrap a render method to record its duration while timings are collected"""
+    @functools.wraps(render)
+    def wrapper(self, context):
+        timings = _timings.get()
+        if timings is None:
+            return render(self, context)
+        token = _depth.set(_depth.get() + 1)
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            seconds = time.perf_counter() - start
+            _depth.reset(token)
+            timings.append((kind, name_of(self), seconds))
+            if kind == 'template' and not _depth.get():
+                timings.render_time += seconds
+    wrapper.profiled = True
+    return wrapper
+
+
+def install_profiling():
+    """Time the renders of templates and blocks, once per process"""
+    if not getattr(Template.render, 'profiled', False):
+        Template.render = timed('template', lambda template: template.name or '<string>', Template.render)
+    if not getattr(BlockNode.render, 'profiled', False):
+        BlockNode.render = timed('block', lambda block: block.name, BlockNode.render)
+
+
+@contextlib.contextmanager
+def collect():
+    """Collect the render timings of the block, sharing those already being collected"""
+    install_profiling()
+    timings = _timings.get()
+    if timings is not None:
+        yield timings
+        return
+    timings = Timings()
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def server_timing(timings):
+    """Format timings as a Server-Timing header, summing the renders of the same template or block"""
+    totals = {}
+    for kind, name, seconds in timings:
+        totals[kind, name] = totals.get((kind, name), 0) + seconds
+    return ', '.join(
+        f'{kind};desc="{name}";dur={seconds * 1000:.2f}'
+        for (kind, name), seconds in totals.items()
+    )
+
+
+class TemplateTimingMiddleware:
+    """
+    Add the template and block render times of a response to its
+    Server-Timing header when TEMPLATE_PROFILING is on. Place it before
+    PageCacheMiddleware so the times are not cached with the page.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not getattr(settings, 'TEMPLATE_PROFILING', False):
+            return self.get_response(request)
+        with collect() as timings:
+            response = self.get_response(request)
+        return self.add_header(response, timings)
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'TEMPLATE_PROFILING', False):
+            return await self.get_response(request)
+        with collect() as timings:
+            response = await self.get_response(request)
+        return self.add_header(response, timings)
+
+    def add_header(self, response, timings):
+        if timings:
+            header = server_timing(timings)
+            if response.has_header('Server-Timing'):
+                header = f"{response['Server-Timing']}, {header}"
+            response['Server-Timing'] = header
+        return response
@@ -0,0 +1,1357 @@
+import gc
+import hashlib
+import importlib
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.template import Context, Template, TemplateSyntaxError, engines
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, path, resolve, reverse
+from django.utils import timezone
+import datetime
+
+from .refdata import ReferenceCache
+from .checks import check_fragment_versions, check_page_cache, check_reference_cache, is_process_local
+from .pagecache import HEADER, PageCacheMiddleware, page_cache, purge
+from .fragments import bump, fragment_cache, fragment_key, get_or_render, stats
+from .templating import prewarm, server_timing
+from .metrics import Histogram, MetricsMiddleware, registry
+from .exporting import stream
+from .importing import BUILDERS, build_visit
+from .routers import PIN_COOKIE, PrimaryReplicaRouter, ReplicaPinningMiddleware, is_pinned, pin_to_primary
+from .sqlite import current_pragmas, pragma_statements
+from .management.commands.explain_views import explain, plan_problems
+from .pagination import InvalidCursor, KeysetPaginator, decode_cursor, encode_cursor, estimate_count
+from owners.models import Owner
+from pets.models import Pet, PetType
+from vets.models import Specialty, Vet
+from visits.models import Visit, VisitArchive
+
+
+def indexed_owner(request):
+    """Look an owner up by primary key, for explain_views"""
+    return HttpResponse(str(Owner.objects.filter(pk=1).exists()))
+
+
+def unindexed_owners(request):
+    """Filter owners on a column without an index, for explain_views"""
+    return HttpResponse(str(Owner.objects.filter(city="Anytown").exists()))
+
+
+def unsorted_owners(request):
+    """Sort owners on a column without an index, for explain_views"""
+    return HttpResponse(str(list(Owner.objects.order_by('telephone')[:5])))
+
+
+# URLconf of ExplainViewsCommandTests, with known query plans
+urlpatterns = [
+    path('indexed/', indexed_owner, name='indexed'),
+    path('unindexed/', unindexed_owners, name='unindexed'),
+    path('unsorted/', unsorted_owners, name='unsorted'),
+]
+
+
+class KeysetPaginatorTests(TestCase):
+    """Test cases for the KeysetPaginator"""
+
+    def setUp(self):
+        """Set up test data"""
+        owner = Owner.objects.create(
+            first_name="John",
+            last_name="Doe",
+            address="123 Main St",
+            city="Anytown",
+            telephone="555-1234"
+        )
+        pet = Pet.objects.create(
+            name="Fido",
+            birth_date=datetime.date(2018, 1, 1),
+            type=PetType.objects.create(name="Dog"),
+            owner=owner
+        )
+        # Pairs of visits share a date so the primary key breaks ties
+        self.visits = [
+            Visit.objects.create(
+                date=datetime.date(2023, 1, 1) + datetime.timedelta(days=i // 2),
+                description=f"Visit {i}",
+                pet=pet
+            )
+            for i in range(7)
+        ]
+
+    def test_cursor_round_trip(self):
+        """Test that cursors decode to the encoded value"""
+        data = {'k': ['Doe', datetime.date(2023, 1, 1), 3]}
+        self.assertEqual(decode_cursor(encode_cursor(data)), {'k': ['Doe', '2023-01-01', 3]})
+        with self.assertRaises(InvalidCursor):
+            decode_cursor('!!!')
+
+    def test_walks_descending_ordering(self):
+        """Test that pages follow Meta.ordering with the pk as tie breaker"""
+        paginator = KeysetPaginator(Visit.objects.all(), 3)
+        expected = list(Visit.objects.order_by('-date', 'pk'))
+
+        seen = []
+        page = paginator.page()
+        self.assertFalse(page.has_previous())
+        while True:
+            seen.extend(page)
+            if not page.has_next():
+                break
+            page = paginator.page(page.next_cursor)
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(page), 1)
+
+        previous = paginator.page(page.previous_cursor)
+        self.assertEqual(list(previous), expected[3:6])
+        self.assertTrue(previous.has_previous())
+        self.assertTrue(previous.has_next())
+
+    def test_explicit_ordering(self):
+        """Test that an explicit order_by is used instead of Meta.ordering"""
+        paginator = KeysetPaginator(Visit.objects.order_by('date'), 4)
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        self.assertEqual(list(first) + list(second), list(Visit.objects.order_by('date', 'pk')))
+
+    def test_malformed_cursor(self):
+        """Test that structurally invalid cursors are rejected"""
+        paginator = KeysetPaginator(Visit.objects.all(), 3)
+        for data in [{}, {'s': 5, 'k': ['2023-01-01', 1], 'd': 'next'},
+                     {'s': 0, 'k': ['2023-01-01'], 'd': 'next'},
+                     {'s': 0, 'k': ['2023-01-01', 1], 'd': 'sideways'}]:
+            with self.assertRaises(InvalidCursor):
+                paginator.page(encode_cursor(data))
+
+    def test_count_modes(self):
+        """Test the cached and estimated total counts"""
+        cache.clear()
+        self.assertIsNone(KeysetPaginator(Visit.objects.all(), 3).count)
+
+        cached = KeysetPaginator(Visit.objects.all(), 3, count_mode='cached')
+        self.assertEqual(cached.count, 7)
+        self.visits[0].delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(KeysetPaginator(Visit.objects.all(), 3, count_mode='cached').count, 7)
+
+        estimated = KeysetPaginator(Visit.objects.all(), 3, count_mode='estimated')
+        self.assertEqual(estimated.count, self.visits[-1].pk)
+        with self.assertRaises(ValueError):
+            KeysetPaginator(Visit.objects.all(), 3, count_mode='exact')
+
+    def test_estimate_count_needs_unfiltered_queryset(self):
+        """Test that filtered querysets are not estimated"""
+        self.assertIsNone(estimate_count(Visit.objects.filter(description="Visit 1")))
+        self.assertEqual(estimate_count(Visit.objects.all()), self.visits[-1].pk)
+
+
+class ExplainViewsCommandTests(TestCase):
+    """Test cases for the explain_views management command"""
+
+    def setUp(self):
+        """Set up test data"""
+        owner = Owner.objects.create(
+            first_name="John",
+            last_name="Doe",
+            address="123 Main St",
+            city="Anytown",
+            telephone="555-1234"
+        )
+        pet = Pet.objects.create(
+            name="Fido",
+            birth_date=datetime.date(2018, 1, 1),
+            type=PetType.objects.create(name="Dog"),
+            owner=owner
+        )
+        self.visit = Visit.objects.create(pet=pet, date=datetime.date(2023, 1, 1), description="Checkup")
+        self.owner, self.pet = owner, pet
+
+    def test_reports_views(self):
+        """Test that every view is requested and its queries explained"""
+        out = StringIO()
+        call_command('explain_views', stdout=out)
+        output = out.getvalue()
+        self.assertIn('owners:owner-detail', output)
+        self.assertIn('pets:pet-detail', output)
+        self.assertIn('queries explained', output)
+
+    def test_hot_paths_use_indexes(self):
+        """Test that the queries of the owner, pet, visit and vet pages neither scan nor sort"""
+        # With a single row of each, SQLite plans no sort of prefetches or filters
+        call_command('seed_petclinic', owners=50, vets=12, verbosity=0)
+        owner = Owner.objects.filter(pet_count__gte=2).order_by('pk').last()
+        pet = owner.pets.filter(visit_count__gte=2).first()
+        vet = Vet.objects.filter(specialties__isnull=False).first()
+        urls = [
+            reverse('owners:owner-list'),
+            reverse('owners:owner-detail', args=[owner.pk]),
+            reverse('owners:owner-search') + f'?q={owner.last_name[:3]}',
+            reverse('pets:pet-detail', args=[pet.pk]),
+            reverse('visits:visit-detail', args=[pet.visits.first().pk]),
+            reverse('visits:visit-archive', args=[pet.pk]),
+            reverse('vets:vet-list'),
+            reverse('vets:vet-list') + f'?specialty={vet.specialties.first().pk}',
+            reverse('vets:vet-detail', args=[vet.pk]),
+        ]
+        for url in urls:
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            for query in queries:
+                plan = explain(connection, query['sql'])
+                self.assertEqual(plan_problems(connection.vendor, plan), [], (url, query['sql'], plan))
+
+    def test_plan_problems(self):
+        """Test that every problem of a plan is reported, including sorts without a table"""
+        plan = ['SCAN owners_owner', 'USE TEMP B-TREE FOR ORDER BY', 'SCAN CONSTANT ROW',
+                'SCAN pets_pet USING INDEX pet_owner_name_idx']
+        self.assertEqual(plan_problems('sqlite', plan), ['full scan of owners_owner', 'temp b-tree sort'])
+        self.assertEqual(plan_problems('sqlite', plan, {'owners_owner'}), ['temp b-tree sort'])
+
+    @override_settings(ROOT_URLCONF=__name__)
+    def test_strict_fails_on_flagged_queries(self):
+        """Test that --strict raises when the views of a URLconf run unindexed queries"""
+        out = StringIO()
+        with self.assertRaisesMessage(CommandError, '3 queries explained, 2 flagged.'):
+            call_command('explain_views', '--strict', stdout=out)
+        self.assertIn('  full scan of owners_owner: ', out.getvalue())
+        self.assertIn('  full scan of owners_owner, temp b-tree sort: ', out.getvalue())
+        with self.assertRaisesMessage(CommandError, '3 queries explained, 1 flagged.'):
+            call_command('explain_views', '--strict', '--ignore-table', 'owners_owner', stdout=StringIO())
+
+
+class SqlitePragmaTests(TestCase):
+    """Test cases for the per-connection SQLite tuning"""
+
+    def test_busy_timeout_applied_first(self):
+        """Test that busy_timeout precedes the other PRAGMAs"""
+        statements = pragma_statements({'journal_mode': 'WAL', 'busy_timeout': 1000})
+        self.assertEqual(statements, ['PRAGMA busy_timeout = 1000', 'PRAGMA journal_mode = WAL'])
+
+    def test_invalid_pragma_rejected(self):
+        """Test that values which are not identifiers or integers are rejected"""
+        with self.assertRaises(ImproperlyConfigured):
+            pragma_statements({'journal_mode': 'WAL; DROP TABLE owners_owner'})
+
+    def test_connection_is_tuned(self):
+        """Test that new connections carry the configured PRAGMAs"""
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        pragmas = connection.settings_dict['PRAGMAS']
+        values = current_pragmas(connection, ['busy_timeout', 'cache_size', 'foreign_keys'])
+        self.assertEqual(values['busy_timeout'], pragmas['busy_timeout'])
+        self.assertEqual(values['cache_size'], pragmas['cache_size'])
+        self.assertEqual(values['foreign_keys'], 1)
+        mode = connection.settings_dict['OPTIONS'].get('transaction_mode')
+        self.assertEqual(connection.transaction_mode, mode.upper() if mode else None)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_test'])
+class SyncReplicasCommandTests(TransactionTestCase):
+    """Test cases for the sync_replicas management command, with a SQLite file as replica"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        connections.settings['replica_test'] = {
+            **connections['default'].settings_dict,
+            'NAME': os.path.join(cls.directory.name, 'replica.sqlite3'),
+        }
+        # Not a class attribute: the test runner checks the databases of
+        # every test before the alias exists
+        cls.databases = {'default', 'replica_test'}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica_test'].close()
+        del connections['replica_test']
+        del connections.settings['replica_test']
+        cls.directory.cleanup()
+
+    def test_replica_reads_synced_rows(self):
+        """Test that a read routed to the replica sees a row written to the primary once synced"""
+        call_command('sync_replicas', '--database', 'replica_test', verbosity=0)
+        owner = Owner.objects.create(first_name="John", last_name="Doe", address="123 Main St",
+                                     city="Anytown", telephone="555-1234")
+        owners = Owner.objects.filter(pk=owner.pk)
+        self.assertEqual(owners.db, 'replica_test')
+        self.assertFalse(owners.exists())
+        out = StringIO()
+        call_command('sync_replicas', '--database', 'replica_test', stdout=out)
+        self.assertIn('Synced replica_test', out.getvalue())
+        self.assertEqual(owners.get().last_name, "Doe")
+
+    def test_unknown_database(self):
+        """Test that unknown databases are refused"""
+        with self.assertRaises(CommandError):
+            call_command('sync_replicas', '--database', 'replica9')
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    """Test cases for the primary/replica router and its pinning middleware"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def pinned_during(self, request):
+        """Return whether reads were pinned while handling request, and the response"""
+        seen = []
+
+        def view(request):
+            seen.append(is_pinned())
+            return HttpResponse()
+
+        response = ReplicaPinningMiddleware(view)(request)
+        return seen[0], response
+
+    def test_reads_go_to_replica(self):
+        """Test that reads use a replica and writes the primary"""
+        self.assertEqual(self.router.db_for_read(Owner), 'replica1')
+        self.assertEqual(self.router.db_for_write(Owner), 'default')
+
+    def test_pinned_reads_go_to_primary(self):
+        """Test that pinned reads use the primary"""
+        with pin_to_primary():
+            self.assertEqual(self.router.db_for_read(Owner), 'default')
+        self.assertEqual(self.router.db_for_read(Owner), 'replica1')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        """Test that reads use the primary without replicas"""
+        self.assertEqual(self.router.db_for_read(Owner), 'default')
+
+    def test_migrations_only_on_primary(self):
+        """Test that replicas are not migrated"""
+        self.assertTrue(self.router.allow_migrate('default', 'owners'))
+        self.assertFalse(self.router.allow_migrate('replica1', 'owners'))
+
+    def test_write_request_pins_and_sets_cookie(self):
+        """Test that a POST is pinned and pins the following requests"""
+        pinned, response = self.pinned_during(self.factory.post('/owners/new/'))
+        self.assertTrue(pinned)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertFalse(is_pinned())
+
+    def test_cookie_pins_read_request(self):
+        """Test that a GET carrying the pin cookie reads from the primary"""
+        request = self.factory.get('/owners/1/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        pinned, response = self.pinned_during(request)
+        self.assertTrue(pinned)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_read_request_not_pinned(self):
+        """Test that a plain GET reads from a replica"""
+        pinned, response = self.pinned_during(self.factory.get('/owners/1/'))
+        self.assertFalse(pinned)
+
+    @override_settings(PAGE_CACHE_ENABLED=True)
+    def test_cached_page_renders_on_primary(self):
+        """Test that a page rendered to be stored reads from the primary, and a hit reads nothing"""
+        seen = []
+
+        @page_cache('pinned', query_params=())
+        def view(request):
+            seen.append(is_pinned())
+            return HttpResponse()
+
+        def get_response(request):
+            return middleware.process_view(request, view, (), {}) or view(request)
+
+        middleware = PageCacheMiddleware(get_response)
+        for state in ('miss', 'hit'):
+            request = self.factory.get('/pinned/')
+            request.user = AnonymousUser()
+            self.assertEqual(middleware(request)[HEADER], state)
+        self.assertEqual(seen, [True])
+        self.assertFalse(is_pinned())
+
+    def test_cached_fragment_renders_on_primary(self):
+        """Test that a fragment rendered to be cached reads from the primary"""
+        fragment_cache().clear()
+        self.assertEqual(get_or_render('pinned', ['pets.PetType'], lambda: str(is_pinned())), 'True')
+        self.assertFalse(is_pinned())
+
+
+class FragmentCacheTests(TestCase):
+    """Test cases for the versioned fragment cache"""
+
+    def setUp(self):
+        """Set up test data"""
+        fragment_cache().clear()
+        self.pet_type = PetType.objects.create(name="Dog")
+
+    def render(self, template, **context):
+        """Render a template string using the fragment_cache library"""
+        return Template('{% load fragment_cache %}' + template).render(Context(context))
+
+    def test_bump_changes_key(self):
+        """Test that bumping a dependency changes the fragment key"""
+        key = fragment_key('types', [self.pet_type])
+        self.assertEqual(fragment_key('types', [self.pet_type]), key)
+        bump(PetType, self.pet_type.pk)
+        self.assertNotEqual(fragment_key('types', [self.pet_type]), key)
+
+    def test_model_wide_dependency(self):
+        """Test that a label dependency changes with any row of the model"""
+        key = fragment_key('types', ['pets.PetType'])
+        PetType.objects.create(name="Cat")
+        self.assertNotEqual(fragment_key('types', ['pets.PetType']), key)
+
+    def test_vary_on(self):
+        """Test that vary values are part of the key"""
+        self.assertNotEqual(
+            fragment_key('types', [self.pet_type], ['2024-01-01']),
+            fragment_key('types', [self.pet_type], ['2024-01-02']),
+        )
+
+    def test_tag_caches_content(self):
+        """Test that the tag serves the cached content until a dependency changes"""
+        template = '{% cachefragment "type" pet_type %}{{ pet_type.name }}{% endcachefragment %}'
+        self.assertEqual(self.render(template, pet_type=self.pet_type), 'Dog')
+        stale = PetType(pk=self.pet_type.pk, name="Cat")
+        self.assertEqual(self.render(template, pet_type=stale), 'Dog')
+        self.assertEqual(stats(['type'])['type'], {'hits': 1, 'misses': 1})
+        self.pet_type.name = "Cat"
+        self.pet_type.save()
+        self.assertEqual(self.render(template, pet_type=self.pet_type), 'Cat')
+
+    def test_bump_reaches_other_workers(self):
+        """Test that a bump by one worker invalidates the fragments another worker keeps"""
+        template = '{% cachefragment "type" pet_type %}{{ pet_type.name }}{% endcachefragment %}'
+        workers = {
+            name: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': name}
+            for name in ('worker-a', 'worker-b')
+        }
+        with override_settings(CACHES={**settings.CACHES, **workers}):
+            for worker in workers:
+                with override_settings(FRAGMENT_CACHE_ALIAS=worker):
+                    self.assertEqual(self.render(template, pet_type=self.pet_type), 'Dog')
+            self.assertIsNot(caches['worker-a'], caches['worker-b'])
+            with override_settings(FRAGMENT_CACHE_ALIAS='worker-a'):
+                self.pet_type.name = "Cat"
+                self.pet_type.save()
+            with override_settings(FRAGMENT_CACHE_ALIAS='worker-b'):
+                self.assertEqual(self.render(template, pet_type=self.pet_type), 'Cat')
+                self.assertEqual(stats(['type'])['type'], {'hits': 0, 'misses': 2})
+
+    def test_process_local_versions_refused(self):
+        """Test that fragment versions in process memory fail the checks unless DEBUG"""
+        self.assertEqual(check_fragment_versions(None), [])
+        with override_settings(FRAGMENT_VERSION_ALIAS='default'):
+            self.assertEqual([error.id for error in check_fragment_versions(None)], ['petclinic.E002'])
+            with override_settings(DEBUG=True):
+                self.assertEqual(check_fragment_versions(None), [])
+
+    def test_tag_syntax(self):
+        """Test that the tag requires a quoted name and a dependency"""
+        for tag in ('{% cachefragment "type" %}', '{% cachefragment type pet_type %}',
+                    '{% cachefragment "type" vary=pet_type %}'):
+            with self.assertRaises(TemplateSyntaxError):
+                self.render(tag + '{% endcachefragment %}')
+
+
+class ReferenceCacheTests(TestCase):
+    """Test cases for the in-process reference data cache"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.dog = PetType.objects.create(name="Dog")
+        self.cat = PetType.objects.create(name="Cat")
+        self.reference = ReferenceCache.for_model(PetType)
+
+    def test_reads_once(self):
+        """Test that the table is queried once and kept in order"""
+        with self.assertNumQueries(1):
+            self.assertEqual(self.reference.all(), [self.cat, self.dog])
+            self.assertEqual(self.reference.get(self.dog.pk), self.dog)
+            self.assertEqual(self.reference.get(str(self.dog.pk)), self.dog)
+            self.assertIsNone(self.reference.get('abc'))
+
+    def test_save_reloads(self):
+        """Test that editing a row reloads the table"""
+        self.reference.all()
+        self.dog.name = "Hound"
+        self.dog.save()
+        self.assertEqual(self.reference.get(self.dog.pk).name, "Hound")
+
+    def test_other_worker_change_reloads(self):
+        """Test that a generation bumped elsewhere reloads the table once the copy is due for a check"""
+        self.reference.all()
+        PetType.objects.filter(pk=self.dog.pk).update(name="Hound")
+        self.assertEqual(self.reference.get(self.dog.pk).name, "Dog")
+        self.reference.cache.incr(self.reference.generation_key)
+        self.assertEqual(self.reference.get(self.dog.pk).name, "Dog")
+        later = time.monotonic() + settings.REFERENCE_CACHE_CHECK_SECONDS
+        with mock.patch('DjangoProject.refdata.time.monotonic', return_value=later):
+            self.assertEqual(self.reference.get(self.dog.pk).name, "Hound")
+
+    def test_generation_read_once_per_check(self):
+        """Test that reads within REFERENCE_CACHE_CHECK_SECONDS do not read the shared generation"""
+        with mock.patch.object(self.reference, 'generation', wraps=self.reference.generation) as generation:
+            with override_settings(REFERENCE_CACHE_CHECK_SECONDS=0):
+                self.reference.all()
+                self.reference.all()
+            self.assertEqual(generation.call_count, 2)
+            self.reference.all()
+            for _ in range(20):
+                str(Pet(name="Fido", type_id=self.dog.pk))
+            self.assertEqual(generation.call_count, 3)
+
+    def test_generation_is_shared(self):
+        """Test that the generation is kept outside of process memory"""
+        self.assertEqual(self.reference.cache, caches['versions'])
+        self.assertFalse(is_process_local('versions'))
+
+    def test_process_local_generation_refused(self):
+        """Test that a generation in process memory fails the checks unless DEBUG"""
+        self.assertEqual(check_reference_cache(None), [])
+        with override_settings(REFERENCE_CACHE_ALIAS='default'):
+            self.assertEqual([error.id for error in check_reference_cache(None)], ['petclinic.E001'])
+            with override_settings(DEBUG=True):
+                self.assertEqual(check_reference_cache(None), [])
+
+
+@override_settings(PAGE_CACHE_ENABLED=True)
+class PageCacheTests(TestCase):
+    """Test cases for the full-page cache of anonymous list pages"""
+
+    def setUp(self):
+        """Set up test data"""
+        fragment_cache().clear()
+        self.owner = Owner.objects.create(
+            first_name="John",
+            last_name="Doe",
+            address="123 Main St",
+            city="Anytown",
+            telephone="555-1234"
+        )
+        self.owners_url = reverse('owners:owner-list')
+        self.vets_url = reverse('vets:vet-list')
+
+    def test_second_request_hits(self):
+        """Test that a page is stored on the first request and served on the next"""
+        self.assertEqual(self.client.get(self.owners_url)[HEADER], 'miss')
+        with self.assertNumQueries(0):
+            response = self.client.get(self.owners_url)
+        self.assertEqual(response[HEADER], 'hit')
+        self.assertContains(response, "Doe")
+
+    def test_save_purges_group(self):
+        """Test that saving an owner purges the owner list but not the vet list"""
+        self.client.get(self.owners_url)
+        self.client.get(self.vets_url)
+        self.owner.last_name = "Smith"
+        self.owner.save()
+        response = self.client.get(self.owners_url)
+        self.assertEqual(response[HEADER], 'miss')
+        self.assertContains(response, "Smith")
+        self.assertEqual(self.client.get(self.vets_url)[HEADER], 'hit')
+
+    def test_stale_while_revalidate(self):
+        """Test that a purged page is served stale while another request refreshes it"""
+        self.client.get(self.owners_url)
+        purge('owners')
+        key = f"page:{hashlib.md5(self.owners_url.encode()).hexdigest()}:lock"
+        fragment_cache().add(key, 1)
+        self.assertEqual(self.client.get(self.owners_url)[HEADER], 'stale')
+        fragment_cache().delete(key)
+        self.assertEqual(self.client.get(self.owners_url)[HEADER], 'miss')
+        self.assertEqual(self.client.get(self.owners_url)[HEADER], 'hit')
+
+    def test_uncached_requests(self):
+        """Test that searches and signed-in users bypass the cache"""
+        self.client.get(self.owners_url)
+        self.assertNotIn(HEADER, self.client.get(self.owners_url, {'q': 'doe'}))
+        self.client.force_login(User.objects.create_user('staff'))
+        self.assertNotIn(HEADER, self.client.get(self.owners_url))
+
+    def test_vet_list_varies_on_query(self):
+        """Test that each specialty filter is cached on its own"""
+        self.client.get(self.vets_url)
+        self.assertEqual(self.client.get(self.vets_url, {'specialty': 1})[HEADER], 'miss')
+        self.assertEqual(self.client.get(self.vets_url, {'specialty': 1})[HEADER], 'hit')
+
+    def test_purge_pages_command(self):
+        """Test that purge_pages makes the pages of a group stale"""
+        home_url = reverse('home')
+        self.client.get(home_url)
+        self.assertEqual(self.client.get(home_url)[HEADER], 'hit')
+        out = StringIO()
+        call_command('purge_pages', 'home', stdout=out)
+        self.assertIn('Purged home.', out.getvalue())
+        self.assertEqual(self.client.get(home_url)[HEADER], 'miss')
+
+    @override_settings(PAGE_CACHE_ENABLED=False)
+    def test_disabled(self):
+        """Test that pages are not cached when the cache is off"""
+        self.assertNotIn(HEADER, self.client.get(self.owners_url))
+
+    def test_process_local_pages_refused(self):
+        """Test that an enabled page cache in process memory fails the checks unless DEBUG"""
+        with override_settings(PAGE_CACHE_ALIAS='versions'):
+            self.assertEqual(check_page_cache(None), [])
+        with override_settings(PAGE_CACHE_ALIAS='default'):
+            self.assertEqual([error.id for error in check_page_cache(None)], ['petclinic.E003'])
+            with override_settings(DEBUG=True):
+                self.assertEqual(check_page_cache(None), [])
+            with override_settings(PAGE_CACHE_ENABLED=False):
+                self.assertEqual(check_page_cache(None), [])
+
+    async def test_async_requests(self):
+        """Test that pages are stored, served and revalidated under ASGI"""
+        self.assertEqual((await self.async_client.get(self.owners_url))[HEADER], 'miss')
+        response = await self.async_client.get(self.owners_url)
+        self.assertEqual(response[HEADER], 'hit')
+        self.assertContains(response, "Doe")
+        purge('owners')
+        key = f"page:{hashlib.md5(self.owners_url.encode()).hexdigest()}:lock"
+        await fragment_cache().aadd(key, 1)
+        self.assertEqual((await self.async_client.get(self.owners_url))[HEADER], 'stale')
+        await fragment_cache().adelete(key)
+        self.assertEqual((await self.async_client.get(self.owners_url))[HEADER], 'miss')
+        self.assertIsNone(await fragment_cache().aget(key))
+
+
+class RebuildCountersCommandTests(TestCase):
+    """Test cases for the rebuild_counters management command"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.owner = Owner.objects.create(
+            first_name="John",
+            last_name="Doe",
+            address="123 Main St",
+            city="Anytown",
+            telephone="555-1234"
+        )
+        pet_type = PetType.objects.create(name="Dog")
+        self.pets = [
+            Pet.objects.create(name=f"Pet {i}", birth_date=datetime.date(2018, 1, 1),
+                               type=pet_type, owner=self.owner)
+            for i in range(3)
+        ]
+        for pet in self.pets[:2]:
+            Visit.objects.create(pet=pet, date=datetime.date(2023, 1, 1), description="Checkup")
+            Visit.objects.create(pet=pet, date=datetime.date(2023, 2, 1), description="Checkup")
+        # Drift as if visits were bulk created, skipping the signals
+        Owner.objects.update(pet_count=0)
+        Pet.objects.filter(pk=self.pets[0].pk).update(visit_count=7, last_visit_date=None)
+
+    def test_verify_reports_drift(self):
+        """Test that --verify counts the wrong rows without fixing them"""
+        out = StringIO()
+        with self.assertRaisesMessage(CommandError, '2 rows have wrong counters'):
+            call_command('rebuild_counters', '--verify', stdout=out)
+        self.assertIn('owners: 1 wrong', out.getvalue())
+        self.assertIn('pets: 1 wrong', out.getvalue())
+        self.assertEqual(Owner.objects.get().pet_count, 0)
+
+    def test_rebuild_in_batches(self):
+        """Test that the counters are fixed across batches and then verify"""
+        call_command('rebuild_counters', '--batch-size', '1', stdout=StringIO())
+        self.assertEqual(Owner.objects.get().pet_count, 3)
+        self.assertEqual(
+            list(Pet.objects.order_by('pk').values_list('visit_count', 'last_visit_date')),
+            [(2, datetime.date(2023, 2, 1)), (2, datetime.date(2023, 2, 1)), (0, None)],
+        )
+        call_command('rebuild_counters', '--verify', stdout=StringIO())
+
+    def test_rebuild_given_rows(self):
+        """Test that --pk only checks and fixes the given rows"""
+        out = StringIO()
+        call_command('rebuild_counters', 'pets', '--pk', str(self.pets[1].pk), stdout=out)
+        self.assertIn('pets: 0 fixed', out.getvalue())
+        call_command('rebuild_counters', 'pets', '--pk', str(self.pets[1].pk), '--pk', str(self.pets[0].pk),
+                     stdout=out)
+        self.assertIn('pets: 1 fixed', out.getvalue())
+        self.assertEqual(Owner.objects.get().pet_count, 0)
+
+    def test_unknown_counters(self):
+        """Test that an unknown counter name is rejected"""
+        with self.assertRaises(CommandError):
+            call_command('rebuild_counters', 'vets', stdout=StringIO())
+
+
+class TemplatingTests(TestCase):
+    """Test cases for template pre-warming and render profiling"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.loader = engines['django'].engine.template_loaders[0]
+        self.loader.reset()
+        owner = Owner.objects.create(
+            first_name="John",
+            last_name="Doe",
+            address="123 Main St",
+            city="Anytown",
+            telephone="555-1234"
+        )
+        self.pet = Pet.objects.create(
+            name="Fido",
+            birth_date=datetime.date(2018, 1, 1),
+            type=PetType.objects.create(name="Dog"),
+            owner=owner
+        )
+
+    def test_prewarm_compiles_every_template(self):
+        """Test that every template is compiled into the cached loader"""
+        count = prewarm()
+        self.assertGreater(count, 0)
+        self.assertIn('base.html', self.loader.get_template_cache)
+        self.assertIn('pets/pet_detail.html', self.loader.get_template_cache)
+        self.assertEqual(len(self.loader.get_template_cache), count)
+
+    def test_prewarm_on_server_startup(self):
+        """Test that the WSGI and ASGI entry points prewarm the templates when TEMPLATE_PREWARM is on"""
+        for name in ('DjangoProject.wsgi', 'DjangoProject.asgi'):
+            for enabled in (False, True):
+                self.loader.reset()
+                with override_settings(TEMPLATE_PREWARM=enabled):
+                    importlib.reload(importlib.import_module(name))
+                self.assertEqual('base.html' in self.loader.get_template_cache, enabled)
+
+    def test_server_timing_format(self):
+        """Test that renders of the same template or block are summed"""
+        timings = [('block', 'content', 0.001), ('template', 'a.html', 0.002), ('block', 'content', 0.001)]
+        self.assertEqual(server_timing(timings),
+                         'block;desc="content";dur=2.00, template;desc="a.html";dur=2.00')
+
+    @override_settings(TEMPLATE_PROFILING=True)
+    def test_profiled_response(self):
+        """Test that the template and block times are sent in Server-Timing"""
+        response = self.client.get(reverse('pets:pet-detail', args=[self.pet.id]))
+        self.assertIn('template;desc="pets/pet_detail.html"', response['Server-Timing'])
+        self.assertIn('block;desc="content"', response['Server-Timing'])
+
+    def test_not_profiled_by_default(self):
+        """Test that no Server-Timing header is sent unless profiling is on"""
+        response = self.client.get(reverse('pets:pet-detail', args=[self.pet.id]))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_ALLOWED_IPS=['127.0.0.1'])
+class MetricsTests(TestCase):
+    """Test cases for the request metrics and the /metrics endpoint"""
+
+    def setUp(self):
+        """Set up test data"""
+        registry.reset()
+        self.addCleanup(registry.reset)
+        owner = Owner.objects.create(
+            first_name="John",
+            last_name="Doe",
+            address="123 Main St",
+            city="Anytown",
+            telephone="555-1234"
+        )
+        self.pet = Pet.objects.create(
+            name="Fido",
+            birth_date=datetime.date(2018, 1, 1),
+            type=PetType.objects.create(name="Dog"),
+            owner=owner
+        )
+
+    def test_histogram_buckets(self):
+        """Test that observations are counted in every bucket they fit in"""
+        histogram = Histogram((1, 2, 5))
+        histogram.observe(1.5)
+        histogram.observe(4)
+        self.assertEqual(histogram.counts, [0, 1, 2])
+        self.assertEqual((histogram.sum, histogram.count), (5.5, 2))
+
+    def test_requests_recorded_per_view(self):
+        """Test that a request shows up in every histogram under its view name"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('pets:pet-detail', args=[self.pet.id]))
+        query_count = len(queries)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        view = 'view="pets:pet-detail"'
+        for metric in ('django_request_duration_seconds', 'django_request_query_duration_seconds',
+                       'django_request_template_duration_seconds', 'django_response_size_bytes'):
+            self.assertIn(f'{metric}_count{{{view}}} 1', body)
+        self.assertIn(f'django_request_queries_sum{{{view}}} {query_count}', body)
+        self.assertIn(f'django_request_queries_bucket{{{view},le="+Inf"}} 1', body)
+
+    def test_duplicate_queries_logged(self):
+        """Test that a query repeated within a request is logged as a suspected N+1"""
+        def view(request):
+            for _ in range(3):
+                Owner.objects.filter(pk=self.pet.owner_id).exists()
+            return HttpResponse('ok')
+
+        middleware = MetricsMiddleware(view)
+        with self.assertLogs('DjangoProject.metrics', 'WARNING') as logs:
+            middleware(RequestFactory().get('/'))
+        self.assertIn('Suspected N+1 in <unresolved> (GET /): 3 times', logs.output[0])
+        self.assertIn('django_request_duplicate_queries_total{view="<unresolved>"} 2', registry.render())
+
+    def test_endpoint_restricted(self):
+        """Test that /metrics is refused to other addresses unless staff"""
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS=[]):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        """Test that nothing is recorded or served when metrics are off"""
+        self.client.get(reverse('pets:pet-detail', args=[self.pet.id]))
+        self.assertEqual(registry.histograms, {})
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+
+
+class AsyncViewTests(TestCase):
+    """Test cases for the async read views switched on by ASYNC_VIEWS"""
+
+    URLCONFS = ['owners.urls', 'pets.urls', 'vets.urls', 'DjangoProject.urls']
+
+    def setUp(self):
+        """Set up test data"""
+        self.use_async_views(True)
+        self.addCleanup(self.use_async_views, False)
+        registry.reset()
+        self.addCleanup(registry.reset)
+        self.owner = Owner.objects.create(
+            first_name="John",
+            last_name="Doe",
+            address="123 Main St",
+            city="Anytown",
+            telephone="555-1234"
+        )
+        for i in range(11):
+            Owner.objects.create(first_name=f"Jane{i}", last_name="Roe", address="1 Main St",
+                                 city="Anytown", telephone="555-0000")
+        self.pet = Pet.objects.create(
+            name="Fido",
+            birth_date=datetime.date(2018, 1, 1),
+            type=PetType.objects.create(name="Dog"),
+            owner=self.owner
+        )
+        Visit.objects.create(pet=self.pet, date=datetime.date(2023, 1, 1), description="Rabies shot")
+        vet = Vet.objects.create(first_name="Helen", last_name="Leary")
+        vet.specialties.add(Specialty.objects.create(name="Radiology"))
+
+    def use_async_views(self, enabled):
+        """Reload the URLconfs with ASYNC_VIEWS on or off"""
+        with override_settings(ASYNC_VIEWS=enabled):
+            for name in self.URLCONFS:
+                importlib.reload(importlib.import_module(name))
+        clear_url_caches()
+
+    def test_urls_route_to_async_views(self):
+        """Test that ASYNC_VIEWS routes the read views to their async counterparts"""
+        from owners.views import owner_detail_async
+        self.assertIs(resolve(reverse('owners:owner-detail', args=[1])).func, owner_detail_async)
+        self.use_async_views(False)
+        self.assertEqual(resolve(reverse('owners:owner-detail', args=[1])).func.view_class.__name__,
+                         'OwnerDetailView')
+
+    async def test_owner_list(self):
+        """Test that the owner list is paginated by cursor with its pets"""
+        response = await self.async_client.get(reverse('owners:owner-list'))
+        self.assertContains(response, 'John Doe')
+        self.assertContains(response, 'Fido')
+        self.assertTrue(response.context['page_obj'].has_next())
+        response = await self.async_client.get(
+            reverse('owners:owner-list') + f"?cursor={response.context['page_obj'].next_cursor}")
+        self.assertEqual(len(response.context['owners']), 2)
+
+    async def test_owner_detail_conditional(self):
+        """Test that the owner page shows pets and visits and answers 304 when unchanged"""
+        url = reverse('owners:owner-detail', args=[self.owner.pk])
+        response = await self.async_client.get(url)
+        self.assertContains(response, 'Rabies shot')
+        response = await self.async_client.get(url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        response = await self.async_client.get(reverse('owners:owner-detail', args=[999]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_pet_detail(self):
+        """Test that the pet page shows its type, owner and visits"""
+        response = await self.async_client.get(reverse('pets:pet-detail', args=[self.pet.pk]))
+        self.assertContains(response, 'Dog')
+        self.assertContains(response, 'John Doe')
+        self.assertContains(response, 'Rabies shot')
+
+    async def test_vet_list(self):
+        """Test that the vet list shows specialties and the specialty filter"""
+        response = await self.async_client.get(reverse('vets:vet-list'))
+        self.assertContains(response, 'Helen Leary')
+        self.assertContains(response, 'Radiology', count=2)
+
+    async def test_search_and_export(self):
+        """Test that the search pages and streams its matches"""
+        response = await self.async_client.get(reverse('owners:owner-search') + '?q=doe')
+        self.assertContains(response, 'John Doe')
+        self.assertNotContains(response, 'Jane0')
+        response = await self.async_client.get(reverse('owners:owner-search') + '?q=doe&export=json')
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual([owner['pets'] for owner in json.loads(content)], [['Fido']])
+
+    @override_settings(METRICS_ENABLED=True)
+    async def test_queries_recorded(self):
+        """Test that the queries of async views, run in a thread, reach the metrics"""
+        await self.async_client.get(reverse('pets:pet-detail', args=[self.pet.pk]))
+        histogram = registry.histograms['django_request_queries', 'pets:pet-detail']
+        self.assertEqual(histogram.count, 1)
+        self.assertGreater(histogram.sum, 0)
+
+
+class ApiTests(TestCase):
+    """Test cases for the read-only JSON API"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.owners = [
+            Owner.objects.create(first_name=f"John{i}", last_name="Doe", address="123 Main St",
+                                 city="Anytown", telephone="555-1234")
+            for i in range(3)
+        ]
+        dog = PetType.objects.create(name="Dog")
+        self.pet = Pet.objects.create(name="Fido", birth_date=datetime.date(2018, 1, 1),
+                                      type=dog, owner=self.owners[0])
+        Pet.objects.create(name="Rex", birth_date=datetime.date(2019, 1, 1), type=dog, owner=self.owners[1])
+        for day in (1, 2):
+            Visit.objects.create(pet=self.pet, date=datetime.date(2023, 1, day), description="Checkup")
+
+    def test_list_fields(self):
+        """Test that only the requested fields are selected and returned"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/owners/', {'fields': 'first_name,pet_count'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0], {'first_name': 'John0', 'pet_count': 1})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('telephone', queries[0]['sql'])
+
+    def test_nested_include(self):
+        """Test that include= loads each level in one query"""
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/owners/', {
+                'include': 'pets.visits', 'fields': 'id', 'fields[pets]': 'name',
+                'fields[pets.visits]': 'date',
+            })
+        owner = response.json()['results'][0]
+        self.assertEqual(owner, {'id': self.owners[0].id, 'pets': [
+            {'name': 'Fido', 'visits': [{'date': '2023-01-02'}, {'date': '2023-01-01'}]},
+        ]})
+        self.assertEqual(response.json()['results'][2]['pets'], [])
+
+    def test_keyset_pages(self):
+        """Test that the cursors walk the whole list"""
+        first = self.client.get('/api/owners/', {'page_size': 2, 'fields': 'first_name'}).json()
+        self.assertEqual([owner['first_name'] for owner in first['results']], ['John0', 'John1'])
+        second = self.client.get('/api/owners/', {'page_size': 2, 'cursor': first['next']}).json()
+        self.assertEqual([owner['first_name'] for owner in second['results']], ['John2'])
+        self.assertIsNone(second['next'])
+        self.assertIsNotNone(second['previous'])
+
+    def test_filter_and_detail(self):
+        """Test exact filters and the detail of an object"""
+        response = self.client.get('/api/visits/', {'pet': self.pet.id, 'fields': 'date'})
+        self.assertEqual(response.json()['results'], [{'date': '2023-01-02'}, {'date': '2023-01-01'}])
+        pet = self.client.get(f'/api/pets/{self.pet.id}/').json()
+        self.assertEqual((pet['name'], pet['type'], pet['visit_count']), ('Fido', 'Dog', 2))
+
+    def test_archived_visits(self):
+        """Test that archived visits are listed and included apart from the recent ones"""
+        VisitArchive.objects.create(pet=self.pet, date=datetime.date(2019, 5, 1), description="Shots",
+                                    updated_at=timezone.now())
+        response = self.client.get('/api/visits/archive/', {'pet': self.pet.id, 'fields': 'date,archived_at'})
+        [visit] = response.json()['results']
+        self.assertEqual(visit['date'], '2019-05-01')
+        self.assertIsNotNone(visit['archived_at'])
+        with self.assertNumQueries(3):
+            pet = self.client.get(f'/api/pets/{self.pet.id}/', {
+                'fields': 'id', 'include': 'visits,archived_visits',
+                'fields[visits]': 'date', 'fields[archived_visits]': 'date',
+            }).json()
+        self.assertEqual(pet['visits'], [{'date': '2023-01-02'}, {'date': '2023-01-01'}])
+        self.assertEqual(pet['archived_visits'], [{'date': '2019-05-01'}])
+
+    def test_vet_specialties(self):
+        """Test that the many-to-many specialties of vets can be included"""
+        vet = Vet.objects.create(first_name="Jane", last_name="Smith")
+        vet.specialties.add(Specialty.objects.create(name="Surgery"), Specialty.objects.create(name="Dentistry"))
+        response = self.client.get('/api/vets/', {'include': 'specialties', 'fields[specialties]': 'name'})
+        self.assertEqual(response.json()['results'][0]['specialties'],
+                         [{'name': 'Dentistry'}, {'name': 'Surgery'}])
+
+    def test_errors(self):
+        """Test that bad requests are answered with a JSON error"""
+        for params in ({'fields': 'secret'}, {'include': 'vets'}, {'cursor': 'bogus'},
+                       {'page_size': 'x'}):
+            response = self.client.get('/api/owners/', params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('error', response.json())
+        self.assertEqual(self.client.get('/api/pets/', {'owner': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/owners/0/').status_code, 404)
+        self.assertEqual(self.client.post('/api/owners/').status_code, 405)
+
+
+class ImportPetclinicCommandTests(TestCase):
+    """Test cases for the import_petclinic management command"""
+
+    def setUp(self):
+        """Set up test data"""
+        PetType.objects.create(name="Dog")
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.checkpoint = os.path.join(self.directory.name, 'checkpoint')
+        self.owners = self.write('owners.csv', [
+            'id,first_name,last_name,address,city,telephone',
+            'o1,George,Franklin,110 W. Liberty St.,Madison,608-555-1023',
+            'o2,Betty,Davis,638 Cardinal Ave.,Sun Prairie,call me',
+            'o3,Eduardo,de Rodriquez,2693 Commerce St.,McFarland,(608) 555-8763',
+        ])
+        self.pets = self.write('pets.jsonl', [
+            json.dumps({'id': 'p1', 'name': 'Leo', 'birth_date': '2018-09-07', 'type': 'Dog', 'owner': 'o1'}),
+            json.dumps({'id': 'p2', 'name': 'Basil', 'birth_date': '2019-08-06', 'type': 'Dog', 'owner': 'o2'}),
+            json.dumps({'id': 'p3', 'name': 'Rosy', 'birth_date': '2999-01-01', 'type': 'Dog', 'owner': 'o3'}),
+            json.dumps({'id': 'p4', 'name': 'Jewel', 'birth_date': '2020-01-01', 'type': 'Cat', 'owner': 'o3'}),
+            json.dumps({'id': 'p5', 'name': 'Iggy', 'birth_date': '2020-01-01', 'type': 'Dog', 'owner': 'o3'}),
+        ])
+        self.visits = self.write('visits.csv', [
+            'date,description,pet',
+            '2023-01-01,rabies shot,p1',
+            '2023-02-01,neutered,p1',
+            '2023-03-01,spayed,p2',
+        ])
+
+    def write(self, name, lines):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+        return path
+
+    def run_import(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('import_petclinic', '--owners', self.owners, '--pets', self.pets,
+                     '--visits', self.visits, '--checkpoint', self.checkpoint,
+                     '--batch-size', '2', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def crash_import(self, pet='p2'):
+        """Run an import stopped by an error while building the first visit of pet, by default in the second batch"""
+        def crashing_build_visit(row, maps):
+            if row['pet'] == pet:
+                raise RuntimeError('Crash')
+            return build_visit(row, maps)
+
+        with mock.patch.dict(BUILDERS, {'visits': (Visit, crashing_build_visit)}):
+            with self.assertRaises(RuntimeError):
+                self.run_import()
+
+    def test_import_validates_and_resolves(self):
+        """Test that valid rows are imported with their references and invalid ones reported"""
+        out, err = self.run_import()
+        self.assertIn('owners: 2 imported, 1 skipped', out)
+        self.assertIn('pets: 2 imported, 3 skipped', out)
+        self.assertIn('visits: 2 imported, 1 skipped', out)
+        self.assertIn('owners row 2: telephone: Telephone number should contain only digits', err)
+        self.assertIn('pets row 3: birth_date: Birth date cannot be in the future', err)
+        self.assertIn("pets row 4: type: unknown pet type 'Cat'", err)
+        self.assertIn("visits row 3: pet: unknown pet id 'p2'", err)
+        leo = Pet.objects.get(name="Leo")
+        self.assertEqual((leo.owner.last_name, leo.owner.pet_count, leo.name_key), ("Franklin", 1, "leo"))
+        self.assertEqual((leo.visit_count, leo.last_visit_date), (2, datetime.date(2023, 2, 1)))
+        self.assertEqual(Owner.objects.get(last_name="Franklin").last_name_key, "franklin")
+        self.assertEqual([owner.first_name for owner in Owner.objects.search("rodri")], ["Eduardo"])
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_rerun_resumes_from_checkpoint(self):
+        """Test that a rerun after a crash imports only the rows after the last batch and fixes the counters"""
+        self.crash_import()
+        self.assertTrue(os.path.exists(self.checkpoint))
+        out, _ = self.run_import()
+        self.assertIn('owners: 0 imported, 0 skipped, resumed after row 3', out)
+        self.assertIn('visits: 0 imported, 1 skipped, resumed after row 2', out)
+        self.assertEqual(Owner.objects.count(), 2)
+        self.assertEqual(Visit.objects.count(), 2)
+        leo = Pet.objects.get(name="Leo")
+        self.assertEqual((leo.owner.pet_count, leo.visit_count), (1, 2))
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_resumed_visits_modify_owner_page(self):
+        """Test that visits imported on their own change the page of the owner of their pet"""
+        self.crash_import(pet='p1')
+        call_command('rebuild_counters', stdout=StringIO())
+        owner = Owner.objects.get(last_name="Franklin")
+        url = reverse('owners:owner-detail', args=[owner.pk])
+        etag = self.client.get(url)['ETag']
+        out, _ = self.run_import()
+        self.assertIn('visits: 2 imported, 1 skipped', out)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "rabies shot")
+
+    def test_uncommitted_batch_is_redone(self):
+        """Test that a logged batch whose rows are missing is imported again"""
+        self.crash_import()
+        # Crash after logging the last visit batch but before its commit,
+        # and in the middle of writing the next line
+        with open(self.checkpoint, 'a') as file:
+            file.write(json.dumps({'kind': 'visits', 'position': 3, 'ids': {}, 'pks': [0]}) + '\n')
+            file.write('{"kind": "vis')
+        out, _ = self.run_import()
+        self.assertIn('visits: 0 imported, 1 skipped, resumed after row 2', out)
+
+    def test_checkpoint_of_other_files(self):
+        """Test that a checkpoint of another import is refused unless restarting"""
+        self.crash_import()
+        self.owners = self.write('other.csv', ['id,first_name,last_name,address,city,telephone'])
+        with self.assertRaises(CommandError):
+            self.run_import()
+        self.run_import('--restart')
+
+    def test_checkpoint_of_changed_files(self):
+        """Test that a checkpoint is refused once one of its files changed"""
+        self.crash_import()
+        with open(self.owners, 'a') as file:
+            file.write('o4,Harold,Davis,563 Friendly St.,Windsor,6085553198\n')
+        with self.assertRaisesMessage(CommandError, 'the files changed'):
+            self.run_import()
+        out, _ = self.run_import('--restart')
+        self.assertIn('owners: 3 imported, 1 skipped', out)
+
+
+class SeedPetclinicCommandTests(TestCase):
+    """Test cases for the seed_petclinic management command"""
+
+    def seed(self, *args):
+        call_command('seed_petclinic', '--owners', '5', '--pets-per-owner', '2', '--visits-per-pet', '3',
+                     '--vets', '2', '--batch-size', '2', *args, stdout=StringIO())
+
+    def snapshot(self):
+        return (
+            list(Owner.objects.order_by('pk').values_list('first_name', 'last_name', 'telephone')),
+            list(Pet.objects.order_by('pk').values_list('name', 'birth_date', 'type__name')),
+            list(Visit.objects.order_by('pk').values_list('date', 'description')),
+        )
+
+    def test_counts_and_counters(self):
+        """Test that the data is created with correct counters and search keys"""
+        self.seed()
+        self.assertEqual(Owner.objects.count(), 5)
+        self.assertEqual(Pet.objects.count(), 10)
+        self.assertEqual(Visit.objects.count(), 30)
+        self.assertEqual(Vet.objects.count(), 2)
+        call_command('rebuild_counters', '--verify', stdout=StringIO())
+        owner = Owner.objects.first()
+        self.assertIn(owner, Owner.objects.search(owner.last_name))
+
+    def test_same_seed_same_data(self):
+        """Test that a seed always generates the same data and another seed other data"""
+        self.seed()
+        first = self.snapshot()
+        for model in (Visit, Pet, Owner):
+            model.objects.all().delete()
+        self.seed()
+        self.assertEqual(self.snapshot(), first)
+        for model in (Visit, Pet, Owner):
+            model.objects.all().delete()
+        self.seed('--seed', '7')
+        self.assertNotEqual(self.snapshot(), first)
+
+    def test_negative_counts(self):
+        """Test that negative counts are rejected"""
+        with self.assertRaises(CommandError):
+            call_command('seed_petclinic', '--owners', '-1', stdout=StringIO())
+
+
+class ExportTests(TestCase):
+    """Test cases for the streamed dataset export"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.pet_type = PetType.objects.create(name="Dog")
+        self.owner = Owner.objects.create(first_name="George", last_name="Franklin", address="110 W. Liberty St.",
+                                          city="Madison", telephone="6085551023")
+        Owner.objects.create(first_name="Betty", last_name="Davis", address="638 Cardinal Ave.",
+                             city="Sun Prairie", telephone="6085551749")
+        self.pet = Pet.objects.create(name="Leo", birth_date=datetime.date(2018, 9, 7),
+                                      type=self.pet_type, owner=self.owner)
+        Pet.objects.create(name="Basil", birth_date=datetime.date(2019, 8, 6), type=self.pet_type, owner=self.owner)
+        for day in (1, 2):
+            Visit.objects.create(pet=self.pet, date=datetime.date(2023, 1, day), description="rabies shot")
+
+    def seed(self, owners):
+        """Add owners with two pets of two visits each, in bulk"""
+        new_owners = Owner.objects.bulk_create([
+            Owner(first_name=f"Owner{i}", last_name="Synthetic", address="1 Main St",
+                  city="Madison", telephone="6085550000")
+            for i in range(owners)
+        ])
+        pets = Pet.objects.bulk_create([
+            Pet(name=f"Pet{i}", birth_date=datetime.date(2018, 1, 1), type=self.pet_type, owner=owner)
+            for owner in new_owners for i in range(2)
+        ])
+        Visit.objects.bulk_create([
+            Visit(pet=pet, date=datetime.date(2023, 1, day), description="Checkup " * 8)
+            for pet in pets for day in (1, 2)
+        ])
+
+    def peak_memory(self, file_format):
+        """Return the peak memory allocated while consuming an export"""
+        gc.collect()
+        tracemalloc.start()
+        try:
+            for _ in stream(file_format, chunk_size=50):
+                pass
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_jsonl_nests_pets_and_visits(self):
+        """Test that each owner line holds their pets and the pets' visits"""
+        lines = [json.loads(line) for line in stream('jsonl')]
+        self.assertEqual([owner['last_name'] for owner in lines], ["Franklin", "Davis"])
+        leo = lines[0]['pets'][0]
+        self.assertEqual((leo['name'], leo['type']), ("Leo", "Dog"))
+        self.assertEqual([visit['date'] for visit in leo['visits']], ['2023-01-02', '2023-01-01'])
+        self.assertEqual(lines[1]['pets'], [])
+
+    def test_csv_has_a_row_per_visit(self):
+        """Test that the CSV export flattens visits, keeping pets and owners without any"""
+        out = StringIO()
+        call_command('export_petclinic', '--format', 'csv', stdout=out, stderr=StringIO())
+        rows = out.getvalue().splitlines()
+        self.assertTrue(rows[0].startswith('owner_id,owner_first_name'))
+        self.assertEqual(len(rows), 1 + 1 + 2 + 1)  # header, Basil, Leo's two visits, Davis
+
+    def test_columnar_lines(self):
+        """Test that each chunk is written as columns per table"""
+        lines = [json.loads(line) for line in stream('columnar')]
+        self.assertEqual([line['table'] for line in lines], ['owners', 'pets', 'visits'])
+        self.assertEqual(lines[1]['columns']['name'], ["Leo", "Basil"])
+
+    def test_queries_per_chunk(self):
+        """Test that an export costs four queries per chunk of owners"""
+        self.seed(8)
+        with self.assertNumQueries(4 * 2):
+            list(stream('jsonl', chunk_size=5))
+
+    def test_constant_memory(self):
+        """Test that the peak memory of an export does not grow with the tables"""
+        self.seed(150)
+        small = self.peak_memory('csv')
+        self.seed(1350)
+        self.assertLess(self.peak_memory('csv'), small * 1.5)
+
+    def test_view_requires_staff(self):
+        """Test that only staff can download the export"""
+        url = reverse('export')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        response = self.client.get(url, {'format': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('attachment; filename="petclinic-', response['Content-Disposition'])
+        self.assertIn(b'Franklin', b''.join(response.streaming_content))
+        self.assertEqual(self.client.get(url, {'format': 'xml'}).status_code, 400)
+
+class PetRemindersCommandTests(TestCase):
+    """Test cases for the pet_reminders management command"""
+
+    def setUp(self):
+        """Set up test data"""
+        owner = Owner.objects.create(first_name="John", last_name="Doe", address="123 Main St",
+                                     city="Anytown", telephone="555-1234")
+        pet_type = PetType.objects.create(name="Dog")
+        Pet.objects.create(name="Fido", birth_date=datetime.date(2018, 1, 5), type=pet_type, owner=owner)
+        Pet.objects.create(name="Rex", birth_date=datetime.date(2019, 6, 1), type=pet_type, owner=owner)
+
+    def reminders(self, *args):
+        out = StringIO()
+        call_command('pet_reminders', *args, '--date', '2023-12-20', stdout=out, stderr=StringIO())
+        return out.getvalue().splitlines()
+
+    def test_birthdays(self):
+        """Test that the birthdays of the window are written with the age the pets turn"""
+        self.assertEqual(self.reminders('birthdays', '--days', '30'), [
+            'pet_id,pet_name,owner_name,owner_telephone,birthday,turning',
+            f'{Pet.objects.get(name="Fido").pk},Fido,John Doe,555-1234,01-05,6',
+        ])
+
+    def test_checkups(self):
+        """Test that pets never seen are due for their checkup"""
+        lines = self.reminders('checkups')
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].endswith(','))
+
+    def test_invalid_days(self):
+        """Test that a window of a year or more is rejected"""
+        with self.assertRaises(CommandError):
+            self.reminders('birthdays', '--days', '365')
+
+class ArchiveVisitsCommandTests(TestCase):
+    """Test cases for the archive_visits management command"""
+
+    def setUp(self):
+        """Set up test data"""
+        fragment_cache().clear()
+        owner = Owner.objects.create(first_name="John", last_name="Doe", address="123 Main St",
+                                     city="Anytown", telephone="555-1234")
+        self.pet = Pet.objects.create(name="Fido", birth_date=datetime.date(2015, 1, 1),
+                                      type=PetType.objects.create(name="Dog"), owner=owner)
+        for year in range(2016, 2024):
+            Visit.objects.create(pet=self.pet, date=datetime.date(year, 6, 1), description=f"Checkup {year}")
+
+    def archive(self, *args):
+        call_command('archive_visits', '--before', '2022-01-01', '--pause', '0', *args, stdout=StringIO())
+
+    def test_moves_old_visits(self):
+        """Test that old visits move to the archive in batches and the pet keeps its counters"""
+        self.archive('--batch-size', '4')
+        self.assertEqual(sorted(Visit.objects.values_list('date__year', flat=True)), [2022, 2023])
+        self.assertEqual(VisitArchive.objects.count(), 6)
+        self.pet.refresh_from_db()
+        self.assertEqual((self.pet.visit_count, self.pet.last_visit_date), (8, datetime.date(2023, 6, 1)))
+        call_command('rebuild_counters', '--verify', stdout=StringIO())
+
+    def test_dry_run(self):
+        """Test that a dry run only counts the visits to archive"""
+        out = StringIO()
+        call_command('archive_visits', '--before', '2022-01-01', '--dry-run', stdout=out)
+        self.assertIn("6 visits", out.getvalue())
+        self.assertEqual(VisitArchive.objects.count(), 0)
+
+    def test_pages_show_recent_visits(self):
+        """Test that archiving refreshes the cached pages, which then offer the older visits"""
+        url = reverse('pets:pet-detail', args=[self.pet.id])
+        self.assertContains(self.client.get(url), "Checkup 2016")
+        self.archive()
+        response = self.client.get(url)
+        self.assertNotContains(response, "Checkup 2016")
+        self.assertContains(response, "Load older visits")
+        self.assertContains(self.client.get(reverse('owners:owner-detail', args=[self.pet.owner_id])),
+                            "Older visits")
+
+    def test_export_includes_archive(self):
+        """Test that the export still holds the archived visits"""
+        self.archive()
+        owner = json.loads(next(stream('jsonl')))
+        self.assertEqual(len(owner['pets'][0]['visits']), 8)
+        self.assertEqual(owner['pets'][0]['visits'][-1]['description'], "Checkup 2016")
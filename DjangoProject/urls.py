@@ -21,12 +21,18 @@ from django.conf.urls.static import static
 from . import views
 
 urlpatterns = [
-    path('', views.home, name='home'),
+    path('', views.home_async if settings.ASYNC_VIEWS else views.home, name='home'),
     path('admin/', admin.site.urls),
     path('owners/', include('owners.urls', namespace='owners')),
     path('pets/', include('pets.urls', namespace='pets')),
     path('vets/', include('vets.urls', namespace='vets')),
     path('visits/', include('visits.urls', namespace='visits')),
+    path('api/owners/', include('owners.api_urls', namespace='owners-api')),
+    path('api/pets/', include('pets.api_urls', namespace='pets-api')),
+    path('api/vets/', include('vets.api_urls', namespace='vets-api')),
+    path('api/visits/', include('visits.api_urls', namespace='visits-api')),
+    path('export/', views.export, name='export'),
+    path('metrics', views.metrics, name='metrics'),
     path('trigger-error/', views.trigger_error, name='trigger-error'),
 ]
 
@@ -1,9 +1,38 @@
+import datetime
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 
+from .exporting import FORMATS, stream
+from .metrics import registry
+from .pagecache import page_cache
+from .pagination import InvalidCursor, KeysetPaginator
+
+LOOKUP_PAGE_SIZE = 20
+
+# Static: refreshed after a deploy with `manage.py purge_pages home`
+@page_cache('home', query_params=())
 def home(request):
     """View function for home page of site."""
     return render(request, 'home.html')
 
+@page_cache('home', query_params=())
+async def home_async(request):
+    """Async counterpart of home"""
+    return await arender(request, 'home.html')
+
+async def arender(request, template_name, context=None):
+    """
+    render() for async views. The context must be fully loaded: queries
+    cannot run while the template renders in the event loop. The user,
+    which the context processors hand to every template, is loaded first.
+    """
+    request.user = await request.auser()
+    return render(request, template_name, context)
+
 def handler404(request, exception):
     """Custom 404 page not found handler"""
     return render(request, 'errors/404.html', status=404)
@@ -21,3 +50,36 @@ def trigger_error(request):
     # Intentionally raise an exception to trigger a 500 error
     division_by_zero = 1 / 0
     return render(request, 'home.html')
+
+@staff_member_required
+def export(request):
+    """Stream every owner with their pets and visits, as ?format=csv, jsonl or columnar"""
+    file_format = request.GET.get('format', 'jsonl')
+    if file_format not in FORMATS:
+        return HttpResponseBadRequest(f"Unknown format, choose from {', '.join(FORMATS)}.")
+    _, content_type, extension = FORMATS[file_format]
+    response = StreamingHttpResponse(stream(file_format), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="petclinic-{datetime.date.today()}.{extension}"'
+    return response
+
+def metrics(request):
+    """Serve the request metrics of this process to Prometheus"""
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS and not request.user.is_staff:
+        raise PermissionDenied
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def lookup_response(request, object_list, label=str, per_page=LOOKUP_PAGE_SIZE):
+    """
+    Return one page of a lookup endpoint as JSON for LookupSelect:
+    {"results": [{"id": ..., "text": ...}], "next": <cursor or null>}
+    """
+    try:
+        page = KeysetPaginator(object_list, per_page).page(request.GET.get('cursor'))
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    return JsonResponse({
+        'results': [{'id': obj.pk, 'text': label(obj)} for obj in page],
+        'next': page.next_cursor,
+    })
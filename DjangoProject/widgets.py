@@ -0,0 +1,52 @@
+from django import forms
+from django.core.exceptions import ValidationError
+
+
+class LookupSelect(forms.Select):
+    """
+    Select widget for a ModelChoiceField over a large table.
+
+    Only the currently selected object is rendered as an option, so the
+    page never iterates the field's whole queryset. The lookup script
+    (js/lookup.js) turns the select into a search box that fetches
+    matching options page by page from lookup_url, a JSON endpoint
+    answering ?q=<prefix>&cursor=<cursor> with
+    {"results": [{"id": ..., "text": ...}], "next": <cursor or null>}.
+    """
+
+    class Media:
+        js = ['js/lookup.js']
+
+    def __init__(self, lookup_url, attrs=None):
+        super().__init__(attrs)
+        self.lookup_url = lookup_url
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-lookup-url'] = str(self.lookup_url)
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        """Build the options from the selected values only"""
+        iterator = self.choices
+        if not hasattr(iterator, 'queryset'):
+            return super().optgroups(name, value, attrs)
+
+        pk_field = iterator.queryset.model._meta.pk
+        selected = []
+        for item in value:
+            try:
+                selected.append(pk_field.to_python(item))
+            except ValidationError:
+                pass
+        choices = []
+        if iterator.field.empty_label is not None:
+            choices.append(('', iterator.field.empty_label))
+        if selected:
+            choices.extend(iterator.choice(obj) for obj in iterator.queryset.filter(pk__in=selected))
+
+        self.choices = choices
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = iterator
@@ -0,0 +1,81 @@
+"""
+Compare the throughput of the JSON API with the HTML pages it replaces.
+
+    python -m benchmarks.bench_api --owners 200 --pets 3 --visits 5
+
+Times the owner list, an owner with its pets and visits and the vet
+list with specialties, each as an HTML page and as the equivalent API
+request, and reports latency, requests per second and response size.
+The page cache is off so every request renders.
+"""
+import datetime
+
+from benchmarks.harness import (
+    argument_parser, measure, progress, report, setup_django, summarize,
+)
+
+
+def seed(owners, pets, visits, vets):
+    """Create owners with pets and visits, and vets with specialties."""
+    from owners.models import Owner
+    from pets.models import Pet, PetType
+    from vets.models import Specialty, Vet
+    from visits.models import Visit
+
+    pet_type = PetType.objects.create(name='Cat')
+    for i in range(owners):
+        owner = Owner.objects.create(first_name=f'George{i}', last_name='Franklin',
+                                     address='110 W. Liberty St.', city='Madison',
+                                     telephone='6085551023')
+        for j in range(pets):
+            pet = Pet.objects.create(name=f'Leo {j}', birth_date=datetime.date(2018, 9, 7),
+                                     type=pet_type, owner=owner)
+            for day in range(visits):
+                Visit.objects.create(pet=pet, date=datetime.date(2023, 1, 1) + datetime.timedelta(days=day),
+                                     description=f'Checkup {day}')
+    specialties = [Specialty.objects.create(name=name) for name in ('dentistry', 'radiology', 'surgery')]
+    for i in range(vets):
+        vet = Vet.objects.create(first_name=f'Helen{i}', last_name='Leary')
+        vet.specialties.add(*specialties[:i % 4])
+    return Owner.objects.order_by('pk').first().pk
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('--owners', type=int, default=200)
+    parser.add_argument('--pets', type=int, default=3)
+    parser.add_argument('--visits', type=int, default=5)
+    parser.add_argument('--vets', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.test import Client
+    from django.urls import reverse
+
+    settings.PAGE_CACHE_ENABLED = False
+    owner_id = seed(args.owners, args.pets, args.visits, args.vets)
+    scenarios = {
+        'owner_list': (reverse('owners:owner-list'),
+                       reverse('owners-api:owner-list') + '?include=pets&fields[pets]=name'),
+        'owner_detail': (reverse('owners:owner-detail', args=[owner_id]),
+                         reverse('owners-api:owner-detail', args=[owner_id]) + '?include=pets.visits'),
+        'vet_list': (reverse('vets:vet-list'), reverse('vets-api:vet-list') + '?include=specialties'),
+    }
+    client = Client()
+    results = {}
+    for name, urls in scenarios.items():
+        results[name] = {}
+        for kind, url in zip(('html', 'api'), urls):
+            size = len(client.get(url).content)
+            stats = summarize(measure(lambda: client.get(url), args.repeat))
+            results[name][kind] = {**stats, 'requests_per_s': round(1000 / stats['mean_ms'], 1), 'bytes': size}
+        progress(f"{name}: {results[name]['html']['requests_per_s']} req/s html, "
+                 f"{results[name]['api']['requests_per_s']} req/s api")
+
+    report('api', results, owners=args.owners, pets=args.pets, visits=args.visits,
+           vets=args.vets, repeat=args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""
+Compare the sync views under WSGI with the async views under ASGI.
+
+    python -m benchmarks.bench_async --connections 200 --requests 5 --client-delay 0.2
+
+Each mode runs in its own interpreter, calling the WSGI or ASGI handler
+of the project in process, with ASYNC_VIEWS off or on. Every connection
+is a slow client: it takes --client-delay seconds to send each request,
+then reads the response. Under WSGI a connection holds a thread for as
+long as it lasts, as with a threaded server; under ASGI it is a task of
+one event loop. The connections cycle through the read views with the
+page cache off. Reports latency, requests per second and the peak
+resident memory added per connection.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.harness import argument_parser, progress, report, setup_django, summarize
+
+MODES = {'wsgi': '0', 'asgi': '1'}
+
+
+def resident_bytes():
+    """Return the resident set size of this process, or None where /proc is missing."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return None
+
+
+class PeakMemory(threading.Thread):
+    """Sample the resident set size until stopped and keep the peak."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.peak = resident_bytes()
+        self.done = threading.Event()
+
+    def run(self):
+        while not self.done.wait(0.005):
+            self.peak = max(self.peak, resident_bytes())
+
+    def stop(self):
+        self.done.set()
+        self.join()
+        return self.peak
+
+
+def read_urls():
+    """Return the URLs of the read views that have async counterparts."""
+    from django.urls import reverse
+    from owners.models import Owner
+    from pets.models import Pet
+
+    owner, pet = Owner.objects.order_by('pk').first(), Pet.objects.order_by('pk').first()
+    return [
+        reverse('home'),
+        reverse('owners:owner-list'),
+        reverse('owners:owner-search') + '?q=da',
+        reverse('owners:owner-detail', args=[owner.pk]),
+        reverse('pets:pet-detail', args=[pet.pk]),
+        reverse('vets:vet-list'),
+    ]
+
+
+def run_wsgi(urls, connections, requests, delay):
+    """Serve every connection from its own thread and return the request latencies."""
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db import connections as databases
+
+    handler = WSGIHandler()
+    latencies = []
+
+    def connection(index):
+        for number in range(requests):
+            path, _, query = urls[(index + number) % len(urls)].partition('?')
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query,
+                'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'HTTP_HOST': 'testserver',
+                'SERVER_PROTOCOL': 'HTTP/1.1', 'REMOTE_ADDR': '127.0.0.1',
+                'wsgi.input': io.BytesIO(b''), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+            }
+            start = time.perf_counter()
+            # The worker thread waits while the client sends its request
+            time.sleep(delay)
+            response = handler(environ, lambda status, headers, exc_info=None: None)
+            b''.join(response)
+            response.close()
+            latencies.append((time.perf_counter() - start) * 1000)
+        databases.close_all()
+
+    threads = [threading.Thread(target=connection, args=(index,)) for index in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def run_asgi(urls, connections, requests, delay):
+    """Serve every connection as a task of one event loop and return the request latencies."""
+    from django.core.handlers.asgi import ASGIHandler
+
+    handler = ASGIHandler()
+    latencies = []
+
+    async def request(url):
+        path, _, query = url.partition('?')
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+            'headers': [(b'host', b'testserver')], 'server': ('testserver', 80),
+            'client': ('127.0.0.1', 50000),
+        }
+        finished = asyncio.Event()
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                # The event loop serves other connections while this one sends its request
+                await asyncio.sleep(delay)
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await finished.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.body' and not message.get('more_body'):
+                finished.set()
+
+        await handler(scope, receive, send)
+
+    async def connection(index):
+        for number in range(requests):
+            start = time.perf_counter()
+            await request(urls[(index + number) % len(urls)])
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    async def serve():
+        await asyncio.gather(*(connection(index) for index in range(connections)))
+
+    asyncio.run(serve())
+    return latencies
+
+
+def run_mode(args):
+    """Run one mode in this interpreter and print its results as JSON."""
+    setup_django()
+    from django.conf import settings
+    from django.core.management import call_command
+
+    settings.PAGE_CACHE_ENABLED = False
+    settings.METRICS_ENABLED = False
+    call_command('seed_petclinic', owners=args.owners, verbosity=0)
+    urls = read_urls()
+    serve = run_wsgi if args.mode == 'wsgi' else run_asgi
+    # Warm up the templates and connections before measuring
+    serve(urls, 1, len(urls), 0)
+
+    baseline = resident_bytes()
+    sampler = PeakMemory()
+    sampler.start()
+    start = time.perf_counter()
+    latencies = serve(urls, args.connections, args.requests, args.client_delay)
+    elapsed = time.perf_counter() - start
+    peak = sampler.stop()
+
+    result = {
+        **summarize(latencies),
+        'requests_per_s': round(len(latencies) / elapsed, 1),
+        'peak_kib_per_connection': (
+            round((peak - baseline) / 1024 / args.connections, 1) if baseline is not None else None
+        ),
+    }
+    json.dump(result, sys.stdout)
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('--connections', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=5,
+                        help='Requests sent one after the other by each connection')
+    parser.add_argument('--client-delay', type=float, default=0.2,
+                        help='Seconds each client takes to send a request')
+    parser.add_argument('--owners', type=int, default=1000)
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args)
+        return
+
+    results = {}
+    for mode, async_views in MODES.items():
+        output = subprocess.run(
+            [sys.executable, '-m', __spec__.name, '--mode', mode,
+             '--connections', str(args.connections), '--requests', str(args.requests),
+             '--client-delay', str(args.client_delay), '--owners', str(args.owners)],
+            env=dict(os.environ, ASYNC_VIEWS=async_views), check=True, capture_output=True, text=True,
+        ).stdout
+        results[mode] = json.loads(output)
+        progress(f"{mode}: {results[mode]['requests_per_s']} req/s, "
+                 f"{results[mode]['p95_ms']} ms p95, "
+                 f"{results[mode]['peak_kib_per_connection']} KiB per connection")
+
+    report('async', results, connections=args.connections, requests=args.requests,
+           client_delay=args.client_delay, owners=args.owners)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Measure what conditional GET saves on repeat visits of the detail pages.
+
+    python -m benchmarks.bench_conditional_get --pets 10 --visits 20
+
+For each detail page, times a plain GET and a repeat GET carrying the
+ETag of the first response, which is answered with 304 Not Modified,
+and reports latency, CPU time and bytes of the response body.
+"""
+import datetime
+import time
+
+from benchmarks.harness import (
+    argument_parser, measure, progress, report, setup_django, summarize,
+)
+
+
+def seed(pets, visits):
+    """Create an owner with pets and visits and a vet with specialties."""
+    from owners.models import Owner
+    from pets.models import Pet, PetType
+    from vets.models import Specialty, Vet
+    from visits.models import Visit
+
+    owner = Owner.objects.create(first_name='George', last_name='Franklin',
+                                 address='110 W. Liberty St.', city='Madison',
+                                 telephone='6085551023')
+    pet_type = PetType.objects.create(name='Cat')
+    for i in range(pets):
+        pet = Pet.objects.create(name=f'Leo {i}', birth_date=datetime.date(2018, 9, 7),
+                                 type=pet_type, owner=owner)
+        Visit.objects.bulk_create([
+            Visit(pet=pet, date=datetime.date(2023, 1, 1) + datetime.timedelta(days=day),
+                  description=f'Checkup {day}')
+            for day in range(visits)
+        ])
+    vet = Vet.objects.create(first_name='Helen', last_name='Leary')
+    vet.specialties.add(*[Specialty.objects.create(name=name) for name in ('radiology', 'surgery')])
+    return {
+        'owner': ('owners:owner-detail', owner.pk),
+        'pet': ('pets:pet-detail', pet.pk),
+        'visit': ('visits:visit-detail', Visit.objects.filter(pet=pet).first().pk),
+        'vet': ('vets:vet-detail', vet.pk),
+    }
+
+
+def cpu_ms(func, repeat):
+    """Return the mean process CPU time of func in ms."""
+    start = time.process_time()
+    for _ in range(repeat):
+        func()
+    return round((time.process_time() - start) * 1000 / repeat, 3)
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('--pets', type=int, default=10)
+    parser.add_argument('--visits', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import Client
+    from django.urls import reverse
+
+    pages = seed(args.pets, args.visits)
+    client = Client()
+    results = {}
+    for page, (name, pk) in pages.items():
+        url = reverse(name, args=[pk])
+        first = client.get(url)
+        etag = first['ETag']
+
+        def full():
+            client.get(url)
+
+        def conditional():
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+            assert response.status_code == 304
+
+        results[page] = {
+            'full': {**summarize(measure(full, args.repeat)),
+                     'cpu_ms': cpu_ms(full, args.repeat), 'bytes': len(first.content)},
+            'not_modified': {**summarize(measure(conditional, args.repeat)),
+                             'cpu_ms': cpu_ms(conditional, args.repeat), 'bytes': 0},
+        }
+        progress(f"{page}: {results[page]['full']['p50_ms']} ms / {len(first.content)} B full, "
+                 f"{results[page]['not_modified']['p50_ms']} ms / 0 B not modified")
+
+    report('conditional_get', results, pets=args.pets, visits=args.visits, repeat=args.repeat)
+
+
+if __name__ == '__main__':
+    main()
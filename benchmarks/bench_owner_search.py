@@ -0,0 +1,87 @@
+"""
+Compare the indexed owner search with the old icontains filter.
+
+    python -m benchmarks.bench_owner_search --owners 2000000
+
+Reports the latency of fetching the first page of results for a few
+typical queries, once through Owner.objects.search() and once through the
+leading-wildcard LIKE the views used before.
+"""
+import random
+
+from benchmarks.harness import (
+    argument_parser, measure, progress, report, setup_django, summarize,
+)
+
+SYLLABLES = ['an', 'bel', 'cor', 'da', 'el', 'fin', 'gar', 'ha', 'is', 'jo',
+             'ka', 'lin', 'mar', 'no', 'or', 'pe', 'qui', 'ros', 'sa', 'ter',
+             'ul', 'van', 'wil', 'xa', 'yo', 'zim']
+
+QUERIES = ['mar', 'marsa', 'jo ter', 'Zimvan']
+
+
+def make_name(rng, parts):
+    """Return a capitalized pseudo name made of random syllables."""
+    return ''.join(rng.choice(SYLLABLES) for _ in range(parts)).capitalize()
+
+
+def seed_owners(count, seed=42, batch_size=5000):
+    """Bulk insert count owners with deterministic pseudo random names."""
+    from owners.models import Owner, OwnerNameWord
+
+    rng = random.Random(seed)
+    for start in range(0, count, batch_size):
+        batch = []
+        for _ in range(min(batch_size, count - start)):
+            owner = Owner(
+                first_name=make_name(rng, 2),
+                last_name=make_name(rng, rng.randint(2, 4)),
+                address='1 Main St',
+                city='Anytown',
+                telephone='555-0000',
+            )
+            owner.update_search_keys()
+            batch.append(owner)
+        Owner.objects.bulk_create(batch)
+        OwnerNameWord.objects.bulk_create(OwnerNameWord.for_owners(batch))
+        progress(f'inserted {start + len(batch)} owners')
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('--owners', type=int, default=200000)
+    parser.add_argument('--legacy-repeat', type=int, default=5,
+                        help='Timed runs for the slow icontains filter')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from django.db.models import Q
+    from owners.models import Owner
+
+    seed_owners(args.owners)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+    results = {}
+    for query in QUERIES:
+        def indexed():
+            list(Owner.objects.search(query)[:10])
+
+        def legacy():
+            list(Owner.objects.filter(
+                Q(last_name__icontains=query) | Q(first_name__icontains=query)
+            )[:10])
+
+        results[query] = {
+            'indexed': summarize(measure(indexed, args.repeat)),
+            'icontains': summarize(measure(legacy, args.legacy_repeat, warmup=1)),
+        }
+        progress(f'{query!r}: {results[query]["indexed"]["p50_ms"]} ms indexed, '
+                 f'{results[query]["icontains"]["p50_ms"]} ms icontains')
+
+    report('owner_search', results, owners=args.owners, repeat=args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Compare deep page latency of Django's Paginator with keyset pagination.
+
+    python -m benchmarks.bench_pagination --owners 1000000
+
+For each page depth, times fetching one page of owners in Meta.ordering
+with Paginator (COUNT(*) plus OFFSET) and with KeysetPaginator (seek to
+the cursor of the previous page's last row).
+"""
+from benchmarks.bench_owner_search import seed_owners
+from benchmarks.harness import (
+    argument_parser, measure, progress, report, setup_django, summarize,
+)
+
+PER_PAGE = 10
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('--owners', type=int, default=200000)
+    parser.add_argument('--depths', type=int, nargs='+', default=[1, 100, 1000, 10000])
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.paginator import Paginator
+    from django.db import connection
+    from DjangoProject.pagination import KeysetPaginator, encode_cursor, get_ordering, sort_key
+    from owners.models import Owner
+
+    seed_owners(args.owners)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+    queryset = Owner.objects.all()
+    ordering = get_ordering(queryset)
+    results = {}
+    for depth in args.depths:
+        if (depth - 1) * PER_PAGE >= args.owners:
+            continue
+        cursor = None
+        if depth > 1:
+            # Cursor of the last row of the page before, as a "next" link would carry
+            boundary = queryset.order_by('last_name', 'first_name', 'pk')[(depth - 1) * PER_PAGE - 1]
+            cursor = encode_cursor({'s': 0, 'k': sort_key(boundary, ordering), 'd': 'next'})
+
+        def offset_page():
+            list(Paginator(queryset.order_by('last_name', 'first_name', 'pk'), PER_PAGE).page(depth))
+
+        def keyset_page():
+            list(KeysetPaginator(queryset, PER_PAGE).page(cursor))
+
+        results[f'page_{depth}'] = {
+            'paginator': summarize(measure(offset_page, args.repeat)),
+            'keyset': summarize(measure(keyset_page, args.repeat)),
+        }
+        progress(f'page {depth}: {results[f"page_{depth}"]["paginator"]["p50_ms"]} ms paginator, '
+                 f'{results[f"page_{depth}"]["keyset"]["p50_ms"]} ms keyset')
+
+    report('pagination', results, owners=args.owners, per_page=PER_PAGE, repeat=args.repeat)
+
+
+if __name__ == '__main__':
+    main()
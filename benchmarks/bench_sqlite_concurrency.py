@@ -0,0 +1,171 @@
+"""
+Compare concurrent read/write throughput of stock and tuned SQLite.
+
+    python -m benchmarks.bench_sqlite_concurrency --readers 8 --writers 4 --seconds 10
+
+Each profile runs in its own interpreter with its settings given as
+environment variables, against a fresh database file in a temporary
+directory. Reader processes load an owner with its pets and visits, as
+the owner detail page does; writer processes read a pet and add a visit
+to it inside one transaction, as the visit form does. Reports operations
+per second and the number of "database is locked" failures per role.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.harness import argument_parser, progress, report
+
+# Environment of each profile; settings.py reads these
+PROFILES = {
+    # Django's SQLite defaults: rollback journal, deferred transactions
+    'stock': {
+        'SQLITE_JOURNAL_MODE': 'DELETE',
+        'SQLITE_SYNCHRONOUS': 'FULL',
+        'SQLITE_MMAP_SIZE': '0',
+        'SQLITE_CACHE_SIZE': '-2000',
+        'SQLITE_TEMP_STORE': 'DEFAULT',
+        'SQLITE_TRANSACTION_MODE': '',
+    },
+    # The defaults of settings.py
+    'tuned': {},
+}
+
+
+def seed(owners):
+    """Insert owners with two pets each and a visit per pet."""
+    import datetime
+    from owners.models import Owner
+    from pets.models import Pet, PetType
+    from visits.models import Visit
+
+    pet_type = PetType.objects.create(name='Dog')
+    Owner.objects.bulk_create([
+        Owner(first_name=f'First{i}', last_name=f'Last{i}', address='1 Main St',
+              city='Anytown', telephone='555-0000')
+        for i in range(owners)
+    ])
+    owner_ids = list(Owner.objects.values_list('pk', flat=True))
+    Pet.objects.bulk_create([
+        Pet(name=f'Pet{owner_id}-{n}', birth_date=datetime.date(2020, 1, 1),
+            type=pet_type, owner_id=owner_id)
+        for owner_id in owner_ids for n in range(2)
+    ])
+    Visit.objects.bulk_create([
+        Visit(pet_id=pet_id, date=datetime.date(2024, 1, 1), description='Checkup')
+        for pet_id in Pet.objects.values_list('pk', flat=True)
+    ])
+
+
+def read_once(rng, owners):
+    """Load a random owner with pets and visits, like the owner detail page."""
+    from owners.models import Owner
+    owner = Owner.objects.get(pk=rng.randint(1, owners))
+    for pet in owner.pets.select_related('type').prefetch_related('visits'):
+        list(pet.visits.all())
+
+
+def write_once(rng, owners):
+    """Read a pet and add a visit to it in one transaction, like the visit form."""
+    import datetime
+    from django.db import transaction
+    from pets.models import Pet
+    from visits.models import Visit
+    with transaction.atomic():
+        pet = Pet.objects.filter(owner_id=rng.randint(1, owners)).first()
+        Visit.objects.create(pet=pet, date=datetime.date.today(), description='Follow-up')
+
+
+def work(role, owners, deadline, results):
+    """Run read or write operations until deadline and report the counts."""
+    from django.db import OperationalError, connection
+
+    operation = read_once if role == 'reader' else write_once
+    rng = random.Random(os.getpid())
+    done = locked = 0
+    while time.monotonic() < deadline:
+        try:
+            operation(rng, owners)
+            done += 1
+        except OperationalError as error:
+            if 'locked' not in str(error):
+                raise
+            locked += 1
+    connection.close()
+    results.put((role, done, locked))
+
+
+def run_profile(args):
+    """Run one profile in this interpreter and print its counts as JSON."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'DjangoProject.settings')
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from django.db import connections
+
+    call_command('migrate', verbosity=0, interactive=False)
+    seed(args.owners)
+    connections.close_all()
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    deadline = time.monotonic() + args.seconds
+    workers = [
+        context.Process(target=work, args=(role, args.owners, deadline, results))
+        for role in ['reader'] * args.readers + ['writer'] * args.writers
+    ]
+    for worker in workers:
+        worker.start()
+    counts = {role: {'ops': 0, 'locked': 0} for role in ('reader', 'writer')}
+    for _ in workers:
+        role, done, locked = results.get()
+        counts[role]['ops'] += done
+        counts[role]['locked'] += locked
+    for worker in workers:
+        worker.join()
+    for role in counts:
+        counts[role]['ops_per_s'] = round(counts[role]['ops'] / args.seconds, 1)
+    json.dump(counts, sys.stdout)
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--owners', type=int, default=10000)
+    parser.add_argument('--profile', choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        run_profile(args)
+        return
+
+    results = {}
+    for name, overrides in PROFILES.items():
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ, SQLITE_PATH=os.path.join(directory, 'bench.sqlite3'))
+            env.update(overrides)
+            output = subprocess.run(
+                [sys.executable, '-m', __spec__.name, '--profile', name,
+                 '--readers', str(args.readers), '--writers', str(args.writers),
+                 '--seconds', str(args.seconds), '--owners', str(args.owners)],
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout
+        results[name] = json.loads(output)
+        progress(f"{name}: {results[name]['reader']['ops_per_s']} reads/s, "
+                 f"{results[name]['writer']['ops_per_s']} writes/s, "
+                 f"{results[name]['writer']['locked']} locked writes")
+
+    report('sqlite_concurrency', results, readers=args.readers, writers=args.writers,
+           seconds=args.seconds, owners=args.owners)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Time every named view of the site through the test client.
+
+    python -m benchmarks.bench_views --owners 1000 --pets-per-owner 2 --visits-per-pet 3
+
+Seeds the database with the seed_petclinic command, then requests every
+named URL the way explain_views finds them, plus a valid POST to each
+create and update view. Reports latency percentiles, queries per
+request and requests per second for each of them. The page cache is off
+so every request runs its view; staff-only views are requested logged in.
+"""
+import datetime
+
+from benchmarks.harness import (
+    argument_parser, measure, progress, report, setup_django, summarize,
+)
+
+
+def form_posts(owner_id, pet_id, visit_id, vet_id, pet_type_id, specialty_id):
+    """Return (name, kwargs, data) of a valid POST to each create and update view."""
+    owner = {'first_name': 'George', 'last_name': 'Franklin', 'address': '110 W. Liberty St.',
+             'city': 'Madison', 'telephone': '608-555-1023'}
+    pet = {'name': 'Leo', 'birth_date': '2018-09-07', 'type': pet_type_id, 'owner': owner_id}
+    visit = {'date': datetime.date(2024, 1, 1).isoformat(), 'description': 'checkup', 'pet': pet_id}
+    vet = {'first_name': 'Helen', 'last_name': 'Leary', 'specialties': [specialty_id]}
+    return [
+        ('owners:owner-create', {}, owner),
+        ('owners:owner-update', {'pk': owner_id}, owner),
+        ('pets:pet-create', {}, pet),
+        ('pets:pet-create-for-owner', {'owner_id': owner_id}, pet),
+        ('pets:pet-update', {'pk': pet_id}, pet),
+        ('visits:visit-create', {}, visit),
+        ('visits:visit-create-for-pet', {'pet_id': pet_id}, visit),
+        ('visits:visit-update', {'pk': visit_id}, visit),
+        ('vets:vet-create', {}, vet),
+        ('vets:vet-update', {'pk': vet_id}, vet),
+    ]
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('--owners', type=int, default=1000)
+    parser.add_argument('--pets-per-owner', type=int, default=2)
+    parser.add_argument('--visits-per-pet', type=int, default=3)
+    parser.add_argument('--vets', type=int, default=20)
+    parser.add_argument('--view', action='append', default=[], metavar='NAME',
+                        help='Only time this URL name, e.g. owners:owner-list (can be repeated)')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import reverse
+
+    from DjangoProject.management.commands.explain_views import Command as ExplainViews
+    from owners.models import Owner
+    from pets.models import Pet, PetType
+    from vets.models import Specialty, Vet
+    from visits.models import Visit
+
+    settings.PAGE_CACHE_ENABLED = False
+    call_command('seed_petclinic', owners=args.owners, pets_per_owner=args.pets_per_owner,
+                 visits_per_pet=args.visits_per_pet, vets=args.vets, verbosity=0)
+    progress(f'seeded {args.owners} owners')
+
+    explain = ExplainViews()
+    explain.connection = connection
+    requests = [(name, url, None) for name, url in explain.urls()]
+    first = {model: model.objects.order_by('pk').values_list('pk', flat=True).first()
+             for model in (Owner, Pet, Visit, Vet, PetType, Specialty)}
+    for name, kwargs, data in form_posts(*first.values()):
+        requests.append((f'{name} POST', reverse(name, kwargs=kwargs), data))
+    if args.view:
+        requests = [request for request in requests if request[0].removesuffix(' POST') in args.view]
+
+    client = Client()
+    client.force_login(User.objects.create_user('bench', is_staff=True))
+    results = {}
+    for name, url, data in requests:
+        def fetch():
+            response = client.get(url) if data is None else client.post(url, data)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            return response
+
+        with CaptureQueriesContext(connection) as queries:
+            response = fetch()
+        # Count now, every request clears the log the context reads from
+        query_count = len(queries)
+        if response.status_code >= 400 or (data is not None and response.status_code != 302):
+            progress(f'{name} {url}: skipped, status {response.status_code}')
+            continue
+        stats = summarize(measure(fetch, args.repeat))
+        key = f'{name} {url}'
+        results[key] = {**stats, 'queries': query_count, 'requests_per_s': round(1000 / stats['mean_ms'], 1)}
+        progress(f"{key}: {stats['p50_ms']} ms p50, {query_count} queries")
+
+    report('views', results, owners=args.owners, pets_per_owner=args.pets_per_owner,
+           visits_per_pet=args.visits_per_pet, vets=args.vets, repeat=args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Every benchmark runs against a throwaway test database built from the
+project's migrations, so db.sqlite3 is never touched. Run a benchmark
+from the project root, e.g.:
+
+    python -m benchmarks.bench_owner_search --owners 2000000
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+
+def setup_django():
+    """Configure Django and create a fresh test database."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'DjangoProject.settings')
+    import django
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    setup_test_environment(debug=False)
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+
+def argument_parser(description):
+    """Return an ArgumentParser with the options every benchmark accepts."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--repeat', type=int, default=200,
+                        help='Number of timed runs per scenario')
+    return parser
+
+
+def measure(func, repeat, warmup=5):
+    """Call func repeatedly and return the duration of each call in ms."""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def percentile(samples, pct):
+    """Return the pct-th percentile of samples using nearest rank."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """Return latency statistics in ms for a list of samples."""
+    return {
+        'runs': len(samples),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+        'max_ms': round(max(samples), 3),
+    }
+
+
+def report(name, results, **params):
+    """Print the results of a benchmark as JSON on stdout."""
+    json.dump({'benchmark': name, 'params': params, 'results': results},
+              sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+def progress(message):
+    """Print a progress message on stderr, keeping stdout machine-readable."""
+    print(message, file=sys.stderr, flush=True)
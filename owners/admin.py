@@ -1,3 +1,10 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Owner
+
+
+@admin.register(Owner)
+class OwnerAdmin(admin.ModelAdmin):
+    list_display = ['last_name', 'first_name', 'city', 'telephone', 'pet_count']
+    search_fields = ['last_name', 'first_name']
+    readonly_fields = ['pet_count']
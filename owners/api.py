@@ -0,0 +1,21 @@
+from DjangoProject.api import Relation, Resource
+from pets.api import pets
+from .models import Owner
+
+
+class OwnerResource(Resource):
+    model = Owner
+    fields = {
+        'id': 'pk',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'address': 'address',
+        'city': 'city',
+        'telephone': 'telephone',
+        'pet_count': 'pet_count',
+        'updated_at': 'updated_at',
+    }
+    relations = {'pets': Relation(pets, 'owner')}
+
+
+owners = OwnerResource()
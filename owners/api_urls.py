@@ -0,0 +1,11 @@
+from django.urls import path
+
+from DjangoProject.api import ResourceView
+from .api import owners
+
+app_name = 'owners-api'
+
+urlpatterns = [
+    path('', ResourceView.as_view(resource=owners), name='owner-list'),
+    path('<int:pk>/', ResourceView.as_view(resource=owners), name='owner-detail'),
+]
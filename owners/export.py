@@ -0,0 +1,95 @@
+"""
+Streamed owner exports.
+
+The generators below read owners with QuerySet.iterator(), which fetches
+rows from the database cursor in chunks (prefetching each chunk's pets
+with one query), and yield the output piece by piece. Wrapped in a
+StreamingHttpResponse, memory use stays flat however many owners are
+exported. The astream_ variants do the same with QuerySet.aiterator()
+for the async search view.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.html import format_html
+
+CHUNK_SIZE = 500
+
+FIELDS = ['id', 'first_name', 'last_name', 'address', 'city', 'telephone']
+
+
+def iter_owners(owners):
+    """Iterate over a queryset or an OwnerSearch in chunks"""
+    segments = owners.tiers() if hasattr(owners, 'tiers') else [owners]
+    for segment in segments:
+        yield from segment.iterator(chunk_size=CHUNK_SIZE)
+
+
+async def aiter_owners(owners):
+    """Async counterpart of iter_owners"""
+    segments = owners.tiers() if hasattr(owners, 'tiers') else [owners]
+    for segment in segments:
+        async for owner in segment.aiterator(chunk_size=CHUNK_SIZE):
+            yield owner
+
+
+def owner_record(owner):
+    """Return the exported fields of an owner and the names of their pets"""
+    record = {field: getattr(owner, field) for field in FIELDS}
+    record['pets'] = [pet.name for pet in owner.pets.all()]
+    return record
+
+
+def json_row(owner, first):
+    return ('' if first else ',\n') + json.dumps(owner_record(owner), cls=DjangoJSONEncoder)
+
+
+def stream_json(owners):
+    """Yield the owners as a JSON array, one owner per line"""
+    yield '[\n'
+    for index, owner in enumerate(iter_owners(owners)):
+        yield json_row(owner, not index)
+    yield '\n]\n'
+
+
+async def astream_json(owners):
+    """Async counterpart of stream_json"""
+    yield '[\n'
+    first = True
+    async for owner in aiter_owners(owners):
+        yield json_row(owner, first)
+        first = False
+    yield '\n]\n'
+
+
+HTML_HEADER = (
+    '<!DOCTYPE html>\n<html lang="en">\n<head><meta charset="UTF-8">'
+    '<title>Owners</title></head>\n<body>\n<table>\n<thead><tr>'
+    '<th>Name</th><th>Address</th><th>City</th><th>Telephone</th><th>Pets</th>'
+    '</tr></thead>\n<tbody>\n'
+)
+HTML_FOOTER = '</tbody>\n</table>\n</body>\n</html>\n'
+
+
+def html_row(owner):
+    return format_html(
+        '<tr><td>{} {}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>\n',
+        owner.first_name, owner.last_name, owner.address, owner.city,
+        owner.telephone, ', '.join(pet.name for pet in owner.pets.all()),
+    )
+
+
+def stream_html(owners):
+    """Yield the owners as a standalone HTML table"""
+    yield HTML_HEADER
+    for owner in iter_owners(owners):
+        yield html_row(owner)
+    yield HTML_FOOTER
+
+
+async def astream_html(owners):
+    """Async counterpart of stream_html"""
+    yield HTML_HEADER
+    async for owner in aiter_owners(owners):
+        yield html_row(owner)
+    yield HTML_FOOTER
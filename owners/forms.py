@@ -1,5 +1,6 @@
 from django import forms
 from .models import Owner
+from .validators import validate_telephone
 
 class OwnerForm(forms.ModelForm):
     """Form for creating and updating Owner instances"""
@@ -18,7 +19,5 @@ class OwnerForm(forms.ModelForm):
     def clean_telephone(self):
         """Validate telephone number format"""
         telephone = self.cleaned_data.get('telephone')
-        # Simple validation - ensure it contains only digits, spaces, dashes, and parentheses
-        if telephone and not all(char.isdigit() or char in ' -()' for char in telephone):
-            raise forms.ValidationError('Telephone number should contain only digits, spaces, dashes, and parentheses.')
+        validate_telephone(telephone)
         return telephone
\ No newline at end of file
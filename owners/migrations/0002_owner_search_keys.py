@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:41
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def normalize(text):
+    """Frozen copy of owners.search.normalize as of this migration."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.casefold().split())
+
+
+def populate_search_keys(apps, schema_editor):
+    """Fill the search keys of the owners created before they existed."""
+    Owner = apps.get_model('owners', 'Owner')
+    manager = Owner.objects.db_manager(schema_editor.connection.alias)
+    owners = manager.only('first_name', 'last_name')
+    batch = []
+    for owner in owners.iterator(chunk_size=2000):
+        owner.first_name_key = normalize(owner.first_name)
+        owner.last_name_key = normalize(owner.last_name)
+        batch.append(owner)
+        if len(batch) == 2000:
+            manager.bulk_update(batch, ['first_name_key', 'last_name_key'])
+            batch = []
+    manager.bulk_update(batch, ['first_name_key', 'last_name_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('owners', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='owner',
+            name='first_name_key',
+            field=models.CharField(default='', editable=False, max_length=60),
+        ),
+        migrations.AddField(
+            model_name='owner',
+            name='last_name_key',
+            field=models.CharField(default='', editable=False, max_length=60),
+        ),
+        migrations.RunPython(populate_search_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='owner',
+            index=models.Index(fields=['last_name_key', 'first_name_key'], name='owner_last_name_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='owner',
+            index=models.Index(fields=['first_name_key', 'last_name_key'], name='owner_first_name_key_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('owners', '0003_name_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='owner',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
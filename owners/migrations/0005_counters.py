@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:07
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_pet_counts(apps, schema_editor):
+    """Count the pets of every owner."""
+    Owner = apps.get_model('owners', 'Owner')
+    Pet = apps.get_model('pets', 'Pet')
+    alias = schema_editor.connection.alias
+    pets = (
+        Pet.objects.using(alias).filter(owner=OuterRef('pk'))
+        .order_by().values('owner').annotate(count=Count('pk')).values('count')
+    )
+    Owner.objects.using(alias).update(
+        pet_count=Coalesce(Subquery(pets, output_field=IntegerField()), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('owners', '0004_updated_at'),
+        ('pets', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='owner',
+            name='pet_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_pet_counts, migrations.RunPython.noop),
+    ]
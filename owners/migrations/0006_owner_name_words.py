@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_name_words(apps, schema_editor):
+    """Index the later words of the names of the existing owners."""
+    Owner = apps.get_model('owners', 'Owner')
+    OwnerNameWord = apps.get_model('owners', 'OwnerNameWord')
+    alias = schema_editor.connection.alias
+    # Most names are a single word: only read the keys holding a space
+    owners = Owner.objects.using(alias).filter(
+        models.Q(first_name_key__contains=' ') | models.Q(last_name_key__contains=' ')
+    ).values_list('pk', 'first_name_key', 'last_name_key')
+    batch = []
+    for pk, first_name_key, last_name_key in owners.iterator(chunk_size=2000):
+        words = {word for key in (first_name_key, last_name_key) for word in key.split()[1:]}
+        batch.extend(OwnerNameWord(owner_id=pk, word=word) for word in sorted(words))
+        if len(batch) >= 2000:
+            OwnerNameWord.objects.using(alias).bulk_create(batch)
+            batch = []
+    OwnerNameWord.objects.using(alias).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('owners', '0005_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OwnerNameWord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('word', models.CharField(max_length=60)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='name_words', to='owners.owner')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['word', 'owner'], name='owner_name_word_idx')],
+            },
+        ),
+        migrations.RunPython(populate_name_words, migrations.RunPython.noop),
+    ]
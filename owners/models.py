@@ -1,6 +1,18 @@
 from django.db import models
 from django.urls import reverse
 
+from .search import OwnerSearch, later_words, normalize
+
+class OwnerQuerySet(models.QuerySet):
+    """QuerySet for Owner with indexed name search"""
+
+    def search(self, query):
+        """
+        Return the owners with a word of their names starting with every
+        word of the query, best matches first, as an OwnerSearch sequence
+        """
+        return OwnerSearch(self, query)
+
 class Owner(models.Model):
     """Model representing a pet owner"""
     first_name = models.CharField(max_length=30)
@@ -9,8 +21,60 @@ class Owner(models.Model):
     city = models.CharField(max_length=80)
     telephone = models.CharField(max_length=20)
 
+    # Normalized copies of the names, maintained by save() for indexed search
+    first_name_key = models.CharField(max_length=60, default='', editable=False)
+    last_name_key = models.CharField(max_length=60, default='', editable=False)
+
+    # Also touched when a pet or visit of the owner changes, see signals.py
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Maintained by pets/signals.py, rebuilt by the rebuild_counters command
+    pet_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = OwnerQuerySet.as_manager()
+
     class Meta:
         ordering = ['last_name', 'first_name']
+        indexes = [
+            models.Index(fields=['last_name', 'first_name'], name='owner_name_idx'),
+            models.Index(fields=['last_name_key', 'first_name_key'], name='owner_last_name_key_idx'),
+            models.Index(fields=['first_name_key', 'last_name_key'], name='owner_first_name_key_idx'),
+        ]
+
+    # Written by the signal receivers in UPDATE queries, never from a loaded instance
+    counter_fields = {'pet_count'}
+
+    def save(self, *args, **kwargs):
+        """
+        Keep the search keys and name words in sync with the names on every save.
+
+        A loaded owner is saved as if update_fields listed every column but
+        the counters, which only the signal receivers write. Like any save
+        with update_fields, saving an owner deleted since it was loaded
+        raises DatabaseError instead of inserting it again.
+        """
+        keys = (self.first_name_key, self.last_name_key)
+        adding = self._state.adding
+        self.update_search_keys()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'first_name_key', 'last_name_key', 'updated_at'}
+        elif not self._state.adding and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = {
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            }
+        super().save(*args, **kwargs)
+        if keys != (self.first_name_key, self.last_name_key) or adding:
+            using = kwargs.get('using') or self._state.db
+            if not adding:
+                self.name_words.using(using).delete()
+            OwnerNameWord.objects.using(using).bulk_create(OwnerNameWord.for_owners([self]))
+
+    def update_search_keys(self):
+        """Recompute the search keys from the names (use before bulk_create)."""
+        self.first_name_key = normalize(self.first_name)
+        self.last_name_key = normalize(self.last_name)
 
     def get_absolute_url(self):
         """Returns the url to access a particular owner instance."""
@@ -23,3 +87,31 @@ class Owner(models.Model):
     def __str__(self):
         """String for representing the Model object."""
         return self.get_full_name()
+
+
+class OwnerNameWord(models.Model):
+    """
+    A word of an owner's name after its first, e.g. 'berg' of 'van der
+    Berg', for owner search. Kept in sync by Owner.save(); after a
+    bulk_create of owners, create theirs with for_owners().
+    """
+    owner = models.ForeignKey(Owner, on_delete=models.CASCADE, related_name='name_words')
+    word = models.CharField(max_length=60)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['word', 'owner'], name='owner_name_word_idx'),
+        ]
+
+    @classmethod
+    def for_owners(cls, owners):
+        """Return the unsaved words of saved owners whose search keys are up to date"""
+        return [
+            cls(owner_id=owner.pk, word=word)
+            for owner in owners
+            for word in later_words(owner.first_name_key, owner.last_name_key)
+        ]
+
+    def __str__(self):
+        """String for representing the Model object."""
+        return self.word
@@ -0,0 +1,171 @@
+"""
+Indexed owner name search.
+
+Owner names are stored a second time in normalized key columns
+(lowercased, accents stripped, whitespace collapsed) that carry database
+indexes. A search query is split into tokens and every token has to be a
+prefix of a word of the owner's names. Prefixes are matched with a range
+condition (key >= token AND key < token + U+10FFFF) rather than LIKE, so
+every database backend can answer it with an index range scan instead
+of a full table scan.
+
+The first word of each name is matched on its key column. The words
+after it, such as 'berg' in 'van der Berg', are kept one per row in
+OwnerNameWord, an inverted index searched with the same ranges.
+"""
+import unicodedata
+
+from django.db.models import Q
+
+# Sorts after every character that can appear in a key, so that
+# key < prefix + PREFIX_END holds for every key starting with prefix
+PREFIX_END = '\U0010ffff'
+
+# Longer queries are truncated to keep the generated SQL bounded
+MAX_TOKENS = 4
+
+
+def normalize(text):
+    """Return text lowercased, without accents and with collapsed whitespace"""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.casefold().split())
+
+
+def tokenize(query):
+    """Split a search query into normalized tokens"""
+    return normalize(query).split()[:MAX_TOKENS]
+
+
+def later_words(*keys):
+    """Return the words of normalized names after their first word, without duplicates"""
+    return sorted({word for key in keys for word in key.split()[1:]})
+
+
+def prefix_q(field, prefix):
+    """Return a Q object matching values of field that start with prefix"""
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix + PREFIX_END})
+
+
+def word_q(token):
+    """Return a Q object matching owners with a later word of their names starting with token"""
+    from .models import OwnerNameWord
+
+    words = OwnerNameWord.objects.filter(prefix_q('word', token)).values('owner_id')
+    return Q(pk__in=words)
+
+
+def token_q(token):
+    """Return a Q object matching owners with a word of their names starting with token"""
+    return prefix_q('last_name_key', token) | prefix_q('first_name_key', token) | word_q(token)
+
+
+class OwnerSearch:
+    """
+    Ranked owner search answered with index range scans.
+
+    The longest token of the query leads the search. Owners whose last
+    name starts with it rank first, followed by owners matched on their
+    first name, then owners matched on a later word of a name only; the
+    remaining tokens must prefix any word of the names. Within the first
+    two tiers results are in key order, so exact matches come before
+    longer names, and the last one is in id order. Every tier is read
+    along its own index, which means a page of results never requires
+    sorting the whole match set.
+
+    Instances behave like a read-only sequence, so they can be iterated,
+    sliced and handed to a Paginator like a queryset.
+    """
+
+    # (lead field, secondary field) of each tier, in rank order
+    TIERS = [
+        ('last_name_key', 'first_name_key'),
+        ('first_name_key', 'last_name_key'),
+    ]
+
+    def __init__(self, queryset, query):
+        self.queryset = queryset
+        self.tokens = tokenize(query)
+        self._counts = {}
+
+    @property
+    def lead(self):
+        """Return the most selective token, which drives the index scan"""
+        return max(self.tokens, key=len)
+
+    def tiers(self):
+        """Return one queryset per tier, each ordered along its index"""
+        if not self.tokens:
+            return []
+        lead = self.lead
+        others = list(self.tokens)
+        others.remove(lead)
+        condition = Q()
+        for token in others:
+            condition &= token_q(token)
+
+        tiers = []
+        previous = Q()
+        for field, secondary in self.TIERS:
+            matches = prefix_q(field, lead)
+            queryset = self.queryset.filter(matches & condition)
+            if previous:
+                queryset = queryset.exclude(previous)
+            tiers.append(queryset.order_by(field, secondary, 'id'))
+            previous |= matches
+        tiers.append(self.queryset.filter(word_q(lead) & condition).exclude(previous).order_by('id'))
+        return tiers
+
+    def tier_count(self, index):
+        """Return the number of results in a tier, caching the answer"""
+        if index not in self._counts:
+            self._counts[index] = self.tiers()[index].count()
+        return self._counts[index]
+
+    def count(self):
+        """Return the total number of results"""
+        return sum(self.tier_count(index) for index in range(len(self.tiers())))
+
+    def exists(self):
+        """Return True if the search matches at least one owner"""
+        return any(tier.exists() for tier in self.tiers())
+
+    def __len__(self):
+        return self.count()
+
+    def __bool__(self):
+        return self.exists()
+
+    def __iter__(self):
+        for tier in self.tiers():
+            yield from tier
+
+    def __getitem__(self, index):
+        """Return one result or a list of results, reading only the needed rows"""
+        if isinstance(index, slice):
+            if index.step is not None or (index.start or 0) < 0 or (
+                    index.stop is not None and index.stop < 0):
+                raise ValueError('OwnerSearch only supports positive slices without step.')
+            return self._slice(index.start or 0, index.stop)
+        results = self._slice(index, index + 1)
+        if not results:
+            raise IndexError('OwnerSearch index out of range')
+        return results[0]
+
+    def _slice(self, start, stop):
+        results = []
+        tiers = self.tiers()
+        for position, tier in enumerate(tiers):
+            wanted = None if stop is None else stop - start - len(results)
+            if wanted is not None and wanted <= 0:
+                break
+            rows = list(tier[start:] if wanted is None else tier[start:start + wanted])
+            results.extend(rows)
+            if position + 1 < len(tiers):
+                if rows or start == 0:
+                    # The slice continues from the top of the next tier
+                    start = 0
+                else:
+                    # The slice starts beyond this tier, skip over it
+                    start = max(0, start - self.tier_count(position))
+        return results
@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from DjangoProject.fragments import bump
+from DjangoProject.pagecache import purge
+from .models import Owner
+
+
+@receiver([post_save, post_delete], sender=Owner, dispatch_uid='owners.owner_changed')
+def owner_changed(sender, instance, **kwargs):
+    """Invalidate the cached fragments and list pages of a changed owner"""
+    bump(Owner, instance.pk)
+    purge('owners')
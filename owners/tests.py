@@ -1,8 +1,18 @@
-from django.test import TestCase, Client
+import datetime
+import json
+from unittest import skipUnless
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from .models import Owner
+from DjangoProject.fragments import fragment_cache, stats
+from DjangoProject.management.commands.explain_views import explain
+from .models import Owner, OwnerNameWord
 from .forms import OwnerForm
-from .views import OwnerListView, OwnerDetailView, OwnerCreateView, OwnerUpdateView
+from .search import normalize, tokenize
+from .views import OwnerListView, OwnerDetailView, OwnerCreateView, OwnerUpdateView, SEARCH_PAGE_SIZE
+from pets.models import Pet, PetType
+from visits.models import Visit
 
 class OwnerViewTests(TestCase):
     """Test cases for the Owner views"""
@@ -109,6 +119,523 @@ class OwnerViewTests(TestCase):
         self.assertContains(response, self.owner1.get_full_name())
         self.assertNotContains(response, self.owner2.get_full_name())
 
+class OwnerDetailQueryTests(TestCase):
+    """Test cases for the number of queries issued by the owner detail view"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.client = Client()
+        self.owner = Owner.objects.create(
+            first_name="John",
+            last_name="Doe",
+            address="123 Main St",
+            city="Anytown",
+            telephone="555-1234"
+        )
+        self.dog = PetType.objects.create(name="Dog")
+        self.cat = PetType.objects.create(name="Cat")
+        self.url = reverse('owners:owner-detail', args=[self.owner.id])
+
+    def add_pet(self, name, pet_type, visits=2):
+        """Create a pet for the owner with the given number of visits"""
+        pet = Pet.objects.create(
+            name=name,
+            birth_date=datetime.date(2018, 1, 1),
+            type=pet_type,
+            owner=self.owner
+        )
+        for day in range(1, visits + 1):
+            Visit.objects.create(
+                date=datetime.date(2023, 1, day),
+                description=f"Checkup {day}",
+                pet=pet
+            )
+        return pet
+
+    def count_queries(self):
+        """Return the number of queries issued to render the detail page"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_without_pets(self):
+        """Test that an owner without pets is rendered with two queries"""
+        self.assertEqual(self.count_queries(), 2)
+
+    def test_query_count_is_constant(self):
+        """Test that adding pets and visits does not add queries"""
+        self.add_pet("Fido", self.dog)
+        baseline = self.count_queries()
+        self.assertEqual(baseline, 3)
+
+        for i in range(10):
+            self.add_pet(f"Pet {i}", self.cat if i % 2 else self.dog, visits=3)
+        self.assertEqual(self.count_queries(), baseline)
+
+    def test_pets_and_visits_are_rendered(self):
+        """Test that the prefetched pets, types and visits are shown"""
+        self.add_pet("Fido", self.dog, visits=1)
+        self.add_pet("Tom", self.cat, visits=0)
+        response = self.client.get(self.url)
+        self.assertContains(response, "Fido (Dog)")
+        self.assertContains(response, "Tom (Cat)")
+        self.assertContains(response, "Checkup 1")
+        self.assertContains(response, "No visits recorded")
+
+    def test_visits_are_prefetched_along_index(self):
+        """Test that the visits of the pets are read from visit_pet_date_idx, newest first, without a sort"""
+        self.add_pet("Fido", self.dog, visits=3)
+        self.add_pet("Rex", self.dog, visits=3)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        visits_sql = next(query['sql'] for query in queries if 'FROM "visits_visit"' in query['sql'])
+        plan = '\n'.join(explain(connection, visits_sql))
+        self.assertIn("visit_pet_date_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+        pet = response.context['pets'][0]
+        self.assertEqual([visit.description for visit in pet.visits.all()],
+                         ["Checkup 3", "Checkup 2", "Checkup 1"])
+
+class OwnerDetailFragmentCacheTests(TestCase):
+    """Test cases for the cached pets fragment of the owner detail page"""
+
+    def setUp(self):
+        """Set up test data"""
+        fragment_cache().clear()
+        self.client = Client()
+        self.dog = PetType.objects.create(name="Dog")
+        self.owner = Owner.objects.create(
+            first_name="John",
+            last_name="Doe",
+            address="123 Main St",
+            city="Anytown",
+            telephone="555-1234"
+        )
+        self.pet = Pet.objects.create(
+            name="Fido",
+            birth_date=datetime.date(2018, 1, 1),
+            type=self.dog,
+            owner=self.owner
+        )
+        self.url = reverse('owners:owner-detail', args=[self.owner.id])
+
+    def test_cache_hit_skips_pet_queries(self):
+        """Test that a cached fragment is served with the owner query only"""
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertContains(response, "Fido (Dog)")
+        self.assertEqual(stats(['owner-pets'])['owner-pets'], {'hits': 1, 'misses': 1})
+
+    def test_new_visit_invalidates_owner(self):
+        """Test that a new visit of one of the owner's pets is shown"""
+        self.client.get(self.url)
+        Visit.objects.create(date=datetime.date(2023, 5, 1), description="Vaccination", pet=self.pet)
+        self.assertContains(self.client.get(self.url), "Vaccination")
+
+    def test_new_visit_keeps_other_owners_cached(self):
+        """Test that a visit only invalidates the fragments of its own owner"""
+        other = Owner.objects.create(
+            first_name="Jane",
+            last_name="Roe",
+            address="1 Side St",
+            city="Anytown",
+            telephone="555-4321"
+        )
+        other_url = reverse('owners:owner-detail', args=[other.id])
+        self.client.get(other_url)
+        Visit.objects.create(date=datetime.date(2023, 5, 1), description="Vaccination", pet=self.pet)
+        with self.assertNumQueries(1):
+            self.client.get(other_url)
+
+    def test_pet_type_change_invalidates(self):
+        """Test that renaming a pet type is shown on cached pages"""
+        self.client.get(self.url)
+        self.dog.name = "Hound"
+        self.dog.save()
+        self.assertContains(self.client.get(self.url), "Fido (Hound)")
+
+    def test_moved_pet_leaves_previous_owner(self):
+        """Test that a pet given to another owner disappears from the first one"""
+        self.client.get(self.url)
+        self.pet.owner = Owner.objects.create(
+            first_name="Jane",
+            last_name="Roe",
+            address="1 Side St",
+            city="Anytown",
+            telephone="555-4321"
+        )
+        self.pet.save()
+        self.assertNotContains(self.client.get(self.url), "Fido")
+
+class OwnerConditionalGetTests(TestCase):
+    """Test cases for conditional GET of the owner detail page"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.owner = Owner.objects.create(
+            first_name="John",
+            last_name="Doe",
+            address="123 Main St",
+            city="Anytown",
+            telephone="555-1234"
+        )
+        self.pet = Pet.objects.create(
+            name="Fido",
+            birth_date=datetime.date(2018, 1, 1),
+            type=PetType.objects.create(name="Dog"),
+            owner=self.owner
+        )
+        self.url = reverse('owners:owner-detail', args=[self.owner.id])
+
+    def test_validators_sent(self):
+        """Test that the page carries an ETag and a Last-Modified date"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+    def test_unchanged_page_not_modified(self):
+        """Test that a matching If-None-Match is answered with a bodiless 304"""
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_if_modified_since(self):
+        """Test that If-Modified-Since at the Last-Modified date is answered with 304"""
+        last_modified = self.client.get(self.url)['Last-Modified']
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_new_visit_modifies_owner(self):
+        """Test that a visit of the owner's pet changes the owner page's ETag"""
+        etag = self.client.get(self.url)['ETag']
+        Visit.objects.create(date=datetime.date(2023, 5, 1), description="Vaccination", pet=self.pet)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Vaccination")
+
+    def test_missing_owner(self):
+        """Test that an unknown owner is still a 404"""
+        response = self.client.get(reverse('owners:owner-detail', args=[self.owner.id + 1]))
+        self.assertEqual(response.status_code, 404)
+
+@override_settings(PAGE_CACHE_ENABLED=False)
+class OwnerListQueryTests(TestCase):
+    """Test cases for the number of queries issued by the owner list pages"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.client = Client()
+        self.pet_type = PetType.objects.create(name="Dog")
+
+    def add_owners(self, count, pets=2):
+        """Create owners with the given number of pets each"""
+        for i in range(count):
+            owner = Owner.objects.create(
+                first_name=f"John{i}",
+                last_name=f"Doe{i:03d}",
+                address="123 Main St",
+                city="Anytown",
+                telephone="555-1234"
+            )
+            for j in range(pets):
+                Pet.objects.create(
+                    name=f"Pet {i}-{j}",
+                    birth_date=datetime.date(2018, 1, 1),
+                    type=self.pet_type,
+                    owner=owner
+                )
+
+    def count_queries(self, url):
+        """Return the number of queries issued to render the given url"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_list_query_count_does_not_grow_with_page_size(self):
+        """Test that a full page costs as many queries as a short one"""
+        url = reverse('owners:owner-list')
+        self.add_owners(2)
+        short_page = self.count_queries(url)
+        self.add_owners(OwnerListView.paginate_by, pets=3)
+        self.assertEqual(self.count_queries(url), short_page)
+
+    def test_search_query_count_does_not_grow_with_results(self):
+        """Test that the search page costs the same for few or many results"""
+        url = f"{reverse('owners:owner-search')}?q=Doe"
+        self.add_owners(2)
+        few_results = self.count_queries(url)
+        self.add_owners(20, pets=3)
+        # Every tier and the pets for a short page; a full page is read
+        # from the first tier (last names) alone and skips the others
+        self.assertEqual(few_results, 4)
+        self.assertEqual(self.count_queries(url), 2)
+
+    def test_list_is_paginated_by_cursor(self):
+        """Test that the list walks every owner through cursor links"""
+        self.add_owners(OwnerListView.paginate_by + 3, pets=0)
+        url = reverse('owners:owner-list')
+        first = self.client.get(url)
+        page = first.context['page_obj']
+        self.assertTrue(first.context['is_paginated'])
+        self.assertContains(first, f'?cursor={page.next_cursor}')
+        self.assertEqual(first.context['paginator'].count, OwnerListView.paginate_by + 3)
+
+        second = self.client.get(url, {'cursor': page.next_cursor})
+        self.assertEqual(len(second.context['owners']), 3)
+        self.assertEqual(second.context['owners'][0].last_name, f"Doe{OwnerListView.paginate_by:03d}")
+        self.assertFalse(second.context['page_obj'].has_next())
+
+    def test_list_rejects_invalid_cursor(self):
+        """Test that a tampered cursor is answered with a 404"""
+        response = self.client.get(reverse('owners:owner-list'), {'cursor': 'abc'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_pet_names_are_rendered(self):
+        """Test that the bulk loaded pet names are shown for each owner"""
+        self.add_owners(2)
+        response = self.client.get(reverse('owners:owner-list'))
+        for name in ["Pet 0-0", "Pet 0-1", "Pet 1-0", "Pet 1-1"]:
+            self.assertContains(response, name)
+
+    def test_pets_are_prefetched_along_index(self):
+        """Test that the pets of a page are read from pet_owner_name_idx in order, without a sort"""
+        self.add_owners(5, pets=3)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('owners:owner-list'))
+        pets_sql = next(query['sql'] for query in queries if 'FROM "pets_pet"' in query['sql'])
+        plan = '\n'.join(explain(connection, pets_sql))
+        self.assertIn("pet_owner_name_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+        owner = response.context['owners'][0]
+        self.assertEqual([pet.name for pet in owner.pets.all()], ["Pet 0-0", "Pet 0-1", "Pet 0-2"])
+
+class OwnerSearchTests(TestCase):
+    """Test cases for the indexed owner search"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.smith = Owner.objects.create(
+            first_name="Jane", last_name="Smith", address="1 Elm St",
+            city="Anytown", telephone="555-0001"
+        )
+        self.smithson = Owner.objects.create(
+            first_name="Adam", last_name="Smithson", address="2 Elm St",
+            city="Anytown", telephone="555-0002"
+        )
+        self.first_named_smith = Owner.objects.create(
+            first_name="Smith", last_name="Brown", address="3 Elm St",
+            city="Anytown", telephone="555-0003"
+        )
+        self.muller = Owner.objects.create(
+            first_name="J\u00fcrgen", last_name="M\u00fcller", address="4 Elm St",
+            city="Othertown", telephone="555-0004"
+        )
+
+    def test_normalize(self):
+        """Test that normalization lowercases, strips accents and spaces"""
+        self.assertEqual(normalize("  M\u00fcller  Van  "), "muller van")
+        self.assertEqual(normalize(None), "")
+        self.assertEqual(tokenize("Jane  SMITH"), ["jane", "smith"])
+
+    def test_search_keys_follow_names(self):
+        """Test that the search keys are kept in sync on save"""
+        self.assertEqual(self.muller.last_name_key, "muller")
+        self.smith.last_name = "Jones"
+        self.smith.save(update_fields=['last_name'])
+        self.smith.refresh_from_db()
+        self.assertEqual(self.smith.last_name_key, "jones")
+
+    def test_prefix_match(self):
+        """Test that a prefix of the first or last name matches"""
+        results = list(Owner.objects.search("smi"))
+        self.assertEqual(len(results), 3)
+        self.assertNotIn(self.muller, results)
+
+    def test_no_substring_match(self):
+        """Test that the middle of a name does not match"""
+        self.assertFalse(Owner.objects.search("mith"))
+
+    def test_later_word_match(self):
+        """Test that a prefix of a later word of a name matches, ranked after name prefixes"""
+        vanderberg = Owner.objects.create(first_name="Anna Smit", last_name="van der Berg",
+                                          address="5 Elm St", city="Anytown", telephone="555-0005")
+        self.assertEqual(list(Owner.objects.search("berg")), [vanderberg])
+        self.assertEqual(list(Owner.objects.search("smi")),
+                         [self.smith, self.smithson, self.first_named_smith, vanderberg])
+        self.assertEqual(list(Owner.objects.search("der anna")), [vanderberg])
+
+    def test_name_words_follow_names(self):
+        """Test that the later words are kept in sync on save and delete"""
+        owner = Owner.objects.create(first_name="Anna", last_name="van der Berg",
+                                     address="5 Elm St", city="Anytown", telephone="555-0005")
+        self.assertEqual(sorted(owner.name_words.values_list('word', flat=True)), ["berg", "der"])
+        owner.last_name = "de Vries"
+        owner.save()
+        self.assertEqual(list(owner.name_words.values_list('word', flat=True)), ["vries"])
+        with self.assertNumQueries(1):
+            owner.save()
+        owner.delete()
+        self.assertFalse(OwnerNameWord.objects.exists())
+
+    def test_accent_insensitive_match(self):
+        """Test that accents are ignored on both sides"""
+        self.assertEqual(list(Owner.objects.search("muller")), [self.muller])
+        self.assertEqual(list(Owner.objects.search("M\u00dcL")), [self.muller])
+
+    def test_every_token_must_match(self):
+        """Test that multi word queries match across first and last name"""
+        self.assertEqual(list(Owner.objects.search("ja smi")), [self.smith])
+        self.assertEqual(list(Owner.objects.search("smith jurg")), [])
+
+    def test_ranking(self):
+        """Test that last name matches rank above first name matches"""
+        results = list(Owner.objects.search("smith"))
+        self.assertEqual(results, [self.smith, self.smithson, self.first_named_smith])
+
+    def test_count_and_slicing(self):
+        """Test that counting and slicing span the ranking tiers"""
+        results = Owner.objects.search("smi")
+        self.assertEqual(results.count(), 3)
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[1:3], [self.smithson, self.first_named_smith])
+        self.assertEqual(results[2:], [self.first_named_smith])
+        self.assertEqual(results[2], self.first_named_smith)
+        self.assertEqual(results[5:10], [])
+        with self.assertRaises(IndexError):
+            results[3]
+
+    def test_empty_query(self):
+        """Test that an empty query matches nothing"""
+        results = Owner.objects.search("   ")
+        self.assertFalse(results)
+        self.assertEqual(results.count(), 0)
+
+    @skipUnless(connection.vendor == 'sqlite', "Checks the SQLite query plan")
+    def test_search_uses_indexes(self):
+        """Test that every tier is read in index order without sorting"""
+        last_name_tier, first_name_tier, word_tier = Owner.objects.search("smi").tiers()
+        plan = last_name_tier[:10].explain()
+        self.assertIn("owner_last_name_key_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+        plan = first_name_tier[:10].explain()
+        self.assertIn("owner_first_name_key_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+        plan = word_tier[:10].explain()
+        self.assertIn("owner_name_word_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+class OwnerSearchPaginationTests(TestCase):
+    """Test cases for the cursor pagination and exports of the search view"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.url = reverse('owners:owner-search')
+        self.pet_type = PetType.objects.create(name="Dog")
+        for i in range(SEARCH_PAGE_SIZE + 5):
+            owner = Owner.objects.create(
+                first_name=f"John{i:02d}", last_name="Doe", address="123 Main St",
+                city="Anytown", telephone="555-1234"
+            )
+            Pet.objects.create(
+                name=f"Rex{i:02d}", birth_date=datetime.date(2018, 1, 1),
+                type=self.pet_type, owner=owner
+            )
+
+    def test_empty_query_is_paginated(self):
+        """Test that an empty search returns one page instead of every owner"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['owners']), SEARCH_PAGE_SIZE)
+        self.assertTrue(response.context['page_obj'].has_next())
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_next_and_previous_pages(self):
+        """Test walking forward and back with cursors"""
+        first = self.client.get(self.url, {'q': 'doe'}).context['page_obj']
+        second = self.client.get(
+            self.url, {'q': 'doe', 'cursor': first.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(len(second), 5)
+        self.assertFalse(second.has_next())
+        self.assertTrue(second.has_previous())
+        self.assertEqual(second[0].first_name, f"John{SEARCH_PAGE_SIZE:02d}")
+
+        back = self.client.get(
+            self.url, {'q': 'doe', 'cursor': second.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_invalid_cursor(self):
+        """Test that a tampered cursor is answered with a 404"""
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_json_export(self):
+        """Test that the JSON export streams every matching owner"""
+        response = self.client.get(self.url, {'q': 'doe', 'export': 'json'})
+        self.assertTrue(response.streaming)
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(data), SEARCH_PAGE_SIZE + 5)
+        self.assertEqual(data[0]['first_name'], "John00")
+        self.assertEqual(data[0]['pets'], ["Rex00"])
+
+    def test_html_export(self):
+        """Test that the HTML export streams an escaped table"""
+        Owner.objects.create(
+            first_name="<b>Bold</b>", last_name="Doe", address="1 St",
+            city="Anytown", telephone="555"
+        )
+        response = self.client.get(self.url, {'export': 'html'})
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(content.count('<tr><td>'), SEARCH_PAGE_SIZE + 6)
+        self.assertIn('&lt;b&gt;Bold&lt;/b&gt;', content)
+
+class OwnerLookupTests(TestCase):
+    """Test cases for the owner lookup endpoint"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.url = reverse('owners:owner-lookup')
+        for i in range(25):
+            Owner.objects.create(
+                first_name=f"John{i:02d}", last_name="Doe", address="123 Main St",
+                city="Anytown", telephone="555-1234"
+            )
+        self.smith = Owner.objects.create(
+            first_name="Jane", last_name="Smith", address="456 Oak Ave",
+            city="Othertown", telephone="555-5678"
+        )
+
+    def test_prefix_lookup(self):
+        """Test that the lookup returns owners matching the prefix"""
+        response = self.client.get(self.url, {'q': 'smi'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'results': [{'id': self.smith.id, 'text': "Jane Smith"}],
+            'next': None,
+        })
+
+    def test_lookup_is_paginated(self):
+        """Test that results are returned page by page with a cursor"""
+        first = self.client.get(self.url, {'q': 'doe'}).json()
+        self.assertEqual(len(first['results']), 20)
+        second = self.client.get(self.url, {'q': 'doe', 'cursor': first['next']}).json()
+        self.assertEqual(len(second['results']), 5)
+        self.assertIsNone(second['next'])
+
+    def test_invalid_cursor(self):
+        """Test that a tampered cursor is rejected"""
+        response = self.client.get(self.url, {'cursor': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
 class OwnerFormTests(TestCase):
     """Test cases for the OwnerForm"""
 
@@ -193,3 +720,11 @@ class OwnerModelTests(TestCase):
         url = self.owner.get_absolute_url()
         expected_url = reverse('owners:owner-detail', args=[str(self.owner.id)])
         self.assertEqual(url, expected_url)
+
+    def test_save_of_deleted_owner_fails(self):
+        """Test that saving an owner deleted since it was loaded raises instead of inserting it again"""
+        Owner.objects.filter(pk=self.owner.pk).delete()
+        self.owner.city = "Madison"
+        with self.assertRaisesMessage(DatabaseError, 'did not affect any rows'), transaction.atomic():
+            self.owner.save()
+        self.assertFalse(Owner.objects.exists())
@@ -1,12 +1,22 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = 'owners'
 
+# The read views have async counterparts for ASGI, see settings.ASYNC_VIEWS
+if settings.ASYNC_VIEWS:
+    owner_list, search_owners, owner_detail = (
+        views.owner_list_async, views.search_owners_async, views.owner_detail_async)
+else:
+    owner_list, search_owners, owner_detail = (
+        views.OwnerListView.as_view(), views.search_owners, views.OwnerDetailView.as_view())
+
 urlpatterns = [
-    path('', views.OwnerListView.as_view(), name='owner-list'),
-    path('search/', views.search_owners, name='owner-search'),
+    path('', owner_list, name='owner-list'),
+    path('search/', search_owners, name='owner-search'),
+    path('lookup/', views.owner_lookup, name='owner-lookup'),
     path('new/', views.OwnerCreateView.as_view(), name='owner-create'),
-    path('<int:pk>/', views.OwnerDetailView.as_view(), name='owner-detail'),
+    path('<int:pk>/', owner_detail, name='owner-detail'),
     path('<int:pk>/edit/', views.OwnerUpdateView.as_view(), name='owner-update'),
 ]
\ No newline at end of file
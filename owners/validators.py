@@ -0,0 +1,7 @@
+from django.core.exceptions import ValidationError
+
+
+def validate_telephone(telephone):
+    """Validate that a telephone number contains only digits, spaces, dashes, and parentheses"""
+    if telephone and not all(char.isdigit() or char in ' -()' for char in telephone):
+        raise ValidationError('Telephone number should contain only digits, spaces, dashes, and parentheses.')
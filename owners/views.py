@@ -1,36 +1,107 @@
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import ListView, DetailView, CreateView, UpdateView
 from django.urls import reverse_lazy
-from django.db.models import Q
+from django.db.models import Prefetch
 
+from DjangoProject.conditional import ConditionalDetailMixin, aconditional_detail
+from DjangoProject.pagecache import page_cache
+from DjangoProject.views import arender, lookup_response
+from DjangoProject.pagination import InvalidCursor, KeysetPaginationMixin, KeysetPaginator
 from .models import Owner
 from .forms import OwnerForm
+from .export import astream_html, astream_json, stream_html, stream_json
+from pets.models import Pet
+from visits.models import Visit
 
-class OwnerListView(ListView):
+def with_pet_names(queryset):
+    """
+    Prefetch the pets of every owner in the queryset in a single query,
+    loading only the columns the owner tables display. Ordered along
+    pet_owner_name_idx, each owner's pets still come by name without a sort
+    """
+    return queryset.prefetch_related(
+        Prefetch('pets', queryset=Pet.objects.only('id', 'name', 'owner_id').order_by('owner_id', 'name'))
+    )
+
+# Only the first page is cached, searches and deeper pages are too varied
+@page_cache('owners', query_params=())
+class OwnerListView(KeysetPaginationMixin, ListView):
     """View for listing all owners"""
     model = Owner
     template_name = 'owners/owner_list.html'
     context_object_name = 'owners'
     paginate_by = 10
+    count_mode = 'estimated'
 
     def get_queryset(self):
         """
         Override get_queryset to implement search functionality
         """
-        queryset = Owner.objects.all()
+        queryset = with_pet_names(Owner.objects.all())
         query = self.request.GET.get('q')
         if query:
-            queryset = queryset.filter(
-                Q(last_name__icontains=query) |
-                Q(first_name__icontains=query)
-            )
+            queryset = queryset.search(query)
         return queryset
 
-class OwnerDetailView(DetailView):
+@page_cache('owners', query_params=())
+async def owner_list_async(request):
+    """Async counterpart of OwnerListView"""
+    queryset = with_pet_names(Owner.objects.all())
+    query = request.GET.get('q')
+    if query:
+        queryset = queryset.search(query)
+    paginator = KeysetPaginator(queryset, OwnerListView.paginate_by, count_mode=OwnerListView.count_mode)
+    try:
+        page = await paginator.apage(request.GET.get('cursor'))
+    except InvalidCursor:
+        raise Http404('Invalid cursor')
+    await paginator.acount()
+    return await arender(request, OwnerListView.template_name, {
+        'owners': page.object_list,
+        'object_list': page.object_list,
+        'paginator': paginator,
+        'page_obj': page,
+        'is_paginated': page.has_other_pages(),
+    })
+
+def pets_of(owner):
+    """
+    Return the pets of an owner with their types, ages and visits loaded in
+    bulk. The visits are ordered along visit_pet_date_idx: each pet's still
+    come newest first, without sorting those of every pet together
+    """
+    visits = Visit.objects.order_by('pet_id', '-date')
+    return owner.pets.select_related('type').with_age().prefetch_related(Prefetch('visits', queryset=visits))
+
+class OwnerDetailView(ConditionalDetailMixin, DetailView):
     """View for displaying owner details"""
     model = Owner
     template_name = 'owners/owner_detail.html'
     context_object_name = 'owner'
+    # updated_at rolls up the owner's pets and visits; the pets show ages
+    changes_daily = True
+
+    def get_context_data(self, **kwargs):
+        """
+        Add the owner's pets with their types, ages and visits loaded in
+        bulk, so the page costs the same number of queries however many
+        pets the owner has
+        """
+        context = super().get_context_data(**kwargs)
+        context['pets'] = pets_of(self.object)
+        return context
+
+async def owner_detail_async(request, pk):
+    """Async counterpart of OwnerDetailView"""
+    async def render_page(owner):
+        # Loaded up front, the fragment cache cannot defer the query here
+        pets = [pet async for pet in pets_of(owner)]
+        return await arender(request, OwnerDetailView.template_name, {
+            'owner': owner, 'object': owner, 'pets': pets,
+        })
+
+    return await aconditional_detail(request, OwnerDetailView, Owner.objects.all(), pk, render_page)
 
 class OwnerCreateView(CreateView):
     """View for creating a new owner"""
@@ -49,18 +120,63 @@ class OwnerUpdateView(UpdateView):
         """Return to the owner's detail page after successful update"""
         return reverse_lazy('owners:owner-detail', kwargs={'pk': self.object.pk})
 
+SEARCH_PAGE_SIZE = 20
+
 def search_owners(request):
-    """View for searching owners"""
+    """
+    View for searching owners, paginated by cursor over the owner
+    ordering. ?export=json or ?export=html streams every match instead.
+    """
     query = request.GET.get('q', '')
+    owners = with_pet_names(Owner.objects.all())
     if query:
-        owners = Owner.objects.filter(
-            Q(last_name__icontains=query) |
-            Q(first_name__icontains=query)
-        )
-    else:
-        owners = Owner.objects.all()
+        owners = owners.search(query)
+
+    export = request.GET.get('export')
+    if export == 'json':
+        return StreamingHttpResponse(stream_json(owners), content_type='application/json')
+    if export == 'html':
+        return StreamingHttpResponse(stream_html(owners), content_type='text/html; charset=utf-8')
+
+    try:
+        page = KeysetPaginator(owners, SEARCH_PAGE_SIZE).page(request.GET.get('cursor'))
+    except InvalidCursor:
+        raise Http404('Invalid cursor')
 
     return render(request, 'owners/owner_search.html', {
-        'owners': owners,
+        'owners': page.object_list,
+        'page_obj': page,
+        'query': query
+    })
+
+async def search_owners_async(request):
+    """Async counterpart of search_owners"""
+    query = request.GET.get('q', '')
+    owners = with_pet_names(Owner.objects.all())
+    if query:
+        owners = owners.search(query)
+
+    export = request.GET.get('export')
+    if export == 'json':
+        return StreamingHttpResponse(astream_json(owners), content_type='application/json')
+    if export == 'html':
+        return StreamingHttpResponse(astream_html(owners), content_type='text/html; charset=utf-8')
+
+    try:
+        page = await KeysetPaginator(owners, SEARCH_PAGE_SIZE).apage(request.GET.get('cursor'))
+    except InvalidCursor:
+        raise Http404('Invalid cursor')
+
+    return await arender(request, 'owners/owner_search.html', {
+        'owners': page.object_list,
+        'page_obj': page,
         'query': query
     })
+
+def owner_lookup(request):
+    """JSON lookup of owners by name prefix for the owner select widget"""
+    query = request.GET.get('q', '')
+    owners = Owner.objects.only('id', 'first_name', 'last_name')
+    if query:
+        owners = owners.search(query)
+    return lookup_response(request, owners, Owner.get_full_name)
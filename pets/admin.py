@@ -1,3 +1,19 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Pet, PetType
+
+
+@admin.register(PetType)
+class PetTypeAdmin(admin.ModelAdmin):
+    list_display = ['name']
+    search_fields = ['name']
+
+
+@admin.register(Pet)
+class PetAdmin(admin.ModelAdmin):
+    list_display = ['name', 'type', 'owner', 'visit_count', 'last_visit_date']
+    list_filter = ['type', 'last_visit_date']
+    list_select_related = ['type', 'owner']
+    search_fields = ['name']
+    raw_id_fields = ['owner']
+    readonly_fields = ['visit_count', 'last_visit_date']
@@ -0,0 +1,29 @@
+from DjangoProject.api import Relation, Resource
+from visits.api import archived_visits, visits
+from .models import Pet
+
+
+class PetResource(Resource):
+    """
+    The pets. include=visits brings their recent visits only, the older
+    ones moved by archive_visits come with include=archived_visits.
+    """
+    model = Pet
+    fields = {
+        'id': 'pk',
+        'name': 'name',
+        'birth_date': 'birth_date',
+        'type': 'type__name',
+        'owner': 'owner_id',
+        'visit_count': 'visit_count',
+        'last_visit_date': 'last_visit_date',
+        'updated_at': 'updated_at',
+    }
+    relations = {
+        'visits': Relation(visits, 'pet'),
+        'archived_visits': Relation(archived_visits, 'pet'),
+    }
+    filters = {'owner': 'owner', 'type': 'type'}
+
+
+pets = PetResource()
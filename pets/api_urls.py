@@ -0,0 +1,11 @@
+from django.urls import path
+
+from DjangoProject.api import ResourceView
+from .api import pets
+
+app_name = 'pets-api'
+
+urlpatterns = [
+    path('', ResourceView.as_view(resource=pets), name='pet-list'),
+    path('<int:pk>/', ResourceView.as_view(resource=pets), name='pet-detail'),
+]
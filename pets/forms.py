@@ -1,8 +1,11 @@
 from django import forms
-from django.core.exceptions import ValidationError
-from datetime import date
+from django.urls import reverse_lazy
 
-from .models import Pet, PetType
+from DjangoProject.refdata import ReferenceChoiceField
+from DjangoProject.widgets import LookupSelect
+
+from .models import Pet
+from .validators import validate_birth_date
 from owners.models import Owner
 
 class PetForm(forms.ModelForm):
@@ -11,11 +14,13 @@ class PetForm(forms.ModelForm):
     class Meta:
         model = Pet
         fields = ['name', 'birth_date', 'type', 'owner']
+        # Pet types are rendered and validated from the in-process cache
+        field_classes = {'type': ReferenceChoiceField}
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control'}),
             'birth_date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
             'type': forms.Select(attrs={'class': 'form-control'}),
-            'owner': forms.Select(attrs={'class': 'form-control'}),
+            'owner': LookupSelect(reverse_lazy('owners:owner-lookup'), attrs={'class': 'form-control'}),
         }
     
     def __init__(self, *args, **kwargs):
@@ -26,13 +31,9 @@ class PetForm(forms.ModelForm):
         if owner_id:
             self.fields['owner'].initial = owner_id
             self.fields['owner'].widget = forms.HiddenInput()
-            
-        # Sort pet types by name
-        self.fields['type'].queryset = PetType.objects.all().order_by('name')
     
     def clean_birth_date(self):
         """Validate that birth date is not in the future"""
         birth_date = self.cleaned_data.get('birth_date')
-        if birth_date and birth_date > date.today():
-            raise ValidationError('Birth date cannot be in the future')
+        validate_birth_date(birth_date)
         return birth_date
\ No newline at end of file
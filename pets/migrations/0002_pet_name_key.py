@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:52
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def normalize(text):
+    """Frozen copy of owners.search.normalize as of this migration."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.casefold().split())
+
+
+def populate_name_keys(apps, schema_editor):
+    """Fill the lookup keys of the pets created before they existed."""
+    Pet = apps.get_model('pets', 'Pet')
+    manager = Pet.objects.db_manager(schema_editor.connection.alias)
+    batch = []
+    for pet in manager.only('name').iterator(chunk_size=2000):
+        pet.name_key = normalize(pet.name)
+        batch.append(pet)
+        if len(batch) == 2000:
+            manager.bulk_update(batch, ['name_key'])
+            batch = []
+    manager.bulk_update(batch, ['name_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('owners', '0003_name_index'),
+        ('pets', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pet',
+            name='name_key',
+            field=models.CharField(default='', editable=False, max_length=60),
+        ),
+        migrations.RunPython(populate_name_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='pet',
+            index=models.Index(fields=['name_key'], name='pet_name_key_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('owners', '0003_name_index'),
+        ('pets', '0002_pet_name_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pet',
+            name='owner',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='pets', to='owners.owner'),
+        ),
+        migrations.AddIndex(
+            model_name='pet',
+            index=models.Index(fields=['owner', 'name'], name='pet_owner_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pet',
+            index=models.Index(fields=['name'], name='pet_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pettype',
+            index=models.Index(fields=['name'], name='pettype_name_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:07
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_visit_counters(apps, schema_editor):
+    """Count the visits of every pet and find the latest one."""
+    Pet = apps.get_model('pets', 'Pet')
+    Visit = apps.get_model('visits', 'Visit')
+    alias = schema_editor.connection.alias
+    visits = Visit.objects.using(alias).filter(pet=OuterRef('pk')).order_by()
+    Pet.objects.using(alias).update(
+        visit_count=Coalesce(
+            Subquery(visits.values('pet').annotate(count=Count('pk')).values('count'),
+                     output_field=IntegerField()),
+            Value(0),
+        ),
+        last_visit_date=Subquery(visits.order_by('-date').values('date')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('owners', '0005_counters'),
+        ('pets', '0004_updated_at'),
+        ('visits', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pet',
+            name='last_visit_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='pet',
+            name='visit_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_visit_counters, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='pet',
+            index=models.Index(fields=['last_visit_date'], name='pet_last_visit_date_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:38
+
+from django.db import migrations, models
+from django.db.models.functions import ExtractDay, ExtractMonth
+
+
+def populate_birth_month_day(apps, schema_editor):
+    """Derive the birthday key of every pet from its birth date."""
+    Pet = apps.get_model('pets', 'Pet')
+    Pet.objects.using(schema_editor.connection.alias).update(
+        birth_month_day=ExtractMonth('birth_date') * 100 + ExtractDay('birth_date'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('owners', '0005_counters'),
+        ('pets', '0005_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pet',
+            name='birth_month_day',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_birth_month_day, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='pet',
+            index=models.Index(fields=['birth_month_day'], name='pet_birth_month_day_idx'),
+        ),
+    ]
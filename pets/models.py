@@ -1,7 +1,13 @@
 from django.db import models
+from django.db.models import Case, Value, When
+from django.db.models.functions import ExtractYear
 from django.urls import reverse
+from django.utils import timezone
+import calendar
 import datetime
 from owners.models import Owner
+from owners.search import normalize
+from DjangoProject.refdata import ReferenceCache
 
 class PetType(models.Model):
     """Model representing a type of pet (e.g. dog, cat, bird)"""
@@ -9,20 +15,107 @@ class PetType(models.Model):
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name'], name='pettype_name_idx'),
+        ]
 
     def __str__(self):
         """String for representing the Model object."""
         return self.name
 
+# Every pet type, cached in process for forms and Pet.__str__
+pet_types = ReferenceCache(PetType)
+
+def month_day(date):
+    """Return the month and day of a date as the number MMDD, e.g. 907 for September 7"""
+    return date.month * 100 + date.day
+
+def month_day_through(date):
+    """
+    Return month_day(date), except for February 28 of a common year:
+    229, so that pets born on February 29 have their birthday that day
+    """
+    if date.month == 2 and date.day == 28 and not calendar.isleap(date.year):
+        return 229
+    return month_day(date)
+
+class PetQuerySet(models.QuerySet):
+    """QuerySet for Pet with ages and birthdays computed by the database"""
+
+    def with_age(self, today=None):
+        """Annotate the age of each pet in whole years on today"""
+        today = today or timezone.localdate()
+        return self.annotate(age=(
+            Value(today.year) - ExtractYear('birth_date')
+            - Case(When(birth_month_day__gt=month_day_through(today), then=Value(1)), default=Value(0))
+        ))
+
+    def birthdays_between(self, start, end):
+        """
+        Return the pets whose birthday falls between two dates of the same
+        year, inclusive. In a common year, February 29 birthdays fall on the 28th
+        """
+        return self.filter(birth_month_day__range=(month_day(start), month_day_through(end)))
+
 class Pet(models.Model):
     """Model representing a pet"""
     name = models.CharField(max_length=30)
     birth_date = models.DateField()
     type = models.ForeignKey(PetType, on_delete=models.PROTECT)
-    owner = models.ForeignKey(Owner, on_delete=models.CASCADE, related_name='pets')
+    # Indexed by pet_owner_name_idx, whose leading column serves owner lookups
+    owner = models.ForeignKey(Owner, on_delete=models.CASCADE, related_name='pets', db_index=False)
+
+    # Normalized copy of the name, maintained by save() for indexed lookups
+    name_key = models.CharField(max_length=60, default='', editable=False)
+    # Month and day of birth_date as MMDD, maintained by save() for indexed birthday lookups
+    birth_month_day = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    # Also touched when a visit of the pet changes, see visits/signals.py
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Maintained by visits/signals.py, rebuilt by the rebuild_counters command
+    visit_count = models.PositiveIntegerField(default=0, editable=False)
+    last_visit_date = models.DateField(null=True, blank=True, editable=False)
+
+    objects = PetQuerySet.as_manager()
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['owner', 'name'], name='pet_owner_name_idx'),
+            models.Index(fields=['name'], name='pet_name_idx'),
+            models.Index(fields=['name_key'], name='pet_name_key_idx'),
+            models.Index(fields=['last_visit_date'], name='pet_last_visit_date_idx'),
+            models.Index(fields=['birth_month_day'], name='pet_birth_month_day_idx'),
+        ]
+
+    # Written by the signal receivers in UPDATE queries, never from a loaded instance
+    counter_fields = {'visit_count', 'last_visit_date'}
+
+    def save(self, *args, **kwargs):
+        """
+        Keep the lookup keys in sync with the name and birth date on every save.
+
+        A loaded pet is saved as if update_fields listed every column but
+        the counters, which only the signal receivers write. Like any save
+        with update_fields, saving a pet deleted since it was loaded raises
+        DatabaseError instead of inserting it again.
+        """
+        self.update_search_keys()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'name_key', 'birth_month_day', 'updated_at'}
+        elif not self._state.adding and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = {
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            }
+        super().save(*args, **kwargs)
+
+    def update_search_keys(self):
+        """Recompute the lookup keys from the name and birth date (use before bulk_create)."""
+        self.name_key = normalize(self.name)
+        self.birth_month_day = month_day(self.birth_date) if self.birth_date else 0
 
     def get_absolute_url(self):
         """Returns the url to access a particular pet instance."""
@@ -35,4 +128,7 @@ class Pet(models.Model):
 
     def __str__(self):
         """String for representing the Model object."""
-        return f"{self.name} ({self.type})"
+        pet_type = None
+        if not Pet.type.is_cached(self):
+            pet_type = pet_types.get(self.type_id)
+        return f"{self.name} ({pet_type or self.type})"
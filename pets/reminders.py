@@ -0,0 +1,73 @@
+"""
+Due-lists of pets: upcoming birthdays and annual checkups.
+
+Both are answered with index range scans instead of loading every pet.
+Birthdays are matched on Pet.birth_month_day (pet_birth_month_day_idx):
+a window crossing the new year is read as two ranges, the rest of this
+year then the start of the next. In a common year, February 29
+birthdays fall on February 28, when PetQuerySet.with_age() adds the
+year. Checkups are matched on Pet.last_visit_date
+(pet_last_visit_date_idx): the pets whose last visit is older than the
+interval, longest overdue first, then the pets never seen at all.
+
+Like OwnerSearch, each list has a tiers() method returning the ranges as
+querysets ordered along their index, so KeysetPaginator pages through
+them without sorting the matches.
+"""
+import datetime
+
+from django.db.models import Value
+from django.db.models.functions import ExtractYear
+
+# The longest birthday window, short of a birthday counting twice
+MAX_BIRTHDAY_DAYS = 364
+
+
+class UpcomingBirthdays:
+    """The pets whose birthday falls within days after today, annotated with the age they turn"""
+
+    def __init__(self, queryset, today, days):
+        if not 0 <= days <= MAX_BIRTHDAY_DAYS:
+            raise ValueError(f'days must be between 0 and {MAX_BIRTHDAY_DAYS}, got {days}.')
+        self.queryset = queryset
+        self.today = today
+        self.days = days
+
+    def tiers(self):
+        """Return the birthdays left this year, then those of next year, ordered by date"""
+        end = self.today + datetime.timedelta(days=self.days)
+        if end.year == self.today.year:
+            ranges = [(self.today, end)]
+        else:
+            ranges = [(self.today, datetime.date(self.today.year, 12, 31)),
+                      (datetime.date(end.year, 1, 1), end)]
+        return [
+            self.queryset.birthdays_between(start, stop)
+            .annotate(turning=Value(start.year) - ExtractYear('birth_date'))
+            .order_by('birth_month_day', 'pk')
+            for start, stop in ranges
+        ]
+
+    def __iter__(self):
+        for tier in self.tiers():
+            yield from tier.iterator()
+
+
+class CheckupsDue:
+    """The pets without a visit in the last interval days, then those never seen"""
+
+    def __init__(self, queryset, today, interval):
+        self.queryset = queryset
+        self.today = today
+        self.interval = interval
+
+    def tiers(self):
+        cutoff = self.today - datetime.timedelta(days=self.interval)
+        return [
+            self.queryset.filter(last_visit_date__lte=cutoff).order_by('last_visit_date', 'pk'),
+            self.queryset.filter(last_visit_date__isnull=True).order_by('pk'),
+        ]
+
+    def __iter__(self):
+        for tier in self.tiers():
+            yield from tier.iterator()
@@ -0,0 +1,58 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from DjangoProject.conditional import touch
+from DjangoProject.fragments import bump
+from DjangoProject.pagecache import purge
+from owners.models import Owner
+from .models import Pet, PetType
+
+
+@receiver(pre_save, sender=Pet, dispatch_uid='pets.remember_previous_owner')
+def remember_previous_owner(sender, instance, raw=False, **kwargs):
+    """Remember the owner a pet had before being saved, in case it changes"""
+    instance._previous_owner_id = None
+    if instance.pk is not None and not raw:
+        instance._previous_owner_id = (
+            Pet.objects.filter(pk=instance.pk).values_list('owner_id', flat=True).first()
+        )
+
+
+@receiver([post_save, post_delete], sender=Pet, dispatch_uid='pets.pet_changed')
+def pet_changed(sender, instance, created=False, raw=False, **kwargs):
+    """Update the pet counts of the owners of a changed pet and invalidate their pages"""
+    bump(Pet, instance.pk)
+    previous_owner_id = getattr(instance, '_previous_owner_id', None)
+    owner_ids = {instance.owner_id, previous_owner_id} - {None}
+    for owner_id in owner_ids:
+        bump(Owner, owner_id)
+
+    if raw:
+        # Loaded fixtures carry their counters, rebuild_counters fixes them otherwise
+        deltas = {}
+    elif kwargs['signal'] is post_delete:
+        deltas = {instance.owner_id: -1}
+    elif created:
+        deltas = {instance.owner_id: 1}
+    elif previous_owner_id not in (None, instance.owner_id):
+        deltas = {previous_owner_id: -1, instance.owner_id: 1}
+    else:
+        deltas = {}
+    now = timezone.now()
+    for owner_id, delta in deltas.items():
+        Owner.objects.filter(pk=owner_id).update(pet_count=F('pet_count') + delta, updated_at=now)
+    touch(Owner.objects.filter(pk__in=owner_ids - deltas.keys()))
+    # The owner list shows pet names
+    purge('owners')
+
+
+@receiver([post_save, post_delete], sender=PetType, dispatch_uid='pets.pet_type_changed')
+def pet_type_changed(sender, instance, **kwargs):
+    """Invalidate every fragment showing pet types and touch the pets of the type"""
+    bump(PetType, instance.pk)
+    bump(PetType)
+    if not kwargs.get('created'):
+        touch(Owner.objects.filter(pk__in=Pet.objects.filter(type=instance).values('owner_id')))
+        touch(Pet.objects.filter(type=instance))
@@ -1,10 +1,17 @@
+from unittest import skipUnless
+from django.db import DatabaseError, connection, transaction
 from django.test import TestCase
 from django.urls import reverse
+from django.utils import timezone
 import datetime
 from django.forms import HiddenInput
 from .models import Pet, PetType
+from .reminders import CheckupsDue, UpcomingBirthdays
 from .forms import PetForm
 from owners.models import Owner
+from visits.models import Visit
+from DjangoProject.conditional import start_of_today
+from DjangoProject.fragments import fragment_cache
 
 class PetFormTests(TestCase):
     """Test cases for the PetForm"""
@@ -37,6 +44,28 @@ class PetFormTests(TestCase):
         self.assertFalse(form.is_valid())
         self.assertEqual(len(form.errors), 4)  # All 4 fields are required
 
+    def test_pet_types_from_cache(self):
+        """Test that pet type choices are rendered without queries"""
+        str(PetForm()['type'])  # Load the cached pet types
+        with self.assertNumQueries(0):
+            rendered = str(PetForm()['type'])
+        self.assertIn('>Dog</option>', rendered)
+        form = PetForm(data={'type': self.pet_type.id})
+        form.is_valid()
+        self.assertEqual(form.cleaned_data['type'], self.pet_type)
+
+    def test_unknown_pet_type(self):
+        """Test that an unknown pet type is rejected"""
+        form = PetForm(data={'type': self.pet_type.id + 1})
+        self.assertFalse(form.is_valid())
+        self.assertIn('type', form.errors)
+
+    def test_new_pet_type_is_offered(self):
+        """Test that a new pet type shows up after the cache was loaded"""
+        str(PetForm()['type'])
+        PetType.objects.create(name="Cat")
+        self.assertIn('>Cat</option>', str(PetForm()['type']))
+
     def test_future_birth_date(self):
         """Test validation for future birth date"""
         # Get a future date
@@ -52,6 +81,30 @@ class PetFormTests(TestCase):
         self.assertFalse(form.is_valid())
         self.assertIn('birth_date', form.errors)
 
+    def test_owner_select_renders_only_selected_owner(self):
+        """Test that the owner select does not list every owner"""
+        for i in range(5):
+            Owner.objects.create(
+                first_name=f"Other{i}", last_name="Owner", address="1 St",
+                city="Anytown", telephone="555"
+            )
+        html = str(PetForm(initial={'owner': self.owner.id})['owner'])
+        self.assertIn('data-lookup-url="/owners/lookup/"', html)
+        self.assertIn('John Doe', html)
+        self.assertNotIn('Other0', html)
+        self.assertEqual(html.count('<option'), 2)  # Empty label and selected owner
+
+    def test_owner_validation_checks_single_pk(self):
+        """Test that validating the owner only fetches the chosen owner"""
+        form = PetForm(data={
+            'name': 'Fido',
+            'birth_date': '2018-01-01',
+            'type': self.pet_type.id,
+            'owner': 99999
+        })
+        self.assertFalse(form.is_valid())
+        self.assertIn('owner', form.errors)
+
     def test_owner_id_parameter(self):
         """Test that owner_id parameter works correctly"""
         # Create form with owner_id parameter
@@ -114,8 +167,310 @@ class PetModelTests(TestCase):
         """Test the string representation of a pet"""
         self.assertEqual(str(self.pet), "Fido (Dog)")
 
+    def test_string_representation_uses_cached_type(self):
+        """Test that the pet type of the string representation is not queried"""
+        pet = Pet.objects.get(pk=self.pet.pk)
+        str(Pet.objects.get(pk=self.pet.pk))  # Load the cached pet types
+        with self.assertNumQueries(0):
+            self.assertEqual(str(pet), "Fido (Dog)")
+
     def test_get_absolute_url(self):
         """Test the get_absolute_url method"""
         url = self.pet.get_absolute_url()
         expected_url = reverse('pets:pet-detail', args=[str(self.pet.id)])
         self.assertEqual(url, expected_url)
+
+    def test_save_of_deleted_pet_fails(self):
+        """Test that saving a pet deleted since it was loaded raises instead of inserting it again"""
+        Pet.objects.filter(pk=self.pet.pk).delete()
+        self.pet.name = "Rex"
+        with self.assertRaisesMessage(DatabaseError, 'did not affect any rows'), transaction.atomic():
+            self.pet.save()
+        self.assertFalse(Pet.objects.exists())
+
+class PetLookupTests(TestCase):
+    """Test cases for the pet lookup endpoint"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.owner = Owner.objects.create(
+            first_name="John",
+            last_name="Doe",
+            address="123 Main St",
+            city="Anytown",
+            telephone="555-1234"
+        )
+        self.pet_type = PetType.objects.create(name="Dog")
+        self.fido = Pet.objects.create(
+            name="Fido", birth_date=datetime.date(2018, 1, 1),
+            type=self.pet_type, owner=self.owner
+        )
+        self.felix = Pet.objects.create(
+            name="F\u00e9lix", birth_date=datetime.date(2019, 1, 1),
+            type=self.pet_type, owner=self.owner
+        )
+        Pet.objects.create(
+            name="Rex", birth_date=datetime.date(2020, 1, 1),
+            type=self.pet_type, owner=self.owner
+        )
+        self.url = reverse('pets:pet-lookup')
+
+    def test_name_key_follows_name(self):
+        """Test that the lookup key is kept in sync on save"""
+        self.assertEqual(self.felix.name_key, "felix")
+        self.fido.name = "Buddy"
+        self.fido.save(update_fields=['name'])
+        self.fido.refresh_from_db()
+        self.assertEqual(self.fido.name_key, "buddy")
+
+    def test_prefix_lookup(self):
+        """Test that the lookup matches name prefixes, ignoring case and accents"""
+        response = self.client.get(self.url, {'q': 'FE'})
+        self.assertEqual(response.json()['results'], [{'id': self.felix.id, 'text': "F\u00e9lix (Dog)"}])
+        response = self.client.get(self.url, {'q': 'f'})
+        self.assertEqual(
+            [result['id'] for result in response.json()['results']],
+            [self.felix.id, self.fido.id]
+        )
+
+    def test_lookup_query_count(self):
+        """Test that a page of pets and their types costs one query"""
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+
+class PetDetailFragmentCacheTests(TestCase):
+    """Test cases for the cached visits fragment of the pet detail page"""
+
+    def setUp(self):
+        """Set up test data"""
+        fragment_cache().clear()
+        owner = Owner.objects.create(
+            first_name="John",
+            last_name="Doe",
+            address="123 Main St",
+            city="Anytown",
+            telephone="555-1234"
+        )
+        self.pet = Pet.objects.create(
+            name="Fido",
+            birth_date=datetime.date(2018, 1, 1),
+            type=PetType.objects.create(name="Dog"),
+            owner=owner
+        )
+        self.visit = Visit.objects.create(
+            date=datetime.date(2023, 1, 1), description="Checkup", pet=self.pet
+        )
+        self.url = reverse('pets:pet-detail', args=[self.pet.id])
+
+    def test_cache_hit_skips_visit_query(self):
+        """Test that a cached fragment does not query the visits"""
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertContains(response, "Checkup")
+
+    def test_age_from_query(self):
+        """Test that the age shown is the one annotated by the query"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['pet'].age, self.pet.calculate_age())
+        self.assertContains(response, f"{self.pet.calculate_age()} years")
+
+    def test_updated_visit_is_shown(self):
+        """Test that editing a visit invalidates its pet's fragment"""
+        self.client.get(self.url)
+        self.visit.description = "Dental cleaning"
+        self.visit.save()
+        self.assertContains(self.client.get(self.url), "Dental cleaning")
+
+    def test_deleted_visit_is_removed(self):
+        """Test that deleting a visit invalidates its pet's fragment"""
+        self.client.get(self.url)
+        self.visit.delete()
+        self.assertContains(self.client.get(self.url), "No visits recorded")
+
+class PetConditionalGetTests(TestCase):
+    """Test cases for conditional GET of the pet detail page"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.owner = Owner.objects.create(
+            first_name="John",
+            last_name="Doe",
+            address="123 Main St",
+            city="Anytown",
+            telephone="555-1234"
+        )
+        self.pet_type = PetType.objects.create(name="Dog")
+        self.pet = Pet.objects.create(
+            name="Fido",
+            birth_date=datetime.date(2018, 1, 1),
+            type=self.pet_type,
+            owner=self.owner
+        )
+        self.url = reverse('pets:pet-detail', args=[self.pet.id])
+
+    def test_unchanged_page_not_modified(self):
+        """Test that a matching If-None-Match is answered with 304"""
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_owner_rename_modifies_pet(self):
+        """Test that renaming the owner shown on the page changes its ETag"""
+        etag = self.client.get(self.url)['ETag']
+        self.owner.last_name = "Smith"
+        self.owner.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, "John Smith")
+
+    def test_pet_type_rename_modifies_pet(self):
+        """Test that renaming the pet type shown on the page changes its ETag"""
+        etag = self.client.get(self.url)['ETag']
+        self.pet_type.name = "Hound"
+        self.pet_type.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, "Hound")
+
+    def test_day_starts_in_current_time_zone(self):
+        """Test that the age of the page expires at midnight of the current time zone"""
+        for zone in ('Pacific/Kiritimati', 'Pacific/Pago_Pago'):
+            with timezone.override(zone):
+                midnight = start_of_today()
+                self.assertEqual(timezone.localtime(midnight).date(), timezone.localdate())
+                self.assertEqual(timezone.localtime(midnight).time(), datetime.time.min)
+
+class PetCounterTests(TestCase):
+    """Test cases for the pet counts of owners"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.owner = Owner.objects.create(first_name="John", last_name="Doe", address="123 Main St",
+                                          city="Anytown", telephone="555-1234")
+        self.other_owner = Owner.objects.create(first_name="Jane", last_name="Roe", address="1 Elm St",
+                                                city="Anytown", telephone="555-4321")
+        self.pet_type = PetType.objects.create(name="Dog")
+
+    def pet_counts(self):
+        return list(Owner.objects.order_by('pk').values_list('pet_count', flat=True))
+
+    def test_create_move_delete(self):
+        """Test that pet counts follow pets being added, moved and removed"""
+        response = self.client.post(reverse('pets:pet-create-for-owner', args=[self.owner.id]), {
+            'name': 'Fido', 'birth_date': '2018-01-01', 'type': self.pet_type.id, 'owner': self.owner.id,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.pet_counts(), [1, 0])
+        pet = Pet.objects.get(name="Fido")
+        pet.owner = self.other_owner
+        pet.save()
+        self.assertEqual(self.pet_counts(), [0, 1])
+        pet.delete()
+        self.assertEqual(self.pet_counts(), [0, 0])
+
+    def test_pet_delete_cascades_visits(self):
+        """Test that deleting a pet with visits leaves the counts right"""
+        pet = Pet.objects.create(name="Fido", birth_date=datetime.date(2018, 1, 1),
+                                 type=self.pet_type, owner=self.owner)
+        Visit.objects.create(date=datetime.date(2023, 1, 1), description="Checkup", pet=pet)
+        pet.delete()
+        self.assertEqual(self.pet_counts(), [0, 0])
+
+class PetReminderTests(TestCase):
+    """Test cases for ages and birthday and checkup due-lists computed by the database"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.owner = Owner.objects.create(
+            first_name="John",
+            last_name="Doe",
+            address="123 Main St",
+            city="Anytown",
+            telephone="555-1234"
+        )
+        self.pet_type = PetType.objects.create(name="Dog")
+        self.today = datetime.date(2023, 12, 20)
+
+    def create_pet(self, name, birth_date, last_visit_date=None):
+        pet = Pet.objects.create(name=name, birth_date=birth_date, type=self.pet_type, owner=self.owner)
+        Pet.objects.filter(pk=pet.pk).update(last_visit_date=last_visit_date)
+        return pet
+
+    def test_birth_month_day_follows_birth_date(self):
+        """Test that saving a pet keeps its birthday key in sync, even with update_fields"""
+        pet = self.create_pet("Fido", datetime.date(2018, 9, 7))
+        self.assertEqual(pet.birth_month_day, 907)
+        pet.birth_date = datetime.date(2018, 12, 31)
+        pet.save(update_fields=['birth_date'])
+        pet.refresh_from_db()
+        self.assertEqual(pet.birth_month_day, 1231)
+
+    def test_with_age(self):
+        """Test that the annotated age changes on the birthday"""
+        self.create_pet("Fido", datetime.date(2018, 12, 20))
+        self.create_pet("Rex", datetime.date(2018, 12, 21))
+        ages = dict(Pet.objects.with_age(self.today).values_list('name', 'age'))
+        self.assertEqual(ages, {"Fido": 5, "Rex": 4})
+
+    def test_upcoming_birthdays_across_new_year(self):
+        """Test that a window crossing the new year lists this year's birthdays, then next year's"""
+        self.create_pet("Early", datetime.date(2018, 1, 5))
+        self.create_pet("Late", datetime.date(2018, 12, 25))
+        self.create_pet("Past", datetime.date(2018, 12, 19))
+        self.create_pet("Far", datetime.date(2018, 2, 1))
+        pets = [(pet.name, pet.turning) for pet in UpcomingBirthdays(Pet.objects.all(), self.today, 30)]
+        self.assertEqual(pets, [("Late", 5), ("Early", 6)])
+
+    def test_leap_day_birthday_in_common_year(self):
+        """Test that a February 29 birthday and the age change fall on February 28 in a common year"""
+        self.create_pet("Leap", datetime.date(2020, 2, 29))
+        for today, days, expected in [
+            (datetime.date(2023, 2, 1), 27, [("Leap", 3)]),  # Ends on February 28
+            (datetime.date(2023, 2, 28), 0, [("Leap", 3)]),
+            (datetime.date(2023, 3, 1), 30, []),
+            (datetime.date(2024, 2, 1), 27, []),  # Ends on February 28 of a leap year
+            (datetime.date(2024, 2, 1), 28, [("Leap", 4)]),
+        ]:
+            pets = [(pet.name, pet.turning) for pet in UpcomingBirthdays(Pet.objects.all(), today, days)]
+            self.assertEqual(pets, expected, today)
+        # The age changes the same day
+        ages = [Pet.objects.with_age(datetime.date(2023, 2, day)).get().age for day in (27, 28)]
+        self.assertEqual(ages, [2, 3])
+
+    def test_checkups_due(self):
+        """Test that overdue pets come longest overdue first, then pets never seen"""
+        self.create_pet("Never", datetime.date(2018, 1, 1))
+        self.create_pet("Recent", datetime.date(2018, 1, 1), datetime.date(2023, 6, 1))
+        self.create_pet("Overdue", datetime.date(2018, 1, 1), datetime.date(2022, 12, 1))
+        self.create_pet("Long overdue", datetime.date(2018, 1, 1), datetime.date(2021, 1, 1))
+        pets = [pet.name for pet in CheckupsDue(Pet.objects.all(), self.today, 365)]
+        self.assertEqual(pets, ["Long overdue", "Overdue", "Never"])
+
+    @skipUnless(connection.vendor == 'sqlite', "Checks the SQLite query plan")
+    def test_due_lists_use_indexes(self):
+        """Test that every tier is read in index order without sorting"""
+        for tier in UpcomingBirthdays(Pet.objects.all(), self.today, 30).tiers():
+            plan = tier[:50].explain()
+            self.assertIn("pet_birth_month_day_idx", plan)
+            self.assertNotIn("TEMP B-TREE", plan)
+        for tier in CheckupsDue(Pet.objects.all(), self.today, 365).tiers():
+            plan = tier[:50].explain()
+            self.assertIn("pet_last_visit_date_idx", plan)
+            self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_reminders_view(self):
+        """Test that the reminders view lists birthdays and checkups due"""
+        today = timezone.localdate()
+        self.create_pet("Fido", today - datetime.timedelta(days=3 * 365), today)
+        self.create_pet("Rex", datetime.date(2018, 1, 1), today - datetime.timedelta(days=400))
+        response = self.client.get(reverse('pets:pet-reminders'))
+        self.assertContains(response, "Fido")
+        self.assertNotContains(response, "Rex")
+        response = self.client.get(reverse('pets:pet-reminders'), {'kind': 'checkups'})
+        self.assertContains(response, "Rex")
+        self.assertNotContains(response, "Fido")
+
+    def test_reminders_view_invalid_days(self):
+        """Test that a window of a year or more is rejected"""
+        response = self.client.get(reverse('pets:pet-reminders'), {'days': '365'})
+        self.assertEqual(response.status_code, 400)
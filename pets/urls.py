@@ -1,11 +1,17 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = 'pets'
 
+# The read views have async counterparts for ASGI, see settings.ASYNC_VIEWS
+pet_detail = views.pet_detail_async if settings.ASYNC_VIEWS else views.PetDetailView.as_view()
+
 urlpatterns = [
-    path('<int:pk>/', views.PetDetailView.as_view(), name='pet-detail'),
+    path('<int:pk>/', pet_detail, name='pet-detail'),
     path('new/', views.PetCreateView.as_view(), name='pet-create'),
     path('owner/<int:owner_id>/new/', views.PetCreateView.as_view(), name='pet-create-for-owner'),
     path('<int:pk>/edit/', views.PetUpdateView.as_view(), name='pet-update'),
+    path('lookup/', views.pet_lookup, name='pet-lookup'),
+    path('reminders/', views.pet_reminders, name='pet-reminders'),
 ]
\ No newline at end of file
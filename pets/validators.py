@@ -0,0 +1,9 @@
+from datetime import date
+
+from django.core.exceptions import ValidationError
+
+
+def validate_birth_date(birth_date):
+    """Validate that a birth date is not in the future"""
+    if birth_date and birth_date > date.today():
+        raise ValidationError('Birth date cannot be in the future')
@@ -1,17 +1,41 @@
+from django.conf import settings
+from django.http import Http404, HttpResponseBadRequest
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import ListView, DetailView, CreateView, UpdateView
 from django.urls import reverse_lazy, reverse
 from django.contrib import messages
+from django.utils import timezone
+from django.db.models import aprefetch_related_objects
 
+from DjangoProject.conditional import ConditionalDetailMixin, aconditional_detail
+from DjangoProject.pagination import InvalidCursor, KeysetPaginator
+from DjangoProject.views import arender, lookup_response
 from .models import Pet, PetType
 from .forms import PetForm
+from .reminders import MAX_BIRTHDAY_DAYS, CheckupsDue, UpcomingBirthdays
 from owners.models import Owner
+from owners.search import normalize, prefix_q
 
-class PetDetailView(DetailView):
+class PetDetailView(ConditionalDetailMixin, DetailView):
     """View for displaying pet details"""
     model = Pet
     template_name = 'pets/pet_detail.html'
     context_object_name = 'pet'
+    last_modified_fields = ['updated_at', 'owner__updated_at']
+    changes_daily = True
+
+    def get_queryset(self):
+        """Compute the age of the pet in the query"""
+        return Pet.objects.with_age()
+
+async def pet_detail_async(request, pk):
+    """Async counterpart of PetDetailView"""
+    async def render_page(pet):
+        await aprefetch_related_objects([pet], 'visits')
+        return await arender(request, PetDetailView.template_name, {'pet': pet, 'object': pet})
+
+    queryset = Pet.objects.select_related('type').with_age()
+    return await aconditional_detail(request, PetDetailView, queryset, pk, render_page)
 
 class PetCreateView(CreateView):
     """View for creating a new pet"""
@@ -48,3 +72,42 @@ class PetUpdateView(UpdateView):
     def get_success_url(self):
         """Return to the pet's detail page after successful update"""
         return reverse('pets:pet-detail', kwargs={'pk': self.object.pk})
+
+def pet_lookup(request):
+    """JSON lookup of pets by name prefix for the pet select widget"""
+    pets = Pet.objects.select_related('type').only('id', 'name', 'name_key', 'type__name')
+    prefix = normalize(request.GET.get('q', ''))
+    if prefix:
+        pets = pets.filter(prefix_q('name_key', prefix))
+    return lookup_response(request, pets.order_by('name_key'))
+
+REMINDERS_PAGE_SIZE = 50
+
+def pet_reminders(request):
+    """
+    Due-list of the pets with a birthday in the next ?days= days, or of
+    the pets due for their checkup with ?kind=checkups, paginated by cursor
+    """
+    kind = request.GET.get('kind', 'birthdays')
+    days = request.GET.get('days', '30')
+    if kind not in ('birthdays', 'checkups'):
+        return HttpResponseBadRequest('Invalid kind')
+    if not days.isdigit() or int(days) > MAX_BIRTHDAY_DAYS:
+        return HttpResponseBadRequest(f'days must be between 0 and {MAX_BIRTHDAY_DAYS}')
+    today = timezone.localdate()
+    pets = Pet.objects.select_related('type', 'owner')
+    if kind == 'birthdays':
+        pets = UpcomingBirthdays(pets, today, int(days))
+    else:
+        pets = CheckupsDue(pets, today, settings.CHECKUP_INTERVAL_DAYS)
+    try:
+        page = KeysetPaginator(pets, REMINDERS_PAGE_SIZE).page(request.GET.get('cursor'))
+    except InvalidCursor:
+        raise Http404('Invalid cursor')
+    return render(request, 'pets/pet_reminders.html', {
+        'pets': page.object_list,
+        'page_obj': page,
+        'kind': kind,
+        'days': int(days),
+        'interval': settings.CHECKUP_INTERVAL_DAYS,
+    })
@@ -0,0 +1,38 @@
+/*
+ * "Load older visits" buttons: <button data-archive-url="..."
+ * data-archive-target="<tbody id>"> appends the next page of a pet's
+ * archived visits (visits:visit-archive) to the table body, following the
+ * endpoint's cursor until there are no more.
+ */
+(function () {
+    'use strict';
+
+    function setup(button) {
+        var url = button.getAttribute('data-archive-url');
+        var tbody = document.getElementById(button.getAttribute('data-archive-target'));
+        var nextCursor = null;
+
+        button.addEventListener('click', function () {
+            var pageUrl = url + (nextCursor ? '?cursor=' + encodeURIComponent(nextCursor) : '');
+            button.disabled = true;
+            fetch(pageUrl, {headers: {'Accept': 'application/json'}})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    data.results.forEach(function (visit) {
+                        var row = tbody.insertRow();
+                        row.className = 'text-muted';
+                        row.insertCell().textContent = visit.date;
+                        row.insertCell().textContent = visit.description;
+                        row.insertCell().textContent = 'Archived';
+                    });
+                    nextCursor = data.next;
+                    button.hidden = !nextCursor;
+                })
+                .finally(function () { button.disabled = false; });
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('button[data-archive-url]').forEach(setup);
+    });
+})();
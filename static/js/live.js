@@ -0,0 +1,35 @@
+/*
+ * Reload the page when a visit it shows is saved, instead of polling it.
+ *
+ * Listens to the Server-Sent Events of the URL in the data-events-url
+ * attribute of its own <script> tag (visits:visit-events). A page in a
+ * background tab waits until it is shown again. Pages include it only
+ * when events_enabled is set, that is under an ASGI server, the only one
+ * serving the stream.
+ */
+(function () {
+    'use strict';
+
+    var url = document.currentScript.getAttribute('data-events-url');
+
+    function reload() {
+        if (document.visibilityState === 'visible') {
+            window.location.reload();
+        } else {
+            document.addEventListener('visibilitychange', reload, {once: true});
+        }
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        if (!url || !window.EventSource) {
+            return;
+        }
+        var source = new EventSource(url);
+        ['visit', 'reset'].forEach(function (name) {
+            source.addEventListener(name, function () {
+                source.close();
+                reload();
+            });
+        });
+    });
+})();
@@ -0,0 +1,91 @@
+/*
+ * Searchable lookup for <select data-lookup-url="..."> elements rendered
+ * by DjangoProject.widgets.LookupSelect.
+ *
+ * The select initially holds only the selected option. Typing in the
+ * search box above it fetches matching options from the lookup endpoint,
+ * and "Load more" follows the endpoint's cursor to append the next page.
+ */
+(function () {
+    'use strict';
+
+    var DEBOUNCE_MS = 250;
+
+    function setup(select) {
+        var url = select.getAttribute('data-lookup-url');
+        var search = document.createElement('input');
+        var more = document.createElement('button');
+        var timer = null;
+        var nextCursor = null;
+        var request = 0;
+
+        search.type = 'search';
+        search.className = 'form-control mb-2';
+        search.placeholder = 'Type to search...';
+        search.setAttribute('aria-label', 'Search');
+
+        more.type = 'button';
+        more.className = 'btn btn-sm btn-link px-0';
+        more.textContent = 'Load more';
+        more.hidden = true;
+
+        select.parentNode.insertBefore(search, select);
+        select.parentNode.insertBefore(more, select.nextSibling);
+
+        function fetchPage(append) {
+            var params = new URLSearchParams({q: search.value.trim()});
+            var current = ++request;
+            if (append && nextCursor) {
+                params.set('cursor', nextCursor);
+            }
+            fetch(url + '?' + params.toString(), {headers: {'Accept': 'application/json'}})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    if (current !== request) {
+                        return;  // A newer search superseded this one
+                    }
+                    render(data.results || [], append);
+                    nextCursor = data.next;
+                    more.hidden = !nextCursor;
+                });
+        }
+
+        function render(results, append) {
+            var selected = select.value;
+            if (!append) {
+                Array.prototype.slice.call(select.options).forEach(function (option) {
+                    if (option.value !== '' && option.value !== selected) {
+                        select.removeChild(option);
+                    }
+                });
+            }
+            results.forEach(function (result) {
+                var value = String(result.id);
+                if (value === selected && !append) {
+                    return;
+                }
+                select.appendChild(new Option(result.text, value));
+            });
+        }
+
+        search.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(function () { fetchPage(false); }, DEBOUNCE_MS);
+        });
+        search.addEventListener('keydown', function (event) {
+            if (event.key === 'Enter') {
+                event.preventDefault();  // Searching must not submit the form
+            }
+        });
+        more.addEventListener('click', function () { fetchPage(true); });
+        select.addEventListener('focus', function () {
+            if (select.options.length <= 2 && !nextCursor) {
+                fetchPage(false);
+            }
+        }, {once: true});
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('select[data-lookup-url]').forEach(setup);
+    });
+})();
@@ -0,0 +1,22 @@
+from DjangoProject.api import Relation, Resource
+from .models import Specialty, Vet
+
+
+class SpecialtyResource(Resource):
+    model = Specialty
+    fields = {'id': 'pk', 'name': 'name'}
+
+
+class VetResource(Resource):
+    model = Vet
+    fields = {
+        'id': 'pk',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'updated_at': 'updated_at',
+    }
+    relations = {'specialties': Relation(SpecialtyResource(), 'vet')}
+    filters = {'specialty': 'specialties'}
+
+
+vets = VetResource()
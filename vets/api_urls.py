@@ -0,0 +1,11 @@
+from django.urls import path
+
+from DjangoProject.api import ResourceView
+from .api import vets
+
+app_name = 'vets-api'
+
+urlpatterns = [
+    path('', ResourceView.as_view(resource=vets), name='vet-list'),
+    path('<int:pk>/', ResourceView.as_view(resource=vets), name='vet-detail'),
+]
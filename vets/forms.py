@@ -1,5 +1,7 @@
 from django import forms
-from .models import Vet, Specialty
+
+from DjangoProject.refdata import ReferenceMultipleChoiceField
+from .models import Vet
 
 class VetForm(forms.ModelForm):
     """Form for creating and updating Vet instances"""
@@ -7,6 +9,8 @@ class VetForm(forms.ModelForm):
     class Meta:
         model = Vet
         fields = ['first_name', 'last_name', 'specialties']
+        # Specialties are rendered and validated from the in-process cache
+        field_classes = {'specialties': ReferenceMultipleChoiceField}
         widgets = {
             'first_name': forms.TextInput(attrs={'class': 'form-control'}),
             'last_name': forms.TextInput(attrs={'class': 'form-control'}),
@@ -16,6 +20,4 @@ class VetForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super(VetForm, self).__init__(*args, **kwargs)
         
-        # Sort specialties by name
-        self.fields['specialties'].queryset = Specialty.objects.all().order_by('name')
         self.fields['specialties'].help_text = "Hold down Ctrl (or Command on Mac) to select multiple specialties"
\ No newline at end of file
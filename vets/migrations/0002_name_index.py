@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vets', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vet',
+            index=models.Index(fields=['last_name', 'first_name'], name='vet_name_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vets', '0002_name_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='specialty',
+            index=models.Index(fields=['name'], name='specialty_name_idx'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.urls import reverse
 
+from DjangoProject.refdata import ReferenceCache
+
 class Specialty(models.Model):
     """Model representing a veterinary specialty (e.g. dentistry, surgery)"""
     name = models.CharField(max_length=80)
@@ -8,19 +10,31 @@ class Specialty(models.Model):
     class Meta:
         ordering = ['name']
         verbose_name_plural = 'specialties'
+        indexes = [
+            models.Index(fields=['name'], name='specialty_name_idx'),
+        ]
 
     def __str__(self):
         """String for representing the Model object."""
         return self.name
 
+# Every specialty, cached in process for forms and the vet list filter
+specialties = ReferenceCache(Specialty)
+
 class Vet(models.Model):
     """Model representing a veterinarian"""
     first_name = models.CharField(max_length=30)
     last_name = models.CharField(max_length=30)
     specialties = models.ManyToManyField(Specialty, blank=True)
 
+    # Also touched when the vet's specialties change, see signals.py
+    updated_at = models.DateTimeField(auto_now=True)
+
     class Meta:
         ordering = ['last_name', 'first_name']
+        indexes = [
+            models.Index(fields=['last_name', 'first_name'], name='vet_name_idx'),
+        ]
 
     def get_absolute_url(self):
         """Returns the url to access a particular vet instance."""
@@ -0,0 +1,37 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from DjangoProject.conditional import touch
+from DjangoProject.pagecache import purge
+from .models import Specialty, Vet
+
+
+@receiver([post_save, post_delete], sender=Vet, dispatch_uid='vets.vet_changed')
+def vet_changed(sender, instance, **kwargs):
+    """Purge the cached vet list pages"""
+    purge('vets')
+
+
+@receiver(m2m_changed, sender=Vet.specialties.through, dispatch_uid='vets.vet_specialties_changed')
+def vet_specialties_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Touch the vets whose specialties were added, removed or cleared"""
+    if not reverse:
+        if action.startswith('post_'):
+            touch(Vet.objects.filter(pk=instance.pk))
+            purge('vets')
+    elif action == 'pre_clear':
+        # Afterwards there is no way to tell which vets had the specialty
+        touch(Vet.objects.filter(specialties=instance))
+        purge('vets')
+    elif action in ('post_add', 'post_remove'):
+        touch(Vet.objects.filter(pk__in=pk_set))
+        purge('vets')
+
+
+@receiver([post_save, pre_delete], sender=Specialty, dispatch_uid='vets.specialty_changed')
+def specialty_changed(sender, instance, created=False, **kwargs):
+    """Touch the vets showing a renamed or deleted specialty and purge the vet list"""
+    if not created:
+        touch(Vet.objects.filter(specialties=instance))
+    # The vet list offers every specialty as a filter
+    purge('vets')
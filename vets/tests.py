@@ -1,7 +1,12 @@
-from django.test import TestCase
+from unittest import skipUnless
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from DjangoProject.management.commands.explain_views import explain, plan_problems
 from .models import Vet, Specialty
 from .forms import VetForm
+from .views import VetListView
 
 class VetFormTests(TestCase):
     """Test cases for the VetForm"""
@@ -46,6 +51,24 @@ class VetFormTests(TestCase):
         self.assertEqual(specialties[0].name, "Dentistry")
         self.assertEqual(specialties[1].name, "Surgery")
 
+    def test_specialties_from_cache(self):
+        """Test that specialties are validated without queries"""
+        VetForm(data={'specialties': [self.specialty1.id]}).is_valid()
+        with self.assertNumQueries(0):
+            form = VetForm(data={
+                'first_name': 'Jane',
+                'last_name': 'Smith',
+                'specialties': [self.specialty1.id, self.specialty2.id]
+            })
+            self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data['specialties'], [self.specialty1, self.specialty2])
+
+    def test_unknown_specialty(self):
+        """Test that an unknown specialty is rejected"""
+        form = VetForm(data={'first_name': 'Jane', 'last_name': 'Smith', 'specialties': [0]})
+        self.assertFalse(form.is_valid())
+        self.assertIn('specialties', form.errors)
+
     def test_help_text(self):
         """Test that help text is set for specialties field"""
         form = VetForm()
@@ -104,3 +127,114 @@ class VetModelTests(TestCase):
         url = self.vet.get_absolute_url()
         expected_url = reverse('vets:vet-detail', args=[str(self.vet.id)])
         self.assertEqual(url, expected_url)
+
+@override_settings(PAGE_CACHE_ENABLED=False)
+class VetListViewTests(TestCase):
+    """Test cases for the vet list view"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.surgery = Specialty.objects.create(name="Surgery")
+        self.dentistry = Specialty.objects.create(name="Dentistry")
+        self.surgeon = Vet.objects.create(first_name="Jane", last_name="Smith")
+        self.surgeon.specialties.add(self.surgery)
+        self.dentist = Vet.objects.create(first_name="James", last_name="Carter")
+        self.dentist.specialties.add(self.dentistry)
+        self.url = reverse('vets:vet-list')
+
+    def count_queries(self, url):
+        """Return the number of queries issued to render the given url"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_vet_list_view(self):
+        """Test the vet list view shows every vet with their specialties"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'vets/vet_list.html')
+        self.assertContains(response, self.surgeon.get_full_name())
+        self.assertContains(response, self.dentist.get_full_name())
+        self.assertContains(response, "Surgery")
+        self.assertContains(response, "Dentistry")
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        """Test that specialties are loaded in bulk for the whole page"""
+        self.count_queries(self.url)  # Fill the cached count and specialties
+        short_page = self.count_queries(self.url)
+        for i in range(VetListView.paginate_by):
+            vet = Vet.objects.create(first_name=f"Vet{i}", last_name=f"Doe{i}")
+            vet.specialties.add(self.surgery, self.dentistry)
+        self.assertEqual(self.count_queries(self.url), short_page)
+
+    def test_specialty_filter(self):
+        """Test that ?specialty= limits the list to vets with that specialty"""
+        response = self.client.get(f"{self.url}?specialty={self.surgery.id}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['vets']), [self.surgeon])
+        self.assertEqual(response.context['selected_specialty'], self.surgery.id)
+
+    def test_invalid_specialty_filter_is_ignored(self):
+        """Test that a malformed specialty id shows every vet"""
+        response = self.client.get(f"{self.url}?specialty=abc")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['vets']), 2)
+
+    @skipUnless(connection.vendor == 'sqlite', "Checks the SQLite query plan")
+    def test_specialty_filter_uses_index(self):
+        """Test that the filter probes the through table by index for vets read in name order"""
+        request = self.client.get(f"{self.url}?specialty={self.surgery.id}").wsgi_request
+        view = VetListView(request=request, kwargs={})
+        plan = view.get_queryset().explain()
+        self.assertIn("USING INDEX vet_name_idx", plan)
+        self.assertIn("USING COVERING INDEX vets_vet_specialties_vet_id_specialty_id", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_queries_neither_scan_nor_sort(self):
+        """Test that the vet pages of several vets with several specialties have clean query plans"""
+        for i in range(12):
+            vet = Vet.objects.create(first_name=f"Vet{i}", last_name=f"Doe{i:02d}")
+            vet.specialties.add(self.surgery, self.dentistry)
+        urls = [self.url, f"{self.url}?specialty={self.surgery.id}",
+                reverse('vets:vet-detail', args=[vet.pk]), reverse('vets:vet-update', args=[vet.pk])]
+        for url in urls:
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            for query in queries:
+                plan = explain(connection, query['sql'])
+                self.assertEqual(plan_problems(connection.vendor, plan), [], (url, query['sql'], plan))
+
+    def test_specialties_shown_by_name(self):
+        """Test that the specialties read in index order are still listed by name"""
+        self.surgeon.specialties.add(self.dentistry)
+        for url in (self.url, reverse('vets:vet-detail', args=[self.surgeon.pk])):
+            content = self.client.get(url).content.decode()
+            row = content[content.index(self.surgeon.get_full_name()):]
+            self.assertLess(row.index("Dentistry"), row.index("Surgery"))
+
+class VetConditionalGetTests(TestCase):
+    """Test cases for conditional GET of the vet detail page"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.surgery = Specialty.objects.create(name="Surgery")
+        self.vet = Vet.objects.create(first_name="Jane", last_name="Smith")
+        self.url = reverse('vets:vet-detail', args=[self.vet.id])
+
+    def test_unchanged_page_not_modified(self):
+        """Test that a matching If-None-Match is answered with 304"""
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_specialty_change_modifies_vet(self):
+        """Test that adding, renaming and removing specialties change the ETag"""
+        etags = [self.client.get(self.url)['ETag']]
+        self.vet.specialties.add(self.surgery)
+        etags.append(self.client.get(self.url)['ETag'])
+        self.surgery.name = "Oral surgery"
+        self.surgery.save()
+        etags.append(self.client.get(self.url)['ETag'])
+        self.surgery.vet_set.clear()
+        etags.append(self.client.get(self.url)['ETag'])
+        self.assertEqual(len(set(etags)), 4)
@@ -1,10 +1,14 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = 'vets'
 
+# The read views have async counterparts for ASGI, see settings.ASYNC_VIEWS
+vet_list = views.vet_list_async if settings.ASYNC_VIEWS else views.VetListView.as_view()
+
 urlpatterns = [
-    path('', views.VetListView.as_view(), name='vet-list'),
+    path('', vet_list, name='vet-list'),
     path('<int:pk>/', views.VetDetailView.as_view(), name='vet-detail'),
     path('new/', views.VetCreateView.as_view(), name='vet-create'),
     path('<int:pk>/edit/', views.VetUpdateView.as_view(), name='vet-update'),
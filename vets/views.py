@@ -2,27 +2,94 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import ListView, DetailView, CreateView, UpdateView
 from django.urls import reverse_lazy, reverse
 from django.contrib import messages
+from django.http import Http404
+from django.db.models import Exists, OuterRef, Prefetch
 
-from .models import Vet, Specialty
+from DjangoProject.conditional import ConditionalDetailMixin
+from DjangoProject.pagecache import page_cache
+from DjangoProject.pagination import InvalidCursor, KeysetPaginationMixin, KeysetPaginator
+from DjangoProject.views import arender
+from .models import Specialty, Vet, specialties
 from .forms import VetForm
 
-class VetListView(ListView):
+def with_specialties(queryset):
+    """
+    Prefetch the specialties of the vets in queryset in one query, read
+    along the (vet_id, specialty_id) index of the through table instead of
+    sorted by name: vets have a handful of them, the templates sort those
+    """
+    return queryset.prefetch_related(
+        Prefetch('specialties', queryset=Specialty.objects.order_by('vet__id'))
+    )
+
+@page_cache('vets', query_params=['specialty', 'cursor'])
+class VetListView(KeysetPaginationMixin, ListView):
     """View for listing all vets"""
     model = Vet
     template_name = 'vets/vet_list.html'
     context_object_name = 'vets'
     paginate_by = 10
+    count_mode = 'cached'
 
     def get_queryset(self):
-        """Return all vets ordered by last name, first name"""
-        return Vet.objects.all().order_by('last_name', 'first_name')
+        """
+        Return all vets ordered by last name, first name with their
+        specialties loaded in bulk, optionally limited to one specialty
+        """
+        queryset = Vet.objects.all()
+        specialty = self.get_specialty_id()
+        if specialty is not None:
+            # Walk the vets along vet_name_idx and probe the through table's
+            # (vet_id, specialty_id) index for each, instead of joining on
+            # specialty_id and sorting the matches by name
+            through = Vet.specialties.through.objects.filter(vet=OuterRef('pk'), specialty=specialty)
+            queryset = queryset.filter(Exists(through))
+        return with_specialties(queryset).order_by('last_name', 'first_name')
+
+    def get_specialty_id(self):
+        """Return the specialty id requested with ?specialty=, if valid"""
+        try:
+            return int(self.request.GET.get('specialty', ''))
+        except ValueError:
+            return None
+
+    def get_context_data(self, **kwargs):
+        """Add the specialties for the filter and the selected specialty"""
+        context = super().get_context_data(**kwargs)
+        context['specialties'] = specialties.all()
+        context['selected_specialty'] = self.get_specialty_id()
+        return context
+
+@page_cache('vets', query_params=['specialty', 'cursor'])
+async def vet_list_async(request):
+    """Async counterpart of VetListView"""
+    view = VetListView(request=request, kwargs={})
+    paginator = KeysetPaginator(view.get_queryset(), VetListView.paginate_by, count_mode=VetListView.count_mode)
+    try:
+        page = await paginator.apage(request.GET.get('cursor'))
+    except InvalidCursor:
+        raise Http404('Invalid cursor')
+    await paginator.acount()
+    return await arender(request, VetListView.template_name, {
+        'vets': page.object_list,
+        'object_list': page.object_list,
+        'paginator': paginator,
+        'page_obj': page,
+        'is_paginated': page.has_other_pages(),
+        'specialties': await specialties.aall(),
+        'selected_specialty': view.get_specialty_id(),
+    })
 
-class VetDetailView(DetailView):
+class VetDetailView(ConditionalDetailMixin, DetailView):
     """View for displaying vet details"""
     model = Vet
     template_name = 'vets/vet_detail.html'
     context_object_name = 'vet'
 
+    def get_queryset(self):
+        """Load the specialties along the index"""
+        return with_specialties(Vet.objects.all())
+
 class VetCreateView(CreateView):
     """View for creating a new vet"""
     model = Vet
@@ -40,6 +107,10 @@ class VetUpdateView(UpdateView):
     form_class = VetForm
     template_name = 'vets/vet_form.html'
 
+    def get_queryset(self):
+        """Load the specialties of the form's initial data along the index"""
+        return with_specialties(Vet.objects.all())
+
     def get_success_url(self):
         """Return to the vet's detail page after successful update"""
         return reverse('vets:vet-detail', kwargs={'pk': self.object.pk})
@@ -1,3 +1,19 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Visit, VisitArchive
+
+
+@admin.register(Visit)
+class VisitAdmin(admin.ModelAdmin):
+    list_display = ['date', 'pet', 'description']
+    list_select_related = ['pet__type']
+    date_hierarchy = 'date'
+    raw_id_fields = ['pet']
+
+
+@admin.register(VisitArchive)
+class VisitArchiveAdmin(admin.ModelAdmin):
+    list_display = ['date', 'pet', 'description', 'archived_at']
+    list_select_related = ['pet__type']
+    date_hierarchy = 'date'
+    raw_id_fields = ['pet']
@@ -0,0 +1,28 @@
+from DjangoProject.api import Resource
+from .models import Visit, VisitArchive
+
+
+class VisitResource(Resource):
+    """
+    The recent visits. Visits moved out by the archive_visits command are
+    served by ArchivedVisitResource, at /api/visits/archive/.
+    """
+    model = Visit
+    fields = {
+        'id': 'pk',
+        'date': 'date',
+        'description': 'description',
+        'pet': 'pet_id',
+        'updated_at': 'updated_at',
+    }
+    filters = {'pet': 'pet'}
+
+
+class ArchivedVisitResource(VisitResource):
+    """The archived visits, with the same fields plus archived_at"""
+    model = VisitArchive
+    fields = {**VisitResource.fields, 'archived_at': 'archived_at'}
+
+
+visits = VisitResource()
+archived_visits = ArchivedVisitResource()
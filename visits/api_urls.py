@@ -0,0 +1,13 @@
+from django.urls import path
+
+from DjangoProject.api import ResourceView
+from .api import archived_visits, visits
+
+app_name = 'visits-api'
+
+urlpatterns = [
+    path('', ResourceView.as_view(resource=visits), name='visit-list'),
+    path('<int:pk>/', ResourceView.as_view(resource=visits), name='visit-detail'),
+    path('archive/', ResourceView.as_view(resource=archived_visits), name='archived-visit-list'),
+    path('archive/<int:pk>/', ResourceView.as_view(resource=archived_visits), name='archived-visit-detail'),
+]
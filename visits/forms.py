@@ -1,8 +1,11 @@
 from django import forms
-from django.core.exceptions import ValidationError
+from django.urls import reverse_lazy
 from datetime import date
 
+from DjangoProject.widgets import LookupSelect
+
 from .models import Visit
+from .validators import validate_visit_date
 from pets.models import Pet
 
 class VisitForm(forms.ModelForm):
@@ -14,13 +17,16 @@ class VisitForm(forms.ModelForm):
         widgets = {
             'date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
-            'pet': forms.Select(attrs={'class': 'form-control'}),
+            'pet': LookupSelect(reverse_lazy('pets:pet-lookup'), attrs={'class': 'form-control'}),
         }
     
     def __init__(self, *args, **kwargs):
         pet_id = kwargs.pop('pet_id', None)
         super(VisitForm, self).__init__(*args, **kwargs)
         
+        # Render the selected pet's type without a query per pet
+        self.fields['pet'].queryset = Pet.objects.select_related('type')
+
         # If pet_id is provided, pre-select the pet and make the field hidden
         if pet_id:
             self.fields['pet'].initial = pet_id
@@ -33,6 +39,5 @@ class VisitForm(forms.ModelForm):
     def clean_date(self):
         """Validate that visit date is not in the future"""
         visit_date = self.cleaned_data.get('date')
-        if visit_date and visit_date > date.today():
-            raise ValidationError('Visit date cannot be in the future')
+        validate_visit_date(visit_date)
         return visit_date
\ No newline at end of file
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0003_ordering_indexes'),
+        ('visits', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='visit',
+            name='pet',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='visits', to='pets.pet'),
+        ),
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(fields=['pet', '-date'], name='visit_pet_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(fields=['-date'], name='visit_date_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0006_birth_month_day'),
+        ('visits', '0003_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('description', models.TextField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('pet', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_visits', to='pets.pet')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['pet', '-date'], name='visitarchive_pet_date_idx')],
+            },
+        ),
+    ]
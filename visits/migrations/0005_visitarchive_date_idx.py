@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0006_birth_month_day'),
+        ('visits', '0004_visit_archive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='visitarchive',
+            index=models.Index(fields=['-date'], name='visitarchive_date_idx'),
+        ),
+    ]
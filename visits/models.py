@@ -6,10 +6,16 @@ class Visit(models.Model):
     """Model representing a visit to the veterinarian"""
     date = models.DateField()
     description = models.TextField()
-    pet = models.ForeignKey(Pet, on_delete=models.CASCADE, related_name='visits')
+    # Indexed by visit_pet_date_idx, whose leading column serves pet lookups
+    pet = models.ForeignKey(Pet, on_delete=models.CASCADE, related_name='visits', db_index=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['pet', '-date'], name='visit_pet_date_idx'),
+            models.Index(fields=['-date'], name='visit_date_idx'),
+        ]
 
     def get_absolute_url(self):
         """Returns the url to access a particular visit instance."""
@@ -18,3 +24,29 @@ class Visit(models.Model):
     def __str__(self):
         """String for representing the Model object."""
         return f"{self.pet} - {self.date}"
+
+
+class VisitArchive(models.Model):
+    """
+    A visit older than VISIT_ARCHIVE_DAYS, moved out of Visit with its id by
+    the archive_visits command. Visit then only holds the recent history
+    that the detail pages show, and stays small however long the clinic runs.
+    """
+    date = models.DateField()
+    description = models.TextField()
+    # Indexed by visitarchive_pet_date_idx, whose leading column serves pet lookups
+    pet = models.ForeignKey(Pet, on_delete=models.CASCADE, related_name='archived_visits', db_index=False)
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-date']
+        indexes = [
+            models.Index(fields=['pet', '-date'], name='visitarchive_pet_date_idx'),
+            # Serves the unfiltered list of the archived visits API
+            models.Index(fields=['-date'], name='visitarchive_date_idx'),
+        ]
+
+    def __str__(self):
+        """String for representing the Model object."""
+        return f"{self.pet} - {self.date}"
@@ -0,0 +1,104 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from DjangoProject.conditional import touch
+from DjangoProject.events import publish_on_commit
+from DjangoProject.fragments import bump
+from owners.models import Owner
+from pets.models import Pet
+from .models import Visit, VisitArchive
+
+_suppressed = ContextVar('visit_signals_suppressed', default=False)
+
+
+@contextmanager
+def signals_suppressed():
+    """Skip the receivers below, for bulk moves that keep the counters and caches themselves"""
+    token = _suppressed.set(True)
+    try:
+        yield
+    finally:
+        _suppressed.reset(token)
+
+
+def latest_visit_date():
+    """Return an expression of the date of the latest visit of the outer pet, archived or not"""
+    recent, archived = (
+        Subquery(model.objects.filter(pet=OuterRef('pk')).order_by('-date').values('date')[:1])
+        for model in (Visit, VisitArchive)
+    )
+    # Greatest() is NULL when either argument is NULL, on some databases
+    return Greatest(Coalesce(recent, archived), Coalesce(archived, recent))
+
+
+def update_pet_counters(pet_id, delta):
+    """Add delta to the visit count of a pet, recompute its last visit and touch it"""
+    counters = {'last_visit_date': latest_visit_date(), 'updated_at': timezone.now()}
+    if delta:
+        counters['visit_count'] = F('visit_count') + delta
+    Pet.objects.filter(pk=pet_id).update(**counters)
+
+
+@receiver(pre_save, sender=Visit, dispatch_uid='visits.remember_previous_pet')
+def remember_previous_pet(sender, instance, raw=False, **kwargs):
+    """Remember the pet a visit had before being saved, in case it changes"""
+    instance._previous_pet_id = None
+    if _suppressed.get():
+        return
+    if instance.pk is not None and not raw:
+        instance._previous_pet_id = (
+            Visit.objects.filter(pk=instance.pk).values_list('pet_id', flat=True).first()
+        )
+
+
+@receiver([post_save, post_delete], sender=Visit, dispatch_uid='visits.visit_changed')
+def visit_changed(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Update the counters of the pets of a changed visit, invalidate their
+    pages and publish saved visits to the event streams
+    """
+    if _suppressed.get():
+        return
+    if raw:
+        # Loaded fixtures carry their counters, rebuild_counters fixes them otherwise
+        touch(Pet.objects.filter(pk=instance.pet_id))
+    elif kwargs['signal'] is post_delete:
+        update_pet_counters(instance.pet_id, -1)
+    elif created:
+        update_pet_counters(instance.pet_id, 1)
+    else:
+        previous_pet_id = getattr(instance, '_previous_pet_id', None)
+        if previous_pet_id not in (None, instance.pet_id):
+            update_pet_counters(previous_pet_id, -1)
+            update_pet_counters(instance.pet_id, 1)
+        else:
+            update_pet_counters(instance.pet_id, 0)
+
+    pet_ids = {instance.pet_id, getattr(instance, '_previous_pet_id', None)} - {None}
+    for pet_id in pet_ids:
+        bump(Pet, pet_id)
+    if Visit.pet.is_cached(instance) and pet_ids == {instance.pet_id}:
+        owner_ids = {instance.pet.owner_id}
+    else:
+        owner_ids = set(Pet.objects.filter(pk__in=pet_ids).values_list('owner_id', flat=True))
+    for owner_id in owner_ids:
+        bump(Owner, owner_id)
+    touch(Owner.objects.filter(pk__in=owner_ids))
+
+    if kwargs['signal'] is post_save and not raw:
+        topics = ['clinic']
+        topics += [f'pet:{pet_id}' for pet_id in pet_ids]
+        topics += [f'owner:{owner_id}' for owner_id in owner_ids]
+        publish_on_commit(topics, 'visit', {
+            'id': instance.pk,
+            'pet': instance.pet_id,
+            'date': instance.date,
+            'description': instance.description,
+            'created': created,
+        }, using=kwargs.get('using'))
@@ -1,8 +1,12 @@
-from django.test import TestCase
+from asgiref.sync import sync_to_async
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
+import asyncio
 import datetime
 from django.forms import HiddenInput
-from .models import Visit
+from DjangoProject.events import LocalBroker, get_broker
+from .models import Visit, VisitArchive
 from .forms import VisitForm
 from pets.models import Pet, PetType
 from owners.models import Owner
@@ -57,6 +61,26 @@ class VisitFormTests(TestCase):
         self.assertFalse(form.is_valid())
         self.assertIn('date', form.errors)
 
+    def test_pet_select_renders_only_selected_pet(self):
+        """Test that the pet select costs one query whatever the number of pets"""
+        for i in range(5):
+            Pet.objects.create(
+                name=f"Other{i}", birth_date=datetime.date(2018, 1, 1),
+                type=self.pet_type, owner=self.owner
+            )
+        form = VisitForm(initial={'pet': self.pet.id})
+        with self.assertNumQueries(1):
+            html = str(form['pet'])
+        self.assertIn('data-lookup-url="/pets/lookup/"', html)
+        self.assertIn('Fido (Dog)', html)
+        self.assertNotIn('Other0', html)
+
+    def test_pet_select_without_selection(self):
+        """Test that an unbound form renders no pets without querying"""
+        with self.assertNumQueries(0):
+            html = str(VisitForm()['pet'])
+        self.assertEqual(html.count('<option'), 1)
+
     def test_pet_id_parameter(self):
         """Test that pet_id parameter works correctly"""
         # Create form with pet_id parameter
@@ -128,3 +152,249 @@ class VisitModelTests(TestCase):
         # Check that the newer visit comes first
         self.assertEqual(visits[0], visit2)
         self.assertEqual(visits[1], self.visit)
+
+class VisitConditionalGetTests(TestCase):
+    """Test cases for conditional GET of the visit detail page"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.owner = Owner.objects.create(
+            first_name="John",
+            last_name="Doe",
+            address="123 Main St",
+            city="Anytown",
+            telephone="555-1234"
+        )
+        pet = Pet.objects.create(
+            name="Fido",
+            birth_date=datetime.date(2018, 1, 1),
+            type=PetType.objects.create(name="Dog"),
+            owner=self.owner
+        )
+        self.visit = Visit.objects.create(date=datetime.date(2023, 1, 1), description="Checkup", pet=pet)
+        self.url = reverse('visits:visit-detail', args=[self.visit.id])
+
+    def test_unchanged_page_not_modified(self):
+        """Test that a matching If-None-Match is answered with 304"""
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_edit_modifies_visit(self):
+        """Test that editing the visit or its owner changes the ETag"""
+        etag = self.client.get(self.url)['ETag']
+        self.visit.description = "Dental cleaning"
+        self.visit.save()
+        second = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(second, "Dental cleaning")
+        self.owner.first_name = "Jack"
+        self.owner.save()
+        third = self.client.get(self.url, HTTP_IF_NONE_MATCH=second['ETag'])
+        self.assertContains(third, "Jack Doe")
+
+class VisitCounterTests(TestCase):
+    """Test cases for the visit counters of pets"""
+
+    def setUp(self):
+        """Set up test data"""
+        owner = Owner.objects.create(
+            first_name="John",
+            last_name="Doe",
+            address="123 Main St",
+            city="Anytown",
+            telephone="555-1234"
+        )
+        pet_type = PetType.objects.create(name="Dog")
+        self.pet = Pet.objects.create(name="Fido", birth_date=datetime.date(2018, 1, 1),
+                                      type=pet_type, owner=owner)
+        self.other_pet = Pet.objects.create(name="Rex", birth_date=datetime.date(2019, 1, 1),
+                                            type=pet_type, owner=owner)
+
+    def assertCounters(self, pet, visit_count, last_visit_date):
+        pet.refresh_from_db()
+        self.assertEqual((pet.visit_count, pet.last_visit_date), (visit_count, last_visit_date))
+
+    def test_create_view(self):
+        """Test that a visit scheduled through the view counts"""
+        response = self.client.post(reverse('visits:visit-create-for-pet', args=[self.pet.id]), {
+            'date': '2023-03-01', 'description': 'Checkup', 'pet': self.pet.id,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertCounters(self.pet, 1, datetime.date(2023, 3, 1))
+
+    def test_update_view(self):
+        """Test that moving the date of the latest visit moves the last visit"""
+        Visit.objects.create(date=datetime.date(2023, 1, 1), description="First", pet=self.pet)
+        visit = Visit.objects.create(date=datetime.date(2023, 2, 1), description="Second", pet=self.pet)
+        self.client.post(reverse('visits:visit-update', args=[visit.id]), {
+            'date': '2022-12-01', 'description': 'Second', 'pet': self.pet.id,
+        })
+        self.assertCounters(self.pet, 2, datetime.date(2023, 1, 1))
+
+    def test_move_to_other_pet(self):
+        """Test that a visit moved to another pet counts for that pet only"""
+        visit = Visit.objects.create(date=datetime.date(2023, 1, 1), description="Checkup", pet=self.pet)
+        visit.pet = self.other_pet
+        visit.save()
+        self.assertCounters(self.pet, 0, None)
+        self.assertCounters(self.other_pet, 1, datetime.date(2023, 1, 1))
+
+    def test_delete(self):
+        """Test that deleting visits uncounts them"""
+        first = Visit.objects.create(date=datetime.date(2023, 1, 1), description="First", pet=self.pet)
+        second = Visit.objects.create(date=datetime.date(2023, 2, 1), description="Second", pet=self.pet)
+        second.delete()
+        self.assertCounters(self.pet, 1, datetime.date(2023, 1, 1))
+        first.delete()
+        self.assertCounters(self.pet, 0, None)
+
+    def test_saving_stale_pet_keeps_counters(self):
+        """Test that saving a pet loaded before its visits does not reset them"""
+        Visit.objects.create(date=datetime.date(2023, 1, 1), description="Checkup", pet=self.pet)
+        self.pet.name = "Fido II"
+        self.pet.save()
+        self.assertCounters(self.pet, 1, datetime.date(2023, 1, 1))
+
+class VisitEventTests(TestCase):
+    """Test cases for the Server-Sent Events of saved visits"""
+
+    def setUp(self):
+        """Set up test data"""
+        get_broker.cache_clear()
+        self.addCleanup(get_broker.cache_clear)
+        self.owner = Owner.objects.create(
+            first_name="John",
+            last_name="Doe",
+            address="123 Main St",
+            city="Anytown",
+            telephone="555-1234"
+        )
+        self.pet = Pet.objects.create(name="Fido", birth_date=datetime.date(2018, 1, 1),
+                                      type=PetType.objects.create(name="Dog"), owner=self.owner)
+
+    def save_visit(self, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Visit.objects.create(date=datetime.date(2023, 1, 1), pet=self.pet, **fields)
+
+    def test_saved_visit_published_on_commit(self):
+        """Test that saving a visit publishes it to the clinic, its pet and its owner"""
+        visit = self.save_visit(description="Checkup")
+        event = get_broker().history[-1]
+        self.assertEqual(event.topics, {'clinic', f'pet:{self.pet.id}', f'owner:{self.owner.id}'})
+        self.assertIn(f'"id": {visit.id}', event.message)
+        self.assertIn('"created": true', event.message)
+
+    def test_update_view_publishes(self):
+        """Test that a visit edited through the view is published as updated"""
+        visit = self.save_visit(description="Checkup")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('visits:visit-update', args=[visit.id]), {
+                'date': '2023-01-02', 'description': 'Rabies shot', 'pet': self.pet.id,
+            })
+        message = get_broker().history[-1].message
+        self.assertTrue(message.startswith('id: 2\nevent: visit\n'))
+        self.assertIn('"created": false', message)
+
+    async def test_subscription_receives_its_topics(self):
+        """Test that a subscription gets the events of its topics only"""
+        broker = LocalBroker(history=10)
+        subscription = broker.subscribe(['pet:1'])
+        broker.publish(['clinic', 'pet:1'], 'visit', {'id': 1})
+        broker.publish(['clinic', 'pet:2'], 'visit', {'id': 2})
+        self.assertEqual(await subscription.get(1), ['id: 1\nevent: visit\ndata: {"id": 1}\n\n'])
+        self.assertEqual(await subscription.get(0.01), [])
+
+    async def test_resume_from_last_event_id(self):
+        """Test that a subscription resumes after its last event, or resets once it is forgotten"""
+        broker = LocalBroker(history=2)
+        for number in range(1, 4):
+            broker.publish(['clinic'], 'visit', {'id': number})
+        self.assertEqual(len(await broker.subscribe(['clinic'], last_id=1).get(1)), 2)
+        self.assertIn('event: reset', (await broker.subscribe(['clinic'], last_id=0).get(1))[0])
+        self.assertIn('event: reset', (await broker.subscribe(['clinic'], last_id=9).get(1))[0])
+
+    @override_settings(EVENTS_QUEUE_SIZE=2)
+    async def test_slow_subscriber_overflows(self):
+        """Test that a subscription which is not read is dropped instead of buffering"""
+        broker = LocalBroker()
+        subscription = broker.subscribe(['clinic'])
+        for number in range(3):
+            broker.publish(['clinic'], 'visit', {'id': number})
+        await asyncio.sleep(0)
+        self.assertTrue(subscription.overflowed)
+        self.assertEqual(await subscription.get(1), [])
+
+    async def test_stream(self):
+        """Test that the pet stream sends the visits of the pet as they are saved"""
+        response = await self.async_client.get(reverse('visits:visit-events'), {'pet': self.pet.id})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        content = response.streaming_content
+        self.assertEqual(await anext(content), b'id: 0\n\n')
+        await sync_to_async(self.save_visit)(description="Checkup")
+        self.assertIn(b'"description": "Checkup"', await anext(content))
+        response.close()
+        self.assertEqual(get_broker().subscriptions, set())
+
+    @override_settings(EVENTS_HEARTBEAT_SECONDS=0.01, EVENTS_IDLE_SECONDS=0.02)
+    async def test_idle_stream_closed(self):
+        """Test that a stream without events sends heartbeats, then ends"""
+        response = await self.async_client.get(reverse('visits:visit-events'))
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(chunks, [b'id: 0\n\n', b': heartbeat\n\n', b': heartbeat\n\n'])
+
+    @override_settings(EVENTS_MAX_SUBSCRIBERS=0)
+    async def test_too_many_subscribers(self):
+        """Test that streams beyond EVENTS_MAX_SUBSCRIBERS are refused"""
+        response = await self.async_client.get(reverse('visits:visit-events'))
+        self.assertEqual(response.status_code, 503)
+
+    async def test_invalid_scope(self):
+        """Test that a malformed pet or owner id is rejected"""
+        response = await self.async_client.get(reverse('visits:visit-events'), {'owner': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_wsgi_refused(self):
+        """Test that the stream is refused outside of an ASGI server"""
+        self.assertEqual(self.client.get(reverse('visits:visit-events')).status_code, 501)
+
+    async def test_live_script_under_asgi_only(self):
+        """Test that the detail pages load live.js under ASGI only, where the stream is served"""
+        for url in (reverse('pets:pet-detail', args=[self.pet.id]),
+                    reverse('owners:owner-detail', args=[self.owner.id])):
+            self.assertContains(await self.async_client.get(url), 'js/live.js')
+            self.assertNotContains(await sync_to_async(self.client.get)(url), 'js/live.js')
+
+class VisitArchiveTests(TestCase):
+    """Test cases for the "Load older visits" endpoint of archived visits"""
+
+    def setUp(self):
+        """Set up test data"""
+        owner = Owner.objects.create(
+            first_name="John",
+            last_name="Doe",
+            address="123 Main St",
+            city="Anytown",
+            telephone="555-1234"
+        )
+        self.pet = Pet.objects.create(name="Fido", birth_date=datetime.date(2015, 1, 1),
+                                      type=PetType.objects.create(name="Dog"), owner=owner)
+        VisitArchive.objects.bulk_create([
+            VisitArchive(pet=self.pet, date=datetime.date(2016, 1, 1) + datetime.timedelta(days=day),
+                         description=f"Visit {day}", updated_at=timezone.now())
+            for day in range(25)
+        ])
+        self.url = reverse('visits:visit-archive', args=[self.pet.id])
+
+    def test_pages_newest_first(self):
+        """Test that the archived visits are paged newest first by cursor"""
+        data = self.client.get(self.url).json()
+        self.assertEqual(len(data['results']), 20)
+        self.assertEqual(data['results'][0], {'date': '2016-01-25', 'description': 'Visit 24'})
+        data = self.client.get(self.url, {'cursor': data['next']}).json()
+        self.assertEqual([visit['description'] for visit in data['results']],
+                         [f"Visit {day}" for day in range(4, -1, -1)])
+        self.assertIsNone(data['next'])
+
+    def test_invalid_cursor(self):
+        """Test that a malformed cursor is rejected"""
+        self.assertEqual(self.client.get(self.url, {'cursor': '!'}).status_code, 400)
@@ -8,4 +8,6 @@ urlpatterns = [
     path('new/', views.VisitCreateView.as_view(), name='visit-create'),
     path('pet/<int:pet_id>/new/', views.VisitCreateView.as_view(), name='visit-create-for-pet'),
     path('<int:pk>/edit/', views.VisitUpdateView.as_view(), name='visit-update'),
+    path('events/', views.visit_events, name='visit-events'),
+    path('archive/pet/<int:pet_id>/', views.archived_visits, name='visit-archive'),
 ]
\ No newline at end of file
@@ -0,0 +1,9 @@
+from datetime import date
+
+from django.core.exceptions import ValidationError
+
+
+def validate_visit_date(visit_date):
+    """Validate that a visit date is not in the future"""
+    if visit_date and visit_date > date.today():
+        raise ValidationError('Visit date cannot be in the future')
@@ -1,17 +1,24 @@
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import ListView, DetailView, CreateView, UpdateView
 from django.urls import reverse_lazy, reverse
 from django.contrib import messages
 
-from .models import Visit
+from DjangoProject.conditional import ConditionalDetailMixin
+from DjangoProject.events import EventStreamResponse, TooManySubscribers, get_broker
+from DjangoProject.pagination import InvalidCursor, KeysetPaginator
+from .models import Visit, VisitArchive
 from .forms import VisitForm
 from pets.models import Pet
 
-class VisitDetailView(DetailView):
+class VisitDetailView(ConditionalDetailMixin, DetailView):
     """View for displaying visit details"""
     model = Visit
     template_name = 'visits/visit_detail.html'
     context_object_name = 'visit'
+    last_modified_fields = ['updated_at', 'pet__updated_at', 'pet__owner__updated_at']
 
 class VisitCreateView(CreateView):
     """View for creating a new visit"""
@@ -50,3 +57,48 @@ class VisitUpdateView(UpdateView):
         """Return to the pet's detail page after successful update"""
         messages.success(self.request, 'Visit updated successfully.')
         return reverse('pets:pet-detail', kwargs={'pk': self.object.pet.pk})
+
+ARCHIVE_PAGE_SIZE = 20
+
+def archived_visits(request, pet_id):
+    """
+    One page of the archived visits of a pet, newest first, as JSON for
+    the "Load older visits" button: {"results": [...], "next": <cursor or null>}
+    """
+    visits = VisitArchive.objects.filter(pet_id=pet_id).values('pk', 'date', 'description')
+    try:
+        page = KeysetPaginator(visits, ARCHIVE_PAGE_SIZE).page(request.GET.get('cursor'))
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    return JsonResponse({
+        'results': [{'date': visit['date'], 'description': visit['description']} for visit in page],
+        'next': page.next_cursor,
+    })
+
+async def visit_events(request):
+    """
+    Stream the visits saved from now on as Server-Sent Events: those of one
+    pet with ?pet=<id>, of one owner with ?owner=<id>, or of the clinic.
+    Heartbeat comments keep the connection open, and it is closed after
+    EVENTS_IDLE_SECONDS without events; the browser then reconnects with
+    the Last-Event-ID it got and misses nothing.
+    """
+    if not isinstance(request, ASGIRequest):
+        # A WSGI server would hold a worker thread for the life of the stream
+        return HttpResponse('Event streams need an ASGI server.', status=501, content_type='text/plain')
+    topic = 'clinic'
+    for scope in ('pet', 'owner'):
+        if scope in request.GET:
+            if not request.GET[scope].isdigit():
+                return HttpResponseBadRequest(f'Invalid {scope}')
+            topic = f'{scope}:{int(request.GET[scope])}'
+    last_id = request.headers.get('Last-Event-ID', '')
+    last_id = int(last_id) if last_id.isdigit() else None
+    broker = get_broker()
+    try:
+        subscription = broker.subscribe([topic], last_id)
+    except TooManySubscribers:
+        response = HttpResponse('Too many event streams, retry later.', status=503, content_type='text/plain')
+        response['Retry-After'] = settings.EVENTS_HEARTBEAT_SECONDS
+        return response
+    return EventStreamResponse(broker, subscription, resuming=last_id is not None)